@@ -0,0 +1,93 @@
+from typing import Dict, List, Tuple
+
+# Dimensions that can be answered from the (employee_id, project_id, date) hour rollup
+ROLLUP_DIMENSIONS = {"project", "department", "employee", "week", "month"}
+
+# Grouping dimensions of the aggregated activity report:
+# name -> (MySQL expression, portable/SQLite expression, join needed)
+DIMENSIONS: Dict[str, Tuple[str, str, str]] = {
+    "project": ("p.project_name", "p.project_name", "projects"),
+    "department": ("p.department", "p.department", "projects"),
+    "employee": (
+        "CONCAT(e.name, ' (', ar.employee_id, ')')",
+        "e.name || ' (' || ar.employee_id || ')'",
+        "employees",
+    ),
+    "status": ("ar.status", "ar.status", ""),
+    "week": (
+        "DATE_FORMAT(DATE_SUB(ar.date, INTERVAL WEEKDAY(ar.date) DAY), '%Y-%m-%d')",
+        "date(ar.date, '-' || ((CAST(strftime('%w', ar.date) AS INTEGER) + 6) % 7) || ' days')",
+        "",
+    ),
+    "month": ("DATE_FORMAT(ar.date, '%Y-%m')", "strftime('%Y-%m', ar.date)", ""),
+}
+
+_JOINS = {
+    "projects": "LEFT JOIN projects p ON p.project_id = ar.project_id",
+    "employees": "LEFT JOIN employees e ON e.employee_id = ar.employee_id",
+}
+
+
+def parse_group_by(group_by: List[str]) -> List[str]:
+    """Validate and de-duplicate grouping dimensions (order matters: it defines the rollup levels)."""
+    dims = []
+    for dim in group_by or ["project"]:
+        dim = dim.strip().lower()
+        # Accept plurals such as 'projects' or 'statuses'
+        for suffix in ("es", "s"):
+            if dim not in DIMENSIONS and dim.endswith(suffix) and dim[:-len(suffix)] in DIMENSIONS:
+                dim = dim[:-len(suffix)]
+        if dim not in DIMENSIONS:
+            raise ValueError(f"Unknown grouping '{dim}'. Use any of: {', '.join(DIMENSIONS)}")
+        if dim not in dims:
+            dims.append(dim)
+    if len(dims) > 3:
+        raise ValueError("Group by at most 3 dimensions")
+    return dims
+
+
+def build_aggregate_query(
+    dialect: str,
+    group_by: List[str],
+    where: str,
+    table: str = "activity_reports",
+    entries: str = "COUNT(*)",
+) -> str:
+    """
+    Build the GROUP BY ... WITH ROLLUP query of the aggregated activity report.
+
+    Every row carries the dimension values (d0, d1, ...), a grouping flag per dimension
+    (g0, g1, ...; 1 on subtotal rows), the total hours and the number of entries. Dialects
+    without ROLLUP get the equivalent UNION ALL of each grouping level.
+
+    Args:
+        dialect: SQLAlchemy dialect name
+        group_by: Validated grouping dimensions (see parse_group_by)
+        where: WHERE clause on activity_reports aliased as ar (columns must be qualified with ar.)
+        table: Source table; the daily hour rollup (with entries='SUM(ar.entries)') works too
+        entries: Aggregate expression counting the activity entries
+    """
+    mysql = dialect == "mysql"
+    exprs = [DIMENSIONS[dim][0 if mysql else 1] for dim in group_by]
+    joins = sorted({DIMENSIONS[dim][2] for dim in group_by} - {""})
+    source = f"FROM {table} ar " + " ".join(_JOINS[join] for join in joins) + f" {where}"
+
+    if mysql:
+        select = ", ".join(f"{expr} AS d{i}" for i, expr in enumerate(exprs))
+        flags = ", ".join(f"GROUPING({expr}) AS g{i}" for i, expr in enumerate(exprs))
+        return (
+            f"SELECT {select}, {flags}, SUM(ar.hours) AS hours, {entries} AS entries {source} "
+            f"GROUP BY {', '.join(exprs)} WITH ROLLUP "
+            f"ORDER BY {', '.join(f'g{i}, d{i}' for i in range(len(exprs)))}"
+        )
+
+    levels = []
+    for level in range(len(exprs), -1, -1):
+        columns = [
+            f"{expr} AS d{i}, 0 AS g{i}" if i < level else f"NULL AS d{i}, 1 AS g{i}"
+            for i, expr in enumerate(exprs)
+        ]
+        group = f" GROUP BY {', '.join(exprs[:level])}" if level else ""
+        levels.append(f"SELECT {', '.join(columns)}, SUM(ar.hours) AS hours, {entries} AS entries {source}{group}")
+    order = ", ".join(f"g{i}, d{i}" for i in range(len(exprs)))
+    return f"SELECT * FROM ({' UNION ALL '.join(levels)}) AS levels ORDER BY {order}"
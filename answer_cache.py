@@ -0,0 +1,178 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
+
+
+class AnswerCache:
+    """
+    TTL + LRU cache for final agent answers.
+
+    Entries are keyed on the normalized question, the user ID and a schema/data
+    version string, so a schema change or a write done by the agent never serves
+    a stale answer. An optional SQLite file backend keeps answers across restarts,
+    along with the write generation, so a restart does not reuse the version of
+    answers that predate earlier writes.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        ttl_seconds: float = 300.0,
+        path: Optional[str] = None,
+    ):
+        """
+        Args:
+            max_entries: Maximum number of answers kept (LRU eviction beyond that)
+            ttl_seconds: Time-to-live of an answer in seconds
+            path: Optional SQLite file used as a persistent backend
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._generation = 0
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = self._open_backend(path) if path else None
+
+    @classmethod
+    def from_env(cls) -> "AnswerCache":
+        """Build a cache from ANSWER_CACHE_* environment variables."""
+        return cls(
+            max_entries=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "256")),
+            ttl_seconds=float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "300")),
+            path=os.getenv("ANSWER_CACHE_PATH") or None,
+        )
+
+    @staticmethod
+    def normalize_question(question: str) -> str:
+        """Lowercase, collapse whitespace and drop trailing punctuation."""
+        normalized = unicodedata.normalize("NFKC", question).lower()
+        normalized = re.sub(r"\s+", " ", normalized).strip()
+        return normalized.rstrip(" ?!.;")
+
+    @classmethod
+    def make_key(cls, question: str, user_id: Optional[str], version: str) -> str:
+        """Build the cache key for a question asked by a user against a data version."""
+        raw = json.dumps([cls.normalize_question(question), user_id or "", version])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, question: str, user_id: Optional[str], version: str) -> Optional[str]:
+        """Return the cached answer, or None on a miss or an expired entry."""
+        key = self.make_key(question, user_id, version)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and self._conn is not None:
+                entry = self._load(key)
+                if entry is not None:
+                    self._entries[key] = entry
+            if entry is not None and now - entry[0] <= self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                self._delete(key)
+                if self._conn is not None:
+                    self._conn.commit()
+            self.misses += 1
+            return None
+
+    def put(self, question: str, user_id: Optional[str], version: str, answer: str) -> None:
+        """Store an answer and evict the least recently used entries if needed."""
+        key = self.make_key(question, user_id, version)
+        entry = (time.time(), answer)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO answers (key, stored_at, answer) VALUES (?, ?, ?)",
+                    (key, entry[0], answer),
+                )
+            while len(self._entries) > self.max_entries:
+                oldest, _ = self._entries.popitem(last=False)
+                self._delete(oldest)
+                self.evictions += 1
+            if self._conn is not None:
+                self._conn.commit()
+
+    @property
+    def generation(self) -> int:
+        """Number of writes done so far (read from the backend, which other processes may share)."""
+        with self._lock:
+            if self._conn is not None:
+                row = self._conn.execute("SELECT value FROM meta WHERE name = 'generation'").fetchone()
+                self._generation = row[0] if row else 0
+            return self._generation
+
+    def bump_generation(self) -> int:
+        """Record a write: answers cached under earlier generations are no longer served."""
+        with self._lock:
+            if self._conn is None:
+                self._generation += 1
+                return self._generation
+            self._conn.execute(
+                "INSERT INTO meta (name, value) VALUES ('generation', 1) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + 1"
+            )
+            self._conn.commit()
+            self._generation = self._conn.execute("SELECT value FROM meta WHERE name = 'generation'").fetchone()[0]
+            return self._generation
+
+    def clear(self) -> None:
+        """Drop every cached answer, including the persistent ones."""
+        with self._lock:
+            self._entries.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM answers")
+                self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and the current size."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+        }
+
+    def _open_backend(self, path: str) -> sqlite3.Connection:
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers (key TEXT PRIMARY KEY, stored_at REAL NOT NULL, answer TEXT NOT NULL)"
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        # Warm the in-memory LRU with the most recent persisted answers
+        rows = conn.execute(
+            "SELECT key, stored_at, answer FROM answers ORDER BY stored_at DESC LIMIT ?",
+            (self.max_entries,),
+        ).fetchall()
+        for key, stored_at, answer in reversed(rows):
+            self._entries[key] = (stored_at, answer)
+        conn.execute(
+            "DELETE FROM answers WHERE key NOT IN (SELECT key FROM answers ORDER BY stored_at DESC LIMIT ?)",
+            (self.max_entries,),
+        )
+        conn.commit()
+        return conn
+
+    def _load(self, key: str) -> Optional[Tuple[float, str]]:
+        row = self._conn.execute("SELECT stored_at, answer FROM answers WHERE key = ?", (key,)).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def _delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+        if self._conn is not None:
+            self._conn.execute("DELETE FROM answers WHERE key = ?", (key,))
@@ -0,0 +1,168 @@
+"""
+Benchmark: hot statements before and after the indexes suggested by index_advisor.py.
+
+    python -m benchmarks.bench_index_advisor --employees 300 --days 365
+    python -m benchmarks.bench_index_advisor --output migrations/generated.sql
+    DATABASE_URL=sqlite:///eis.db python -m benchmarks.bench_index_advisor
+
+Without DATABASE_URL a temporary SQLite database is filled with synthetic activity reports
+and leave requests, indexed like kimble_db_merged.sql (single-column keys only). The
+workload replays the statements of generate_activity_report (summary and first page for
+one user and one month) and the leave existence probe of create_leave_requests. Every
+statement is timed by a QueryLog; the advisor explains the most expensive fingerprints,
+the suggested indexes are created, the workload is replayed and the per-fingerprint
+latencies are compared. The indexes are dropped again at the end.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+from datetime import date, timedelta
+from typing import Dict, List
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
+
+from index_advisor import IndexAdvisor
+from leave_requests import create_leave_requests
+from query_log import QueryLog, format_top
+
+FIRST_DAY = date(2025, 1, 1)
+
+
+def make_sqlite_engine(employees: int, days: int, seed: int = 7) -> Engine:
+    """Temporary SQLite database with the tables and indexes of the MySQL dump."""
+    path = os.path.join(tempfile.mkdtemp(), "bench_indexes.db")
+    engine = create_engine(f"sqlite:///{path}")
+    rng = random.Random(seed)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE employees (employee_id INTEGER PRIMARY KEY, name TEXT, manager_id INT)"))
+        conn.execute(text(
+            "CREATE TABLE activity_reports (report_id INTEGER PRIMARY KEY, employee_id INT NOT NULL, "
+            "project_id INT NOT NULL, date DATE NOT NULL, hours INT NOT NULL, status TEXT NOT NULL, "
+            "created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+        ))
+        conn.execute(text("CREATE INDEX employee_id ON activity_reports (employee_id)"))
+        conn.execute(text("CREATE INDEX project_id ON activity_reports (project_id)"))
+        conn.execute(text(
+            "CREATE TABLE leave_requests (leave_id INTEGER PRIMARY KEY, employee_id INT NOT NULL, "
+            "manager_id INT NOT NULL, start_date DATE NOT NULL, end_date DATE NOT NULL, type TEXT NOT NULL, "
+            "status TEXT NOT NULL, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+        ))
+        conn.execute(text("CREATE INDEX leave_employee_id ON leave_requests (employee_id)"))
+        conn.execute(text("CREATE INDEX leave_manager_id ON leave_requests (manager_id)"))
+        conn.execute(
+            text("INSERT INTO employees (employee_id, name, manager_id) VALUES (:id, :name, 51)"),
+            [{"id": 100 + i, "name": f"Employee {i}"} for i in range(employees)],
+        )
+        for i in range(employees):
+            conn.execute(
+                text(
+                    "INSERT INTO activity_reports (employee_id, project_id, date, hours, status) "
+                    "VALUES (:e, :p, :d, :h, :s)"
+                ),
+                [
+                    {
+                        "e": 100 + i, "p": rng.randint(1, 40), "d": (FIRST_DAY + timedelta(days=d)).isoformat(),
+                        "h": rng.randint(1, 8), "s": rng.choice(["Approved", "Submitted", "Rejected"]),
+                    }
+                    for d in range(days) if d % 7 < 5
+                ],
+            )
+            conn.execute(
+                text(
+                    "INSERT INTO leave_requests (employee_id, manager_id, start_date, end_date, type, status) "
+                    "VALUES (:e, 51, :d, :d, :t, 'Approved')"
+                ),
+                [
+                    {"e": 100 + i, "d": (FIRST_DAY + timedelta(days=d)).isoformat(), "t": rng.choice(["Vacation", "Sick", "Weather"])}
+                    for d in rng.sample(range(days), min(days, 25))
+                ],
+            )
+    return engine
+
+
+def load_workload(engine: Engine) -> Dict[str, List[date]]:
+    """Employee ID -> days they already have a Weather leave request for (read before logging starts)."""
+    with engine.connect() as conn:
+        employees = {str(row[0]): [] for row in conn.execute(text("SELECT employee_id FROM employees"))}
+        for employee_id, day in conn.execute(text("SELECT employee_id, start_date FROM leave_requests WHERE type = 'Weather'")):
+            employees[str(employee_id)].append(date.fromisoformat(str(day)[:10]))
+    return employees
+
+
+def run_workload(engine: Engine, workload: Dict[str, List[date]], rounds: int, seed: int = 11) -> None:
+    """Report statements of generate_activity_report and leave probes of create_leave_requests."""
+    rng = random.Random(seed)
+    employee_ids = sorted(workload)
+    where = "WHERE date BETWEEN :start_date AND :end_date AND employee_id = :user_id"
+    for _ in range(rounds):
+        user_id = rng.choice(employee_ids)
+        month = FIRST_DAY + timedelta(days=rng.randrange(0, 300))
+        params = {"start_date": month.isoformat(), "end_date": (month + timedelta(days=30)).isoformat(), "user_id": user_id}
+        with engine.connect() as conn:
+            conn.execute(text(
+                "SELECT COUNT(*) AS entries, SUM(hours) AS hours, MIN(date) AS first_date, MAX(date) AS last_date "
+                f"FROM activity_reports {where}"
+            ), params).fetchall()
+            conn.execute(text(
+                f"SELECT report_id, date, hours, status, employee_id FROM activity_reports {where} "
+                "ORDER BY date DESC, report_id DESC LIMIT :limit"
+            ), dict(params, limit=51)).fetchall()
+        # Already requested days: the probe finds them all and nothing is inserted
+        if workload[user_id]:
+            create_leave_requests(engine, {user_id: workload[user_id]}, leave_type="Weather")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--employees", type=int, default=300)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--output", help="Write the suggested migration SQL to this file")
+    args = parser.parse_args()
+
+    database_url = os.getenv("DATABASE_URL")
+    engine = create_engine(database_url) if database_url else make_sqlite_engine(args.employees, args.days)
+    workload = load_workload(engine)
+    log = QueryLog().install(engine)
+
+    run_workload(engine, workload, args.rounds)
+    before = {stats.fingerprint: stats for stats in log.top(args.top)}
+    print(f"📊 {log.statements} statement(s), {len(log.fingerprints)} fingerprint(s), {engine.dialect.name}")
+    print(format_top(before.values()))
+
+    advisor = IndexAdvisor(engine)
+    suggestions, report = advisor.analyze(before.values())
+    print("\n🔎 Advisor")
+    for entry in report:
+        print(f"  {entry['fingerprint'][:90]}\n    -> {entry['outcome']}")
+    migration = advisor.render_migration(suggestions)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(migration)
+        print(f"✅ Migration written to {args.output}")
+    else:
+        print("\n" + migration)
+    if not suggestions:
+        return
+
+    advisor.apply(suggestions)
+    try:
+        log.reset()
+        run_workload(engine, workload, args.rounds)
+        after: Dict[str, List[float]] = {stats.fingerprint: list(stats.latencies) for stats in log.top(len(log.fingerprints))}
+    finally:
+        advisor.rollback(suggestions)
+
+    print(f"{'mean ms before':>15} {'after':>8} {'speedup':>8}  statement")
+    for shape, stats in before.items():
+        if shape in after:
+            mean_after = statistics.mean(after[shape])
+            print(f"{stats.mean_ms:>15.3f} {mean_after:>8.3f} {stats.mean_ms / max(mean_after, 1e-6):>7.1f}x  {shape[:80]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Benchmark: LLM calls, quota errors and waits, direct model calls vs. the LLM scheduler.
+
+    python -m benchmarks.bench_llm_scheduler --latency 0.2 --quota 10
+
+The model is a local fake with a fixed latency per call and a quota of --quota calls per
+second, answering 429 RESOURCE_EXHAUSTED beyond it (like Gemini's per-minute quota, scaled down):
+
+    duplicates   --threads sessions asking --distinct different prompts at once
+    quota        --threads different prompts at once, more than the quota allows
+    lanes        a batch job of --threads prompts, then a few interactive ones while it runs
+"""
+import argparse
+import contextvars
+import statistics
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from llm_scheduler import LLMScheduler, ScheduledChatModel, llm_lane
+
+
+class QuotaExceeded(Exception):
+    code = 429
+
+
+class QuotaChatModel(BaseChatModel):
+    """Fake model: latency_seconds per call, at most quota_per_second calls started per second."""
+
+    latency_seconds: float = 0.2
+    quota_per_second: int = 10
+    calls: int = 0
+    rejected: int = 0
+    started: Deque[float] = deque()
+    lock: Any = threading.Lock()
+
+    @property
+    def _llm_type(self) -> str:
+        return "quota-fake"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        now = time.monotonic()
+        with self.lock:
+            while self.started and self.started[0] <= now - 1:
+                self.started.popleft()
+            if len(self.started) >= self.quota_per_second:
+                self.rejected += 1
+                raise QuotaExceeded("429 RESOURCE_EXHAUSTED. Quota exceeded, please retry in 0.5s")
+            self.started.append(now)
+            self.calls += 1
+        time.sleep(self.latency_seconds)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=f"Answer to {messages[-1].content}"))])
+
+
+def run_batch(prompts: List[str], ask: Callable[[str], Any], threads: int) -> Dict[str, Any]:
+    latencies, errors = [], 0
+
+    def one(prompt: str) -> None:
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            ask(prompt)
+        except Exception:
+            errors += 1
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        # Each caller keeps the LLM lane of the batch
+        futures = [pool.submit(contextvars.copy_context().run, one, prompt) for prompt in prompts]
+        for future in futures:
+            future.result()
+    return {"seconds": time.perf_counter() - start, "errors": errors, "p95": sorted(latencies)[int(len(latencies) * 0.95) - 1]}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.2, help="Fake model latency per call (seconds)")
+    parser.add_argument("--quota", type=int, default=10, help="Calls per second the fake model accepts")
+    parser.add_argument("--threads", type=int, default=40)
+    parser.add_argument("--distinct", type=int, default=5)
+    args = parser.parse_args()
+
+    def setup(scheduled: bool, **overrides: Any) -> Dict[str, Any]:
+        model = QuotaChatModel(latency_seconds=args.latency, quota_per_second=args.quota, started=deque(), lock=threading.Lock())
+        scheduler = LLMScheduler(**{
+            "rate_per_minute": args.quota * 60, "burst": args.quota, "max_concurrency": args.threads,
+            "base_delay": 0.1, "max_delay": 2.0, **overrides,
+        })
+        chat = ScheduledChatModel(inner=model, scheduler=scheduler) if scheduled else model
+        return {"model": model, "scheduler": scheduler, "ask": lambda prompt: chat.invoke([HumanMessage(content=prompt)])}
+
+    scenarios = {
+        "duplicates": [f"question {i % args.distinct}" for i in range(args.threads)],
+        "quota": [f"question {i}" for i in range(args.threads)],
+    }
+    print(f"📊 Fake LLM: {args.latency * 1000:.0f} ms per call, quota {args.quota} call(s)/s, {args.threads} concurrent callers")
+    print(f"{'scenario':<12} {'direct calls':>12} {'errors':>7} {'s':>6} {'scheduled calls':>16} {'errors':>7} {'s':>6} {'p95 s':>6}")
+    for name, prompts in scenarios.items():
+        direct, scheduled = setup(False), setup(True)
+        before = run_batch(prompts, direct["ask"], args.threads)
+        after = run_batch(prompts, scheduled["ask"], args.threads)
+        print(f"{name:<12} {direct['model'].calls:>12} {before['errors']:>7} {before['seconds']:>6.2f} "
+              f"{scheduled['model'].calls:>16} {after['errors']:>7} {after['seconds']:>6.2f} {after['p95']:>6.2f}")
+
+    lanes = setup(True, single_flight=False, max_concurrency=4, batch_max_concurrency=3)
+
+    def batch_job() -> None:
+        with llm_lane("batch"):
+            run_batch([f"batch {i}" for i in range(args.threads)], lanes["ask"], args.threads)
+
+    job = threading.Thread(target=batch_job)
+    job.start()
+    time.sleep(args.latency)
+    interactive = [run_batch([f"interactive {i}"], lanes["ask"], 1)["seconds"] for i in range(5)]
+    job.join()
+    waits = lanes["scheduler"].stats()["lanes"]
+    print(f"{'lanes':<12} interactive answer mean {statistics.mean(interactive):.2f} s "
+          f"(wait mean {waits['interactive']['wait_mean_ms']:.0f} ms), batch wait mean "
+          f"{waits['batch']['wait_mean_ms']:.0f} ms / p95 {waits['batch']['wait_p95_ms']:.0f} ms, "
+          f"peak batch queue {waits['batch']['peak_queued']}")
+
+
+if __name__ == "__main__":
+    main()
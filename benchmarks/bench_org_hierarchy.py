@@ -0,0 +1,117 @@
+"""
+Benchmark: reporting-line questions with recursive SQL vs. the in-memory OrgHierarchy index.
+
+    python -m benchmarks.bench_org_hierarchy --employees 5000 --fanout 6
+
+A temporary SQLite database is filled with a synthetic organisation (one CEO, every manager
+with up to --fanout reports). For random employees, the management chain, everyone under a
+manager, the team size and the manager lookup are answered with the recursive CTEs or
+self-joins the LLM would write, then with the index; the answers are compared and the mean
+latency of each is reported, along with the one-off build and an unchanged-table refresh.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from typing import Callable, Dict, List, Any
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
+
+from org_hierarchy import OrgHierarchy
+
+CHAIN_SQL = """
+WITH RECURSIVE chain(employee_id, manager_id, depth) AS (
+    SELECT employee_id, manager_id, 0 FROM employees WHERE employee_id = :e
+    UNION ALL
+    SELECT e.employee_id, e.manager_id, c.depth + 1 FROM employees e JOIN chain c ON e.employee_id = c.manager_id
+)
+SELECT employee_id FROM chain WHERE depth > 0 ORDER BY depth
+"""
+UNDER_SQL = """
+WITH RECURSIVE under(employee_id) AS (
+    SELECT employee_id FROM employees WHERE manager_id = :e
+    UNION ALL
+    SELECT e.employee_id FROM employees e JOIN under u ON e.manager_id = u.employee_id
+)
+SELECT employee_id FROM under
+"""
+TEAM_SQL = f"SELECT COUNT(*) FROM ({UNDER_SQL}) t"
+MANAGER_SQL = "SELECT manager_id FROM employees WHERE employee_id = :e"
+
+
+def make_engine(employees: int, fanout: int, seed: int = 11) -> Engine:
+    path = os.path.join(tempfile.mkdtemp(), "bench_org.db")
+    engine = create_engine(f"sqlite:///{path}")
+    rng = random.Random(seed)
+    rows = [{"id": 1, "manager": None}]
+    managers = [1]
+    for employee_id in range(2, employees + 1):
+        manager = rng.choice(managers[-fanout * 4:])
+        rows.append({"id": employee_id, "manager": manager})
+        managers.append(employee_id)
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE employees (employee_id INTEGER PRIMARY KEY, name TEXT NOT NULL, role TEXT NOT NULL, manager_id INT)"
+        ))
+        conn.execute(text("CREATE INDEX manager_id ON employees (manager_id)"))
+        conn.execute(
+            text("INSERT INTO employees (employee_id, name, role, manager_id) VALUES (:id, 'Employee ' || :id, 'Employee', :manager)"),
+            rows,
+        )
+    return engine
+
+
+def timed(run: Callable[[int], Any], samples: List[int]) -> Dict[str, Any]:
+    answers, latencies = [], []
+    for employee_id in samples:
+        start = time.perf_counter()
+        answers.append(run(employee_id))
+        latencies.append((time.perf_counter() - start) * 1e6)
+    return {"answers": answers, "mean_us": statistics.mean(latencies)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--employees", type=int, default=5000)
+    parser.add_argument("--fanout", type=int, default=6)
+    parser.add_argument("--samples", type=int, default=200)
+    args = parser.parse_args()
+
+    engine = make_engine(args.employees, args.fanout)
+    hierarchy = OrgHierarchy(engine, refresh_seconds=3600)
+    start = time.perf_counter()
+    hierarchy.refresh()
+    build_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    hierarchy.refresh(force=True)
+    check_ms = (time.perf_counter() - start) * 1000
+    samples = random.Random(3).sample(range(1, args.employees + 1), min(args.samples, args.employees))
+
+    with engine.connect() as conn:
+        def sql(statement: str, scalar: bool = False) -> Callable[[int], Any]:
+            def run(employee_id: int) -> Any:
+                result = conn.execute(text(statement), {"e": employee_id})
+                return result.scalar() if scalar else [row[0] for row in result]
+            return run
+
+        cases = {
+            "chain": (sql(CHAIN_SQL), hierarchy.chain),
+            "everyone under": (lambda e: sorted(sql(UNDER_SQL)(e)), lambda e: sorted(hierarchy.descendants(e))),
+            "team size": (sql(TEAM_SQL, scalar=True), hierarchy.team_size),
+            "manager": (sql(MANAGER_SQL, scalar=True), hierarchy.manager_of),
+        }
+        print(f"📊 {args.employees} employees, {len(samples)} sampled; index built in {build_ms:.1f} ms, "
+              f"unchanged-table check {check_ms:.2f} ms")
+        print(f"{'question':<16} {'SQL µs':>10} {'index µs':>10} {'speedup':>9} {'same':>6}")
+        for name, (by_sql, by_index) in cases.items():
+            before, after = timed(by_sql, samples), timed(by_index, samples)
+            same = before["answers"] == after["answers"]
+            print(f"{name:<16} {before['mean_us']:>10.1f} {after['mean_us']:>10.1f} "
+                  f"{before['mean_us'] / after['mean_us']:>8.0f}x {'✅' if same else '❌':>5}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark: schema tokens and agent iterations with and without question-aware schema pruning.
+
+    DATABASE_URL=sqlite:///eis.db python -m benchmarks.bench_schema_pruning
+    python -m benchmarks.bench_schema_pruning --live   # also runs the agent (needs GOOGLE_API_KEY)
+
+The offline part compares, for a fixed question set, the schema injected into the prompt
+(DDL + sample rows of the selected tables) with the schema of every table, and checks that
+the tables each question needs were selected. With --live every question is answered by
+the agent twice, with pruning off and on, and the agent steps, schema lookups
+(sql_db_list_tables / sql_db_schema calls) and latencies are compared.
+"""
+import argparse
+import statistics
+import time
+from typing import Dict, List, Tuple
+
+from run_sql_agent import ActivityReportAgent
+from schema_index import estimate_tokens
+
+# Question -> tables its SQL needs
+QUESTIONS: List[Tuple[str, List[str]]] = [
+    ("How many leave requests are still pending?", ["leave_requests"]),
+    ("Which employees have more than 20 days of leave balance?", ["employees"]),
+    ("Who is the manager of Jacob Lee?", ["employees"]),
+    ("Which project has the most hours logged in July 2025?", ["activity_reports", "projects"]),
+    ("List the projects of the Engineering department", ["projects"]),
+    ("Who is assigned to the Apollo project?", ["employees", "project_assignments", "projects"]),
+    ("How many days was employee 54 absent last month?", ["presence"]),
+    ("Which employees worked remotely on 2025-07-15?", ["employees", "presence"]),
+    ("How many vacation days did my team take in July?", ["employees", "leave_requests"]),
+    ("How many activity reports were rejected this month?", ["activity_reports"]),
+    ("What are the email addresses of all managers?", ["employees"]),
+    ("Total hours per department in 2025", ["activity_reports", "projects"]),
+]
+
+
+def run_offline(agent: ActivityReportAgent) -> None:
+    index = agent.schema_index
+    full = index.full_schema_tokens()
+    print(f"{'question':<60} {'tables':>6} {'tokens':>7} {'recall':>7}")
+    sent, recalls = [], []
+    for question, expected in QUESTIONS:
+        tables = index.select_tables(question)
+        tokens = estimate_tokens(index.schema_prompt(tables)) if tables else 0
+        recall = len(set(expected) & set(tables)) / len(expected)
+        sent.append(tokens)
+        recalls.append(recall)
+        print(f"{question[:60]:<60} {len(tables):>6} {tokens:>7} {recall:>7.0%}")
+    mean = statistics.mean(sent)
+    print(f"\nAll {len(index.table_info)} tables: ~{full} schema tokens")
+    print(f"Pruned: ~{mean:.0f} schema tokens per question ({1 - mean / full:.0%} fewer), "
+          f"mean recall {statistics.mean(recalls):.0%}")
+
+
+def run_live(agent: ActivityReportAgent) -> None:
+    results: Dict[bool, Dict[str, List[float]]] = {}
+    for pruning in (False, True):
+        agent.schema_pruning = pruning
+        agent._agent = None  # the prompt depends on the mode
+        runs = {"steps": [], "lookups": [], "seconds": []}
+        for question, _ in QUESTIONS:
+            start = time.perf_counter()
+            response = agent.run_agent(question)
+            steps = response.get("intermediate_steps", [])
+            runs["seconds"].append(time.perf_counter() - start)
+            runs["steps"].append(len(steps))
+            runs["lookups"].append(
+                sum(1 for action, _ in steps if action.tool in ("sql_db_list_tables", "sql_db_schema"))
+            )
+        results[pruning] = runs
+
+    print(f"\n{'mode':<10} {'steps':>7} {'lookups':>8} {'p50 s':>7} {'mean s':>7}")
+    for pruning, runs in results.items():
+        print(
+            f"{'pruned' if pruning else 'full':<10} {statistics.mean(runs['steps']):>7.2f} "
+            f"{statistics.mean(runs['lookups']):>8.2f} {statistics.median(runs['seconds']):>7.2f} "
+            f"{statistics.mean(runs['seconds']):>7.2f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark question-aware schema pruning")
+    parser.add_argument("--live", action="store_true", help="Also run the agent on every question in both modes")
+    parser.add_argument("--user-id", default="52")
+    args = parser.parse_args()
+
+    agent = ActivityReportAgent(user_id=args.user_id)
+    run_offline(agent)
+    if args.live:
+        run_live(agent)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark: LLM calls per question with and without retrieved SQL examples.
+
+    DATABASE_URL=sqlite:///eis.db python -m benchmarks.bench_sql_examples
+    python -m benchmarks.bench_sql_examples --live   # also runs the agent (needs GOOGLE_API_KEY)
+
+The replay set rephrases the kind of questions the verified examples cover. The offline
+part shows which example BM25 retrieves for each question; with --live every question
+is answered by the agent without examples and with the top-k examples, and the LLM
+calls, agent steps and latencies are compared.
+"""
+import argparse
+import statistics
+import time
+from typing import Dict, List
+
+from run_sql_agent import ActivityReportAgent
+
+REPLAY_QUESTIONS: List[str] = [
+    "How many hours were logged on each project last month?",
+    "Hours by department for approved timesheets",
+    "Who manages Candice Martinez?",
+    "List the direct reports of Jacob Lee",
+    "Which manager has the most pending leave requests?",
+    "Which employees are assigned to Project B1?",
+    "Who was absent on 2025-07-28?",
+    "Which employees did not log any hours in August 2025?",
+    "How many approved vacation requests does each employee have?",
+    "What is the average number of hours per activity report?",
+]
+
+
+def run_offline(agent: ActivityReportAgent, k: int) -> None:
+    print(f"{'question':<58} {'score':>6}  best example")
+    for question in REPLAY_QUESTIONS:
+        examples = agent.sql_examples.search(question, k)
+        best = examples[0] if examples else None
+        print(f"{question[:58]:<58} {best['score'] if best else 0:>6}  {best['question'] if best else '-'}")
+
+
+def run_live(agent: ActivityReportAgent, k: int) -> None:
+    results: Dict[int, Dict[str, List[float]]] = {}
+    for examples_k in (0, k):
+        agent.sql_examples_k = examples_k
+        runs = {"llm_calls": [], "steps": [], "seconds": []}
+        for question in REPLAY_QUESTIONS:
+            before = dict(agent.agent_stats)
+            start = time.perf_counter()
+            agent.run_agent(question)
+            runs["seconds"].append(time.perf_counter() - start)
+            runs["llm_calls"].append(agent.agent_stats["llm_calls"] - before["llm_calls"])
+            runs["steps"].append(agent.agent_stats["agent_steps"] - before["agent_steps"])
+        results[examples_k] = runs
+
+    print(f"\n{'examples':<10} {'LLM calls':>10} {'steps':>7} {'p50 s':>7} {'mean s':>7}")
+    for examples_k, runs in results.items():
+        print(
+            f"{examples_k:<10} {statistics.mean(runs['llm_calls']):>10.2f} {statistics.mean(runs['steps']):>7.2f} "
+            f"{statistics.median(runs['seconds']):>7.2f} {statistics.mean(runs['seconds']):>7.2f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark retrieval of verified SQL examples")
+    parser.add_argument("--live", action="store_true", help="Also run the agent on every question with and without examples")
+    parser.add_argument("--k", type=int, default=3, help="Examples injected per question")
+    parser.add_argument("--user-id", default="52")
+    args = parser.parse_args()
+
+    agent = ActivityReportAgent(user_id=args.user_id)
+    run_offline(agent, args.k)
+    if args.live:
+        run_live(agent, args.k)
+
+
+if __name__ == "__main__":
+    main()
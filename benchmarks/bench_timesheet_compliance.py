@@ -0,0 +1,91 @@
+"""
+Benchmark: "who hasn't submitted their timesheet" with per-day SQL vs. TimesheetCompliance.
+
+    python -m benchmarks.bench_timesheet_compliance --employees 500 --days 90
+
+A temporary SQLite database is filled with the synthetic HR dataset. For the last --range
+working days, the gaps are computed with the per-day anti-join the LLM would write (one
+query per working day), then with the engine cold (columns loaded) and warm (columns
+cached); the per-employee gap counts are compared and the latency of each is reported.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from collections import Counter
+from datetime import date
+from typing import Dict, List
+
+from sqlalchemy import create_engine, text
+
+from benchmarks.synthetic_data import generate
+from org_hierarchy import OrgHierarchy
+from timesheet_compliance import TimesheetCompliance, working_days
+
+GAP_SQL = """
+SELECT e.employee_id FROM employees e
+WHERE NOT EXISTS (SELECT 1 FROM activity_reports a WHERE a.employee_id = e.employee_id AND a.date = :d
+                  AND a.status IN ('Submitted', 'Approved'))
+  AND NOT EXISTS (SELECT 1 FROM presence p WHERE p.employee_id = e.employee_id AND p.date = :d
+                  AND p.status IN ('On Leave', 'Absent'))
+  AND NOT EXISTS (SELECT 1 FROM leave_requests l WHERE l.employee_id = e.employee_id AND l.status = 'Approved'
+                  AND l.start_date <= :d AND l.end_date >= :d)
+"""
+
+
+def by_sql(conn, days: List[date]) -> Dict[int, int]:
+    counts = Counter()
+    for day in days:
+        counts.update(row[0] for row in conn.execute(text(GAP_SQL), {"d": day.isoformat()}))
+    return dict(counts)
+
+
+def by_engine(compliance: TimesheetCompliance, days: List[date]) -> Dict[int, int]:
+    result = compliance.gaps(days[0], days[-1])
+    return {
+        employee_id: sum(counts[kind] for kind in ("missing", "draft", "rejected"))
+        for employee_id, counts in result["by_employee"].items()
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--employees", type=int, default=500)
+    parser.add_argument("--days", type=int, default=90, help="Days of generated history")
+    parser.add_argument("--range", type=int, default=45, help="Working days asked about")
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_timesheet.db')}"
+    generate(url, employee_count=args.employees, days=args.days)
+    engine = create_engine(url)
+    days = working_days(date.fromordinal(date.today().toordinal() - args.days + 1), date.today())[-args.range:]
+
+    with engine.connect() as conn:
+        start = time.perf_counter()
+        expected = by_sql(conn, days)
+        sql_ms = (time.perf_counter() - start) * 1000
+
+    compliance = TimesheetCompliance(engine, OrgHierarchy(engine), ttl_seconds=3600)
+    start = time.perf_counter()
+    cold = by_engine(compliance, days)
+    cold_ms = (time.perf_counter() - start) * 1000
+    warm_ms = []
+    for _ in range(args.rounds):
+        start = time.perf_counter()
+        warm = by_engine(compliance, days)
+        warm_ms.append((time.perf_counter() - start) * 1000)
+
+    same = expected == cold == warm
+    print(f"📊 {args.employees} employees x {len(days)} working days "
+          f"({days[0]} to {days[-1]}), {sum(expected.values())} gap(s) over {len(expected)} employee(s)")
+    print(f"{'method':<22} {'ms':>10} {'speedup':>9}")
+    print(f"{'per-day SQL':<22} {sql_ms:>10.1f} {'1x':>9}")
+    print(f"{'engine (cold)':<22} {cold_ms:>10.1f} {sql_ms / cold_ms:>8.0f}x")
+    print(f"{'engine (warm, mean)':<22} {statistics.mean(warm_ms):>10.2f} {sql_ms / statistics.mean(warm_ms):>8.0f}x")
+    print(f"same answers: {'✅' if same else '❌'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark: HTTP calls and latency of the weather tools, per-call requests.get vs. WeatherClient.
+
+    python -m benchmarks.bench_weather_client --latency 0.1
+
+Runs against a local fake OpenWeatherMap server (fake_openweather.py) with the given
+per-request latency:
+
+    repeated     the same city asked N times in a row
+    plan+create  plan_weather_based_leave then create_weather_based_leave (two forecasts)
+    concurrent   N threads asking for the same forecast at once
+    retry        the server fails the first two requests with a 503
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict
+
+import requests
+
+from fake_openweather import FakeOpenWeatherServer
+from weather_client import WeatherClient
+
+
+def legacy_get(base_url: str, endpoint: str, location: str) -> Dict:
+    """The original tool code: a fresh requests.get per call, no timeout, no retry, no cache."""
+    response = requests.get(f"{base_url}/{endpoint}?q={location}&appid=fake&units=metric")
+    data = response.json()
+    if response.status_code != 200:
+        raise Exception(f"Weather API error: {data.get('message', 'Unknown error')}")
+    return data
+
+
+def measure(server: FakeOpenWeatherServer, run: Callable[[], None]) -> Dict[str, float]:
+    before = sum(server.requests.values())
+    start = time.perf_counter()
+    try:
+        run()
+        outcome = "ok"
+    except Exception as e:
+        outcome = f"error: {str(e)[:40]}"
+    return {"seconds": time.perf_counter() - start, "http": sum(server.requests.values()) - before, "outcome": outcome}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.1, help="Fake server latency per request (seconds)")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=20)
+    args = parser.parse_args()
+
+    server = FakeOpenWeatherServer(latency=args.latency).start()
+    base_url = server.base_url
+    try:
+        def new_client() -> WeatherClient:
+            return WeatherClient(api_key="fake", base_url=base_url, backoff=0.05)
+
+        scenarios = {}
+        client = new_client()
+        scenarios["repeated"] = (
+            lambda: [legacy_get(base_url, "weather", "Paris,FR") for _ in range(args.repeat)],
+            lambda: [client.temperature("Paris,FR") for _ in range(args.repeat)],
+        )
+        client_plan = new_client()
+        scenarios["plan+create"] = (
+            lambda: [legacy_get(base_url, "forecast", "Seville,ES") for _ in range(2)],
+            lambda: [client_plan.daily_max("Seville,ES") for _ in range(2)],
+        )
+        client_concurrent = new_client()
+
+        def concurrent(fetch: Callable[[], Dict]) -> Callable[[], None]:
+            def run() -> None:
+                with ThreadPoolExecutor(max_workers=args.threads) as pool:
+                    list(pool.map(lambda _: fetch(), range(args.threads)))
+            return run
+
+        scenarios["concurrent"] = (
+            concurrent(lambda: legacy_get(base_url, "forecast", "Dubai,AE")),
+            concurrent(lambda: client_concurrent.forecast("Dubai,AE")),
+        )
+
+        print(f"📊 Fake OpenWeatherMap at {base_url}, {args.latency * 1000:.0f} ms per request")
+        print(f"{'scenario':<14} {'legacy http':>11} {'legacy s':>9} {'client http':>11} {'client s':>9}")
+        for name, (legacy, cached) in scenarios.items():
+            before, after = measure(server, legacy), measure(server, cached)
+            print(f"{name:<14} {before['http']:>11} {before['seconds']:>9.2f} {after['http']:>11} {after['seconds']:>9.2f}")
+
+        server.fail_first = 2
+        legacy = measure(server, lambda: legacy_get(base_url, "weather", "Oslo,NO"))
+        server.fail_first = 2
+        retried = measure(server, lambda: new_client().temperature("Oslo,NO"))
+        print(f"{'retry':<14} legacy: {legacy['outcome']}; client: {retried['outcome']} after {retried['http']} HTTP call(s)")
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+"""
+Offline replay benchmark: the README example questions through the whole agent, without
+Gemini or OpenWeatherMap.
+
+    python -m benchmarks.replay --employees 2000 --days 365 --rounds 5 --output before.json
+    python -m benchmarks.replay --employees 2000 --days 365 --rounds 5 --compare before.json
+
+A synthetic dataset (benchmarks/synthetic_data.py) is generated into a temporary SQLite
+database, or --url points at an existing one (MySQL included; it is only regenerated with
+--generate). The LLM is ReplayChatModel (stub_llm.py) replaying the recorded tool calls of
+benchmarks/traces/readme_questions.json, with an optional simulated latency per LLM turn,
+and the weather tools talk to fake_openweather.py on a local port. Everything else (intent
+router, schema pruning, query guard, SQL tools, org index, leave creation) is the real code.
+
+Each question is asked --rounds times after --warmup rounds, by --concurrency threads. The
+answer, SQL and weather caches are disabled unless --caches is given, so every round does
+the full work. Reported per question and overall: p50/p95/mean latency, time spent in SQL,
+throughput, and the process peak RSS. --output saves the results with the parameters and
+git commit; --compare prints the change against such a file. Runs with the same parameters
+and seed replay the same data and the same calls, so their numbers are comparable.
+
+--record PATH asks the questions once to the live LLM (GOOGLE_API_KEY) against the same
+database and writes the tool calls it made as a new trace file.
+
+In the traces, {yesterday}, {today}, {next_monday} and {next_friday} are replaced by dates
+before the run, and {observation} in a final answer by the output of the last tool call.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from typing import Optional, Dict, Any, List, Tuple
+
+from benchmarks.synthetic_data import generate
+from fake_openweather import FakeOpenWeatherServer
+from query_log import QueryLog
+from stub_llm import ReplayChatModel
+
+DEFAULT_TRACES = os.path.join(os.path.dirname(__file__), "traces", "readme_questions.json")
+
+
+class SQLTimer(QueryLog):
+    """QueryLog that also sums the SQL time of the calling thread (EXPLAINs of the guard included)."""
+
+    def __init__(self):
+        super().__init__()
+        self._local = threading.local()
+
+    def record(self, statement: str, parameters: Any, elapsed_ms: float) -> None:
+        self._local.ms = getattr(self._local, "ms", 0.0) + elapsed_ms
+        super().record(statement, parameters, elapsed_ms)
+
+    def take(self) -> float:
+        """SQL milliseconds of this thread since the last call."""
+        elapsed, self._local.ms = getattr(self._local, "ms", 0.0), 0.0
+        return elapsed
+
+
+def load_traces(path: str, today: Optional[date] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """Load a trace file, filling in the date placeholders."""
+    today = today or date.today()
+    next_monday = today + timedelta(days=7 - today.weekday())
+    dates = {
+        "{today}": today.isoformat(),
+        "{yesterday}": (today - timedelta(days=1)).isoformat(),
+        "{next_monday}": next_monday.isoformat(),
+        "{next_friday}": (next_monday + timedelta(days=4)).isoformat(),
+    }
+    with open(path, encoding="utf-8") as f:
+        raw = f.read()
+    for placeholder, value in dates.items():
+        raw = raw.replace(placeholder, value)
+    return json.loads(raw)
+
+
+def trace_from_steps(steps: List[Tuple[Any, Any]], output: str) -> List[Dict[str, Any]]:
+    """Turns of a trace from an agent run's intermediate steps and final answer."""
+    turns: List[Dict[str, Any]] = []
+    last_message = None
+    for action, _ in steps:
+        message = (getattr(action, "message_log", None) or [None])[0]
+        args = action.tool_input if isinstance(action.tool_input, dict) else {"input": action.tool_input}
+        call = {"name": action.tool, "args": args}
+        # Tool calls made in the same LLM turn share its message
+        if turns and message is not None and message is last_message:
+            turns[-1]["tool_calls"].append(call)
+        else:
+            turns.append({"tool_calls": [call]})
+            last_message = message
+    # return_direct tools end the run with their own output, without a final LLM turn
+    if not steps or str(steps[-1][1]) != output:
+        turns.append({"content": output})
+    return turns
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+
+def summarize(latencies: List[float], sql: List[float]) -> Dict[str, float]:
+    return {
+        "count": len(latencies),
+        "p50_ms": round(percentile(latencies, 0.5), 2),
+        "p95_ms": round(percentile(latencies, 0.95), 2),
+        "mean_ms": round(statistics.mean(latencies), 2) if latencies else 0.0,
+        "sql_ms": round(statistics.mean(sql), 2) if sql else 0.0,
+    }
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident memory of this process (None where the resource module is missing)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if platform.system() == "Darwin" else 1024), 1)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def replay(agent, traces: Dict[str, List[Dict[str, Any]]], timer: SQLTimer, rounds: int, warmup: int,
+           concurrency: int, user_id: Optional[str]) -> Dict[str, Any]:
+    """Ask every traced question `rounds` times (after `warmup` untimed rounds) and collect the timings."""
+    questions = list(traces)
+
+    def ask(question: str) -> Tuple[str, float, float]:
+        with agent.user_context(user_id):
+            timer.take()
+            start = time.perf_counter()
+            agent.ask(question)
+            return question, (time.perf_counter() - start) * 1000, timer.take()
+
+    for _ in range(warmup):
+        for question in questions:
+            ask(question)
+
+    latencies: Dict[str, List[float]] = {question: [] for question in questions}
+    sql: Dict[str, List[float]] = {question: [] for question in questions}
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for question, elapsed_ms, sql_ms in pool.map(ask, questions * rounds):
+            latencies[question].append(elapsed_ms)
+            sql[question].append(sql_ms)
+    wall = time.perf_counter() - start
+
+    every_latency = [ms for values in latencies.values() for ms in values]
+    every_sql = [ms for values in sql.values() for ms in values]
+    overall = summarize(every_latency, every_sql)
+    overall["throughput_qps"] = round(len(every_latency) / wall, 2) if wall else 0.0
+    overall["sql_share"] = round(sum(every_sql) / sum(every_latency), 3) if sum(every_latency) else 0.0
+    overall["peak_rss_mb"] = peak_rss_mb()
+    return {
+        "questions": {question: summarize(latencies[question], sql[question]) for question in questions},
+        "overall": overall,
+    }
+
+
+def record(agent, questions: List[str], user_id: Optional[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """Run each question once through the agent and return the tool calls it made as traces."""
+    traces = {}
+    with agent.user_context(user_id):
+        for question in questions:
+            response = agent.run_agent(question)
+            traces[question] = trace_from_steps(response.get("intermediate_steps", []), str(response["output"]))
+            print(f"🎙️  {question}: {len(traces[question])} turn(s)")
+    return traces
+
+
+def print_results(results: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None) -> None:
+    def delta(now: float, before: Optional[float]) -> str:
+        if not before:
+            return ""
+        return f" ({(now - before) / before * 100:+.0f}%)"
+
+    previous = (baseline or {}).get("questions", {})
+    print(f"{'question':<60} {'p50 ms':>16} {'p95 ms':>16} {'SQL ms':>8}")
+    for question, stats in results["questions"].items():
+        old = previous.get(question, {})
+        label = question if len(question) <= 60 else question[:59] + "…"
+        print(f"{label:<60} {stats['p50_ms']:>9.1f}{delta(stats['p50_ms'], old.get('p50_ms')):>7} "
+              f"{stats['p95_ms']:>9.1f}{delta(stats['p95_ms'], old.get('p95_ms')):>7} {stats['sql_ms']:>8.1f}")
+    overall, old = results["overall"], (baseline or {}).get("overall", {})
+    print(f"📊 p50 {overall['p50_ms']:.1f} ms{delta(overall['p50_ms'], old.get('p50_ms'))}, "
+          f"p95 {overall['p95_ms']:.1f} ms{delta(overall['p95_ms'], old.get('p95_ms'))}, "
+          f"{overall['throughput_qps']:.1f} questions/s{delta(overall['throughput_qps'], old.get('throughput_qps'))}, "
+          f"SQL {overall['sql_share']:.0%} of the time, peak RSS {overall['peak_rss_mb']} MB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", help="Database URL (default: a generated temporary SQLite database)")
+    parser.add_argument("--generate", action="store_true", help="Regenerate the dataset at --url")
+    parser.add_argument("--employees", type=int, default=500)
+    parser.add_argument("--days", type=int, default=180)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--traces", default=DEFAULT_TRACES)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Simulated seconds per LLM turn")
+    parser.add_argument("--weather-latency", type=float, default=0.0, help="Simulated weather API latency in seconds")
+    parser.add_argument("--user-id", default="52", help="User asking the questions (leave requests are created for them)")
+    parser.add_argument("--caches", action="store_true", help="Keep the answer, SQL and weather caches enabled")
+    parser.add_argument("--output", help="Save the results to this JSON file")
+    parser.add_argument("--compare", help="Results JSON of an earlier run to compare against")
+    parser.add_argument("--record", metavar="PATH", help="Record traces from the live LLM into PATH instead")
+    args = parser.parse_args()
+
+    url = args.url
+    if not url:
+        url = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "replay.db")
+    if not args.url or args.generate:
+        start = time.perf_counter()
+        counts = generate(url, args.employees, args.days, seed=args.seed)
+        print(f"🧪 {sum(counts.values()):,} rows generated in {time.perf_counter() - start:.1f}s "
+              f"({counts['activity_reports']:,} activity reports)")
+
+    weather = FakeOpenWeatherServer(latency=args.weather_latency).start()
+    os.environ["DATABASE_URL"] = url
+    os.environ["OPENWEATHER_BASE_URL"] = weather.base_url
+    os.environ["OPENWEATHER_API_KEY"] = "fake"
+    if not args.caches:
+        os.environ["ANSWER_CACHE_MAX_ENTRIES"] = "0"
+        os.environ["SQL_CACHE_MAX_BYTES"] = "0"
+        os.environ["WEATHER_CURRENT_TTL_SECONDS"] = "0"
+        os.environ["WEATHER_FORECAST_TTL_SECONDS"] = "0"
+
+    from run_sql_agent import ActivityReportAgent
+
+    try:
+        if args.record:
+            agent = ActivityReportAgent(user_id=args.user_id)
+            with open(args.traces, encoding="utf-8") as f:
+                questions = list(json.load(f))
+            with open(args.record, "w", encoding="utf-8") as f:
+                json.dump(record(agent, questions, args.user_id), f, indent=2, ensure_ascii=False)
+            print(f"💾 Traces written to {args.record}")
+            return
+
+        traces = load_traces(args.traces)
+        agent = ActivityReportAgent(user_id=args.user_id, llm=ReplayChatModel(traces=traces, latency_seconds=args.llm_latency))
+        # The executor's verbose trace would dominate the timings of fast questions
+        agent.agent.verbose = False
+        timer = SQLTimer()
+        timer.install(agent.db_engine)
+        timer.install(agent.read_engine)
+        results = replay(agent, traces, timer, args.rounds, args.warmup, args.concurrency, args.user_id)
+    finally:
+        weather.stop()
+
+    params = {
+        "database": url.split(":", 1)[0], "employees": args.employees, "days": args.days, "seed": args.seed,
+        "rounds": args.rounds, "warmup": args.warmup, "concurrency": args.concurrency, "llm_latency": args.llm_latency,
+        "weather_latency": args.weather_latency, "caches": args.caches, "traces": os.path.basename(args.traces),
+    }
+    results = {"params": params, "commit": git_commit(), "at": time.strftime("%Y-%m-%d %H:%M:%S"), **results}
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        different = {key: value for key, value in params.items() if baseline.get("params", {}).get(key) != value}
+        print(f"⚖️  Compared with {args.compare} (commit {baseline.get('commit')})")
+        if different:
+            print(f"⚠️  Parameters differ from the baseline, numbers are not comparable: {different}")
+    print_results(results, baseline)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"💾 Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+"""
+Synthetic HR dataset with the six tables of kimble_db_merged.sql, at any scale.
+
+    python -m benchmarks.synthetic_data --url sqlite:///bench.db --employees 500 --days 180
+    python -m benchmarks.synthetic_data --url sqlite:///big.db --employees 10000 --days 365   # millions of rows
+
+Employee IDs start at 51 like the sample data, and the first ten employees are the sample
+ones (Alice Brown is the CEO, 52-56 are managers), so the README questions make sense.
+Distributions:
+
+    hierarchy          one CEO, ~1 manager per 8 employees in up to three levels
+    projects           one per 10 employees, weighted over five departments
+    assignments        1-3 projects per employee, a fifth of them ended
+    leave_requests     vacations (1-10 working days), personal days, rare disruptions;
+                       past requests mostly approved, future ones pending
+    presence           one row per employee and working day: On Leave during approved
+                       leave, else Present (~95%) or Absent
+    activity_reports   1-3 entries per day present, 6-9 hours split over the employee's
+                       projects; old entries mostly Approved, recent ones Draft/Submitted
+
+Rows are generated day by day (report IDs grow with the date, as in production) and
+inserted in chunks, so memory stays flat whatever the size. The same seed gives the same
+data.
+"""
+import argparse
+import random
+import time
+from datetime import date, datetime, timedelta
+from typing import Optional, Dict, Any, List, Iterator, Tuple
+
+from sqlalchemy import (
+    Column, Date, ForeignKey, Integer, MetaData, String, Table, TIMESTAMP, UniqueConstraint, create_engine, insert,
+)
+from sqlalchemy.engine import Engine
+
+INSERT_CHUNK_SIZE = 20000
+
+SAMPLE_EMPLOYEES = [
+    (51, "Alice Brown", "CEO", None),
+    (52, "Adam Bryan", "Manager", 51),
+    (53, "Jacob Lee", "Manager", 51),
+    (54, "Candice Martinez", "Manager", 51),
+    (55, "Justin Thompson", "Manager", 51),
+    (56, "Heather Rubio", "Manager", 51),
+    (57, "William Jenkins", "Employee", 55),
+    (58, "Brittany Ball", "Employee", 52),
+    (59, "Glenn Johnson", "Employee", 55),
+    (60, "Walter Irwin", "Employee", 54),
+]
+FIRST_NAMES = [
+    "Emma", "Liam", "Olivia", "Noah", "Ava", "Lucas", "Mia", "Ethan", "Sofia", "Mason", "Chloe", "Leo", "Nora",
+    "Hugo", "Lena", "Omar", "Yuki", "Ines", "Raj", "Anna", "Tom", "Sara", "Ivan", "Maya", "Paul", "Zoe",
+]
+LAST_NAMES = [
+    "Smith", "Garcia", "Martin", "Dubois", "Rossi", "Novak", "Kim", "Patel", "Silva", "Schmidt", "Nguyen", "Cohen",
+    "Moreau", "Larsen", "Tanaka", "Costa", "Fischer", "Lopez", "Wright", "Khan", "Meyer", "Jensen", "Ali", "Young",
+]
+DEPARTMENTS = [("Research", 0.3), ("Engineering", 0.3), ("Sales", 0.15), ("Marketing", 0.15), ("Operations", 0.1)]
+
+metadata = MetaData()
+employees = Table(
+    "employees", metadata,
+    Column("employee_id", Integer, primary_key=True, autoincrement=False),
+    Column("name", String(255), nullable=False),
+    Column("email", String(255), nullable=False, unique=True),
+    Column("role", String(50), nullable=False),
+    Column("leave_balance", Integer, server_default="20"),
+    Column("manager_id", Integer, ForeignKey("employees.employee_id"), index=True),
+    Column("created_at", TIMESTAMP),
+)
+projects = Table(
+    "projects", metadata,
+    Column("project_id", Integer, primary_key=True, autoincrement=False),
+    Column("project_name", String(255), nullable=False, unique=True),
+    Column("department", String(100), nullable=False),
+    Column("created_at", TIMESTAMP),
+)
+project_assignments = Table(
+    "project_assignments", metadata,
+    Column("assignment_id", Integer, primary_key=True),
+    Column("employee_id", Integer, ForeignKey("employees.employee_id"), nullable=False),
+    Column("project_id", Integer, ForeignKey("projects.project_id"), nullable=False, index=True),
+    Column("start_date", Date, nullable=False),
+    Column("end_date", Date),
+    UniqueConstraint("employee_id", "project_id", "start_date"),
+)
+activity_reports = Table(
+    "activity_reports", metadata,
+    Column("report_id", Integer, primary_key=True),
+    Column("employee_id", Integer, ForeignKey("employees.employee_id"), nullable=False, index=True),
+    Column("project_id", Integer, ForeignKey("projects.project_id"), nullable=False, index=True),
+    Column("date", Date, nullable=False),
+    Column("hours", Integer, nullable=False),
+    Column("status", String(50), nullable=False),
+    Column("created_at", TIMESTAMP),
+)
+leave_requests = Table(
+    "leave_requests", metadata,
+    Column("leave_id", Integer, primary_key=True),
+    Column("employee_id", Integer, ForeignKey("employees.employee_id"), nullable=False, index=True),
+    Column("manager_id", Integer, ForeignKey("employees.employee_id"), nullable=False, index=True),
+    Column("start_date", Date, nullable=False),
+    Column("end_date", Date, nullable=False),
+    Column("type", String(50), nullable=False),
+    Column("status", String(50), nullable=False),
+    Column("created_at", TIMESTAMP),
+)
+presence = Table(
+    "presence", metadata,
+    Column("presence_id", Integer, primary_key=True),
+    Column("employee_id", Integer, ForeignKey("employees.employee_id"), nullable=False),
+    Column("date", Date, nullable=False),
+    Column("status", String(50), nullable=False),
+    UniqueConstraint("employee_id", "date"),
+)
+
+
+def _pick(rng: random.Random, weighted: List[Tuple[Any, float]]) -> Any:
+    return rng.choices([value for value, _ in weighted], weights=[weight for _, weight in weighted])[0]
+
+
+def _working_days(start: date, end: date) -> List[date]:
+    return [start + timedelta(days=i) for i in range((end - start).days + 1) if (start + timedelta(days=i)).weekday() < 5]
+
+
+class SyntheticHRData:
+    """Generates the rows of the six tables for a given size and seed."""
+
+    def __init__(self, employee_count: int = 500, days: int = 180, end_date: Optional[date] = None, seed: int = 42):
+        """
+        Args:
+            employee_count: Number of employees (at least the 10 sample ones)
+            days: Length of the history in calendar days
+            end_date: Last day of activity (default: today); leave requests extend 30 days beyond
+            seed: Random seed
+        """
+        self.employee_count = max(employee_count, len(SAMPLE_EMPLOYEES))
+        self.end = end_date or date.today()
+        self.start = self.end - timedelta(days=days - 1)
+        self.rng = random.Random(seed)
+        self.employees: List[Dict[str, Any]] = []
+        self.projects: List[Dict[str, Any]] = []
+        self.assignments: Dict[int, List[int]] = {}
+        self.approved_leave: Dict[int, set] = {}
+
+    def _employees(self) -> List[Dict[str, Any]]:
+        rng = self.rng
+        rows = []
+        created = datetime.combine(self.start, datetime.min.time()) - timedelta(days=30)
+        for employee_id, name, role, manager_id in SAMPLE_EMPLOYEES:
+            rows.append({"employee_id": employee_id, "name": name, "role": role, "manager_id": manager_id})
+        managers = [row["employee_id"] for row in rows if row["role"] == "Manager"]
+        second_level: List[int] = []
+        for employee_id in range(51 + len(SAMPLE_EMPLOYEES), 51 + self.employee_count):
+            name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+            if rng.random() < 1 / 8:
+                # Managers report to the CEO's direct reports or to another second-level manager
+                manager_id = rng.choice(managers if not second_level or rng.random() < 0.6 else second_level)
+                second_level.append(employee_id)
+                rows.append({"employee_id": employee_id, "name": name, "role": "Manager", "manager_id": manager_id})
+            else:
+                pool = managers + second_level
+                rows.append({"employee_id": employee_id, "name": name, "role": "Employee", "manager_id": rng.choice(pool)})
+        for row in rows:
+            slug = row["name"].lower().replace(" ", ".")
+            row["email"] = f"{slug}.{row['employee_id']}@kimble.com"
+            row["leave_balance"] = max(0, min(35, int(rng.gauss(20, 5))))
+            row["created_at"] = created
+        return rows
+
+    def _projects(self) -> List[Dict[str, Any]]:
+        created = datetime.combine(self.start, datetime.min.time()) - timedelta(days=60)
+        count = max(10, self.employee_count // 10)
+        return [
+            {
+                "project_id": 51 + i,
+                "project_name": f"Project {chr(65 + i % 26)}{i // 26 + 1}",
+                "department": _pick(self.rng, DEPARTMENTS),
+                "created_at": created,
+            }
+            for i in range(count)
+        ]
+
+    def _assignments(self) -> Iterator[Dict[str, Any]]:
+        rng = self.rng
+        project_ids = [project["project_id"] for project in self.projects]
+        for employee in self.employees:
+            chosen = rng.sample(project_ids, _pick(rng, [(1, 0.5), (2, 0.35), (3, 0.15)]))
+            self.assignments[employee["employee_id"]] = chosen
+            for project_id in chosen:
+                start = self.start - timedelta(days=rng.randint(0, 90))
+                ended = rng.random() < 0.2
+                yield {
+                    "employee_id": employee["employee_id"],
+                    "project_id": project_id,
+                    "start_date": start,
+                    "end_date": self.end - timedelta(days=rng.randint(0, 60)) if ended else None,
+                }
+
+    def _leave_requests(self) -> Iterator[Dict[str, Any]]:
+        rng = self.rng
+        horizon = _working_days(self.start, self.end + timedelta(days=30))
+        for employee in self.employees:
+            employee_id = employee["employee_id"]
+            taken = self.approved_leave.setdefault(employee_id, set())
+            for leave_type, every, lengths in (("Vacation", 60, (1, 10)), ("Personal", 90, (1, 2)), ("Disruption", 250, (1, 1))):
+                for _ in range(sum(1 for _ in horizon if rng.random() < 1 / every)):
+                    first = rng.randrange(len(horizon))
+                    days = horizon[first:first + rng.randint(*lengths)]
+                    if not days:
+                        continue
+                    future = days[0] > self.end
+                    status = "Pending" if future else _pick(rng, [("Approved", 0.8), ("Rejected", 0.1), ("Pending", 0.1)])
+                    if status == "Approved":
+                        taken.update(days)
+                    yield {
+                        "employee_id": employee_id,
+                        "manager_id": employee["manager_id"] or employee_id,
+                        "start_date": days[0],
+                        "end_date": days[-1],
+                        "type": leave_type,
+                        "status": status,
+                        "created_at": datetime.combine(days[0], datetime.min.time()) - timedelta(days=rng.randint(3, 30)),
+                    }
+
+    def _days(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """('presence' | 'activity_reports', row) for every working day, day by day."""
+        rng = self.rng
+        recent = self.end - timedelta(days=30)
+        for day in _working_days(self.start, self.end):
+            for employee in self.employees:
+                employee_id = employee["employee_id"]
+                if day in self.approved_leave.get(employee_id, ()):
+                    yield "presence", {"employee_id": employee_id, "date": day, "status": "On Leave"}
+                    continue
+                if rng.random() < 0.05:
+                    yield "presence", {"employee_id": employee_id, "date": day, "status": "Absent"}
+                    continue
+                yield "presence", {"employee_id": employee_id, "date": day, "status": "Present"}
+                projects_today = self.assignments[employee_id][:rng.randint(1, 3)]
+                remaining = rng.randint(6, 9)
+                for i, project_id in enumerate(projects_today):
+                    hours = remaining if i == len(projects_today) - 1 else rng.randint(1, max(1, remaining - (len(projects_today) - i - 1)))
+                    remaining -= hours
+                    if hours <= 0:
+                        break
+                    if day < recent:
+                        status = _pick(rng, [("Approved", 0.85), ("Submitted", 0.1), ("Rejected", 0.05)])
+                    else:
+                        status = _pick(rng, [("Draft", 0.4), ("Submitted", 0.4), ("Approved", 0.15), ("Rejected", 0.05)])
+                    yield "activity_reports", {
+                        "employee_id": employee_id,
+                        "project_id": project_id,
+                        "date": day,
+                        "hours": hours,
+                        "status": status,
+                        "created_at": datetime.combine(day, datetime.min.time()) + timedelta(hours=17, minutes=rng.randint(0, 180)),
+                    }
+
+    def write(self, engine: Engine, drop: bool = True) -> Dict[str, int]:
+        """
+        Create the six tables (dropping existing ones unless drop is False) and insert the rows.
+
+        Returns:
+            Dict[str, int]: Rows inserted per table
+        """
+        if drop:
+            metadata.drop_all(engine)
+        metadata.create_all(engine)
+        counts = {table.name: 0 for table in metadata.sorted_tables}
+        self.employees = self._employees()
+        self.projects = self._projects()
+        with engine.begin() as conn:
+            conn.execute(insert(employees), self.employees)
+            conn.execute(insert(projects), self.projects)
+            counts["employees"], counts["projects"] = len(self.employees), len(self.projects)
+            for table, rows in ((project_assignments, self._assignments()), (leave_requests, self._leave_requests())):
+                counts[table.name] = self._insert(conn, table, rows)
+            buffers: Dict[str, List[Dict[str, Any]]] = {"presence": [], "activity_reports": []}
+            targets = {"presence": presence, "activity_reports": activity_reports}
+            for name, row in self._days():
+                buffer = buffers[name]
+                buffer.append(row)
+                if len(buffer) >= INSERT_CHUNK_SIZE:
+                    conn.execute(insert(targets[name]), buffer)
+                    counts[name] += len(buffer)
+                    buffer.clear()
+            for name, buffer in buffers.items():
+                if buffer:
+                    conn.execute(insert(targets[name]), buffer)
+                    counts[name] += len(buffer)
+        return counts
+
+    @staticmethod
+    def _insert(conn, table: Table, rows: Iterator[Dict[str, Any]]) -> int:
+        count = 0
+        chunk: List[Dict[str, Any]] = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= INSERT_CHUNK_SIZE:
+                conn.execute(insert(table), chunk)
+                count += len(chunk)
+                chunk = []
+        if chunk:
+            conn.execute(insert(table), chunk)
+            count += len(chunk)
+        return count
+
+
+def generate(url: str, employee_count: int = 500, days: int = 180, end_date: Optional[date] = None, seed: int = 42) -> Dict[str, int]:
+    """Fill the database at url with a synthetic dataset. Returns the rows per table."""
+    engine = create_engine(url)
+    try:
+        return SyntheticHRData(employee_count, days, end_date, seed).write(engine)
+    finally:
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic HR dataset (replaces the six tables)")
+    parser.add_argument("--url", required=True, help="SQLAlchemy URL, e.g. sqlite:///bench.db")
+    parser.add_argument("--employees", type=int, default=500)
+    parser.add_argument("--days", type=int, default=180, help="Calendar days of history")
+    parser.add_argument("--end-date", help="Last day of activity, YYYY-MM-DD (default: today)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    end_date = datetime.strptime(args.end_date, "%Y-%m-%d").date() if args.end_date else None
+    counts = generate(args.url, args.employees, args.days, end_date, args.seed)
+    print("🧪 " + ", ".join(f"{table}: {count:,}" for table, count in counts.items()))
+    print(f"⏱️  {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,122 @@
+"""
+Connection pooling, read-only sessions and pool metrics for the agent's engines.
+
+The agent keeps two engines: a primary one for writes (leave requests, rollup refreshes)
+and a read engine for the SQL agent tools and reports, pointed at a replica when one is
+configured (DATABASE_READ_URL or DB_READ_HOST), else at the primary with its own pool.
+Read connections are put in read-only mode at the session level, so a write generated by
+the LLM fails in the database whatever the tools let through.
+
+Both engines use a QueuePool sized from the environment, with pre-ping (a connection
+killed by MySQL's wait_timeout is replaced instead of failing the request) and recycling
+below the server idle timeout. The pool also records how long checkouts wait for a
+connection and how many time out.
+"""
+import os
+import threading
+import time
+from typing import Dict, Any
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool recording the time spent waiting for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_ms_total = 0.0
+        self.wait_ms_max = 0.0
+        self._metrics_lock = threading.Lock()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            with self._metrics_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = (time.perf_counter() - start) * 1000
+            with self._metrics_lock:
+                self.checkouts += 1
+                self.wait_ms_total += waited
+                self.wait_ms_max = max(self.wait_ms_max, waited)
+
+
+def pool_options() -> Dict[str, Any]:
+    """create_engine pool arguments from DB_POOL_* environment variables."""
+    return {
+        "poolclass": TimedQueuePool,
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        # Below MySQL's wait_timeout and the idle timeouts of proxies/load balancers
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "1") != "0",
+    }
+
+
+def create_pooled_engine(url: str, read_only: bool = False) -> Engine:
+    """
+    Create an engine with the configured pool.
+
+    Args:
+        url: SQLAlchemy database URL
+        read_only: Put every connection in a read-only session
+    """
+    options = pool_options()
+    if url.startswith("sqlite") and ":memory:" in url:
+        # In-memory SQLite lives in a single connection; keep SQLAlchemy's default pool
+        options = {}
+    engine = create_engine(url, **options)
+    if read_only:
+        install_read_only_session(engine)
+    return engine
+
+
+def install_read_only_session(engine: Engine) -> None:
+    """Make every new connection of the engine reject writes."""
+    dialect = engine.dialect.name
+
+    @event.listens_for(engine, "connect")
+    def set_read_only(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            if dialect == "mysql":
+                cursor.execute("SET SESSION TRANSACTION READ ONLY")
+            elif dialect == "sqlite":
+                cursor.execute("PRAGMA query_only = ON")
+            elif dialect == "postgresql":
+                cursor.execute("SET SESSION CHARACTERISTICS AS TRANSACTION READ ONLY")
+        finally:
+            cursor.close()
+
+
+def pool_stats(engine: Engine) -> Dict[str, Any]:
+    """Checked-out and idle connections, overflow, and checkout waits of an engine's pool."""
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return {"pool": type(pool).__name__}
+    stats: Dict[str, Any] = {
+        "pool": type(pool).__name__,
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+    }
+    if isinstance(pool, TimedQueuePool):
+        with pool._metrics_lock:
+            stats.update(
+                checkouts=pool.checkouts,
+                timeouts=pool.timeouts,
+                mean_wait_ms=pool.wait_ms_total / pool.checkouts if pool.checkouts else 0.0,
+                max_wait_ms=pool.wait_ms_max,
+            )
+    return stats
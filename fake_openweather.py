@@ -0,0 +1,135 @@
+"""
+Local fake of the OpenWeatherMap current weather and forecast endpoints.
+
+Deterministic answers per city, with optional latency and injected failures, for
+testing the weather tools and weather_client.py without an API key or network:
+
+    python fake_openweather.py --port 8765 --latency 0.2
+    OPENWEATHER_BASE_URL=http://127.0.0.1:8765/data/2.5 OPENWEATHER_API_KEY=fake python run_sql_agent.py
+
+Cities in HOT_CITIES get a forecast above 35 °C on two days; 'Nowhere' answers 404.
+"""
+import argparse
+import json
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Dict, Any, Tuple
+from urllib.parse import parse_qs, urlparse
+
+HOT_CITIES = {"seville,es", "phoenix,us", "dubai,ae"}
+
+
+def _base_temperature(city: str) -> float:
+    # Stable per city, between 5 and 30 °C
+    return 5 + zlib.crc32(city.encode()) % 2500 / 100
+
+
+def current_weather(city: str) -> Dict[str, Any]:
+    return {"name": city.split(",")[0].title(), "main": {"temp": round(_base_temperature(city), 2)}, "cod": 200}
+
+
+def forecast(city: str, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """Five days of 3-hourly entries; hot cities peak above 35 °C on the 2nd and 3rd day."""
+    now = (now or datetime.now()).replace(minute=0, second=0, microsecond=0)
+    base = _base_temperature(city)
+    entries = []
+    for i in range(40):
+        at = now + timedelta(hours=3 * i)
+        peak = 12 if at.hour in (12, 15) else 0
+        hot = 14 if city in HOT_CITIES and 1 <= (at.date() - now.date()).days <= 2 else 0
+        entries.append({
+            "dt_txt": at.strftime("%Y-%m-%d %H:%M:%S"),
+            "main": {"temp": round(base + peak / 2 + hot, 2), "temp_max": round(base + peak + hot, 2)},
+        })
+    return {"cod": "200", "cnt": len(entries), "list": entries}
+
+
+class FakeOpenWeatherServer:
+    """Threaded HTTP server answering /data/2.5/weather and /data/2.5/forecast."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, fail_first: int = 0):
+        """
+        Args:
+            host: Interface to listen on
+            port: Port to listen on (0 picks a free one, see base_url)
+            latency: Seconds slept before every answer
+            fail_first: Number of initial requests answered with a 503
+        """
+        self.latency = latency
+        self.fail_first = fail_first
+        self.requests: Dict[str, int] = {"weather": 0, "forecast": 0}
+        self._lock = threading.Lock()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                status, payload = fake.handle(self.path)
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/data/2.5"
+
+    def handle(self, path: str) -> Tuple[int, Dict[str, Any]]:
+        url = urlparse(path)
+        endpoint = url.path.rsplit("/", 1)[-1]
+        query = parse_qs(url.query)
+        with self._lock:
+            if endpoint in self.requests:
+                self.requests[endpoint] += 1
+            failing = self.fail_first > 0
+            if failing:
+                self.fail_first -= 1
+        if self.latency:
+            time.sleep(self.latency)
+        if failing:
+            return 503, {"cod": 503, "message": "service unavailable"}
+        if endpoint not in self.requests:
+            return 404, {"cod": 404, "message": "unknown endpoint"}
+        if not query.get("appid"):
+            return 401, {"cod": 401, "message": "Invalid API key."}
+        city = ",".join(part.strip() for part in query.get("q", [""])[0].split(",")).lower()
+        if not city or city.startswith("nowhere"):
+            return 404, {"cod": "404", "message": "city not found"}
+        return 200, current_weather(city) if endpoint == "weather" else forecast(city)
+
+    def start(self) -> "FakeOpenWeatherServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fake-openweather", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake OpenWeatherMap server for local testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before every answer")
+    parser.add_argument("--fail-first", type=int, default=0, help="Answer the first N requests with a 503")
+    args = parser.parse_args()
+
+    server = FakeOpenWeatherServer(args.host, args.port, latency=args.latency, fail_first=args.fail_first)
+    print(f"🌤️ Fake OpenWeatherMap listening on {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
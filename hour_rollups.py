@@ -0,0 +1,382 @@
+"""
+Incrementally maintained hour rollups of activity_reports.
+
+    activity_hours_daily    (employee_id, project_id, date)        -> hours, entries
+    activity_hours_monthly  (employee_id, project_id, month_start) -> hours, entries
+
+The daily rollup is refreshed from a created_at high-water mark stored in
+rollup_state; the monthly rollup is derived from the daily one. Updates and
+deletes of existing activity rows are not seen by the incremental refresh:
+run `check` to detect drift and `rebuild` to fix it. RollupRefresher runs the
+incremental refresh periodically in a background thread, off the request path.
+
+    python hour_rollups.py rebuild   # create the tables and rebuild everything
+    python hour_rollups.py refresh   # apply rows created since the last refresh
+    python hour_rollups.py check     # compare rollups with activity_reports
+"""
+import argparse
+import logging
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Optional, Dict, Any, Callable, List, Tuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+logger = logging.getLogger(__name__)
+
+DAILY_TABLE = "activity_hours_daily"
+MONTHLY_TABLE = "activity_hours_monthly"
+STATE_TABLE = "rollup_state"
+ROLLUP_TABLES = (DAILY_TABLE, MONTHLY_TABLE)
+STATE_KEY = "activity_hours"
+
+# Rows created within this window before the high-water mark are re-read on each refresh,
+# so rows committed late with an older created_at are not missed (recomputation is idempotent).
+OVERLAP = timedelta(minutes=5)
+
+# (employee_id, project_id, date) keys recomputed per statement
+KEY_CHUNK_SIZE = 500
+
+_DDL = [
+    f"""
+    CREATE TABLE IF NOT EXISTS {DAILY_TABLE} (
+        employee_id INT NOT NULL,
+        project_id INT NOT NULL,
+        date DATE NOT NULL,
+        hours INT NOT NULL,
+        entries INT NOT NULL,
+        PRIMARY KEY (employee_id, project_id, date)
+    )
+    """,
+    f"""
+    CREATE TABLE IF NOT EXISTS {MONTHLY_TABLE} (
+        employee_id INT NOT NULL,
+        project_id INT NOT NULL,
+        month_start DATE NOT NULL,
+        hours INT NOT NULL,
+        entries INT NOT NULL,
+        PRIMARY KEY (employee_id, project_id, month_start)
+    )
+    """,
+    f"""
+    CREATE TABLE IF NOT EXISTS {STATE_TABLE} (
+        name VARCHAR(64) NOT NULL PRIMARY KEY,
+        high_water_mark TIMESTAMP NULL,
+        refreshed_at TIMESTAMP NULL
+    )
+    """,
+]
+
+# name, table, columns
+_INDEXES = [
+    ("idx_activity_hours_daily_date", DAILY_TABLE, "date"),
+    ("idx_activity_hours_monthly_month", MONTHLY_TABLE, "month_start"),
+    ("idx_activity_reports_created_at", "activity_reports", "created_at"),
+]
+
+
+def _month_start_expr(dialect: str, column: str) -> str:
+    if dialect == "mysql":
+        return f"DATE_FORMAT({column}, '%Y-%m-01')"
+    return f"strftime('%Y-%m-01', {column})"
+
+
+def _month_start(day: Any) -> date:
+    day = day if isinstance(day, date) else datetime.strptime(str(day)[:10], "%Y-%m-%d").date()
+    return day.replace(day=1)
+
+
+def _next_month(month_start: date) -> date:
+    return (month_start + timedelta(days=32)).replace(day=1)
+
+
+class HourRollups:
+    """Maintains the daily and monthly hour rollups of activity_reports."""
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        self.dialect = engine.dialect.name
+
+    def exists(self) -> bool:
+        """Whether the rollup tables have been created."""
+        tables = set(inspect(self.engine).get_table_names())
+        return all(table in tables for table in ROLLUP_TABLES + (STATE_TABLE,))
+
+    def ensure_schema(self) -> None:
+        """Create the rollup tables and their indexes (including one on activity_reports.created_at)."""
+        with self.engine.begin() as conn:
+            for ddl in _DDL:
+                conn.execute(text(ddl))
+        inspector = inspect(self.engine)
+        for name, table, columns in _INDEXES:
+            if name not in {index["name"] for index in inspector.get_indexes(table)}:
+                with self.engine.begin() as conn:
+                    conn.execute(text(f"CREATE INDEX {name} ON {table} ({columns})"))
+
+    def high_water_mark(self, conn: Connection) -> Optional[datetime]:
+        row = conn.execute(
+            text(f"SELECT high_water_mark FROM {STATE_TABLE} WHERE name = :name"), {"name": STATE_KEY}
+        ).fetchone()
+        if not row or row[0] is None:
+            return None
+        return row[0] if isinstance(row[0], datetime) else datetime.fromisoformat(str(row[0]))
+
+    def _set_high_water_mark(self, conn: Connection, mark: Optional[datetime]) -> None:
+        params = {"name": STATE_KEY, "mark": mark, "now": datetime.now().replace(microsecond=0)}
+        updated = conn.execute(
+            text(f"UPDATE {STATE_TABLE} SET high_water_mark = :mark, refreshed_at = :now WHERE name = :name"),
+            params,
+        ).rowcount
+        if not updated:
+            conn.execute(
+                text(f"INSERT INTO {STATE_TABLE} (name, high_water_mark, refreshed_at) VALUES (:name, :mark, :now)"),
+                params,
+            )
+
+    def rebuild(self) -> Dict[str, Any]:
+        """Recompute both rollups from scratch in one transaction."""
+        start = time.perf_counter()
+        self.ensure_schema()
+        month_expr = _month_start_expr(self.dialect, "date")
+        with self.engine.begin() as conn:
+            mark = conn.execute(text("SELECT MAX(created_at) FROM activity_reports")).scalar()
+            conn.execute(text(f"DELETE FROM {DAILY_TABLE}"))
+            daily = conn.execute(text(
+                f"""
+                INSERT INTO {DAILY_TABLE} (employee_id, project_id, date, hours, entries)
+                SELECT employee_id, project_id, date, SUM(hours), COUNT(*)
+                FROM activity_reports
+                GROUP BY employee_id, project_id, date
+                """
+            )).rowcount
+            conn.execute(text(f"DELETE FROM {MONTHLY_TABLE}"))
+            monthly = conn.execute(text(
+                f"""
+                INSERT INTO {MONTHLY_TABLE} (employee_id, project_id, month_start, hours, entries)
+                SELECT employee_id, project_id, {month_expr}, SUM(hours), SUM(entries)
+                FROM {DAILY_TABLE}
+                GROUP BY employee_id, project_id, {month_expr}
+                """
+            )).rowcount
+            self._set_high_water_mark(conn, mark)
+        return {
+            "mode": "rebuild",
+            "daily_rows": daily,
+            "monthly_rows": monthly,
+            "high_water_mark": mark,
+            "seconds": time.perf_counter() - start,
+        }
+
+    def refresh(self) -> Dict[str, Any]:
+        """
+        Apply activity rows created since the high-water mark.
+
+        The (employee_id, project_id, date) keys touched by new rows are recomputed from
+        activity_reports, then the monthly rollup is recomputed for the affected months.
+        """
+        start = time.perf_counter()
+        with self.engine.connect() as conn:
+            mark = self.high_water_mark(conn)
+        if mark is None:
+            return self.rebuild()
+
+        with self.engine.begin() as conn:
+            new_mark = conn.execute(text("SELECT MAX(created_at) FROM activity_reports")).scalar()
+            keys: List[Tuple[Any, Any, Any]] = [
+                tuple(row) for row in conn.execute(
+                    text(
+                        "SELECT DISTINCT employee_id, project_id, date FROM activity_reports "
+                        "WHERE created_at >= :since"
+                    ),
+                    {"since": mark - OVERLAP},
+                )
+            ]
+            for offset in range(0, len(keys), KEY_CHUNK_SIZE):
+                self._recompute_daily(conn, keys[offset:offset + KEY_CHUNK_SIZE])
+
+            months = sorted({_month_start(key[2]) for key in keys})
+            for month_start in months:
+                self._recompute_month(conn, month_start)
+            self._set_high_water_mark(conn, new_mark or mark)
+
+        return {
+            "mode": "refresh",
+            "daily_keys": len(keys),
+            "months": len(months),
+            "high_water_mark": new_mark or mark,
+            "seconds": time.perf_counter() - start,
+        }
+
+    def _recompute_daily(self, conn: Connection, keys: List[Tuple[Any, Any, Any]]) -> None:
+        params: Dict[str, Any] = {}
+        tuples = []
+        for i, (employee_id, project_id, day) in enumerate(keys):
+            params.update({f"e{i}": employee_id, f"p{i}": project_id, f"d{i}": day})
+            tuples.append(f"(:e{i}, :p{i}, :d{i})")
+        in_list = ", ".join(tuples)
+        conn.execute(text(f"DELETE FROM {DAILY_TABLE} WHERE (employee_id, project_id, date) IN ({in_list})"), params)
+        conn.execute(
+            text(
+                f"""
+                INSERT INTO {DAILY_TABLE} (employee_id, project_id, date, hours, entries)
+                SELECT employee_id, project_id, date, SUM(hours), COUNT(*)
+                FROM activity_reports
+                WHERE (employee_id, project_id, date) IN ({in_list})
+                GROUP BY employee_id, project_id, date
+                """
+            ),
+            params,
+        )
+
+    def _recompute_month(self, conn: Connection, month_start: date) -> None:
+        params = {"month_start": month_start, "next_month": _next_month(month_start)}
+        conn.execute(text(f"DELETE FROM {MONTHLY_TABLE} WHERE month_start = :month_start"), params)
+        conn.execute(
+            text(
+                f"""
+                INSERT INTO {MONTHLY_TABLE} (employee_id, project_id, month_start, hours, entries)
+                SELECT employee_id, project_id, :month_start, SUM(hours), SUM(entries)
+                FROM {DAILY_TABLE}
+                WHERE date >= :month_start AND date < :next_month
+                GROUP BY employee_id, project_id
+                """
+            ),
+            params,
+        )
+
+    def check(self) -> Dict[str, Any]:
+        """
+        Compare monthly totals of activity_reports, the daily rollup and the monthly rollup.
+
+        Returns:
+            Dict[str, Any]: 'consistent' flag and the mismatching months with their totals
+        """
+        base_month = _month_start_expr(self.dialect, "date")
+        queries = {
+            "activity_reports": f"SELECT {base_month} AS m, SUM(hours), COUNT(*) FROM activity_reports GROUP BY {base_month}",
+            DAILY_TABLE: f"SELECT {base_month} AS m, SUM(hours), SUM(entries) FROM {DAILY_TABLE} GROUP BY {base_month}",
+            MONTHLY_TABLE: f"SELECT month_start AS m, SUM(hours), SUM(entries) FROM {MONTHLY_TABLE} GROUP BY month_start",
+        }
+        totals: Dict[str, Dict[str, Tuple[int, int]]] = {}
+        with self.engine.connect() as conn:
+            for name, query in queries.items():
+                totals[name] = {
+                    str(row[0])[:7]: (int(row[1] or 0), int(row[2] or 0)) for row in conn.execute(text(query))
+                }
+
+        mismatches = []
+        for month in sorted(set().union(*(t.keys() for t in totals.values()))):
+            values = {name: t.get(month, (0, 0)) for name, t in totals.items()}
+            if len(set(values.values())) > 1:
+                mismatches.append({"month": month, **{name: {"hours": v[0], "entries": v[1]} for name, v in values.items()}})
+        return {"consistent": not mismatches, "months": len(totals["activity_reports"]), "mismatches": mismatches}
+
+
+class RollupRefresher:
+    """
+    Refreshes the rollups every interval_seconds in a daemon thread.
+
+    Readers ask ready() before using the rollups: true once the tables exist and the last
+    refresh succeeded, so a failing refresh makes them fall back to activity_reports
+    instead of failing or reading stale totals.
+    """
+
+    def __init__(
+        self,
+        rollups: HourRollups,
+        interval_seconds: float = 60.0,
+        on_refresh: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ):
+        """
+        Args:
+            rollups: Rollups to refresh
+            interval_seconds: Delay between two refreshes (0: no background refresh, the tables are
+                refreshed by a scheduled `python hour_rollups.py refresh` and used as they are)
+            on_refresh: Called with the result of each successful refresh (e.g. to invalidate caches)
+        """
+        self.rollups = rollups
+        self.interval_seconds = interval_seconds
+        self.on_refresh = on_refresh
+        self.exists: Optional[bool] = None
+        self.healthy = False
+        self.last_error: Optional[str] = None
+        self.counters = {"refreshes": 0, "errors": 0, "seconds": 0.0}
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self) -> bool:
+        """Start the refresh thread if the rollup tables exist (once). Returns whether they exist."""
+        with self._lock:
+            if self.exists is None:
+                try:
+                    self.exists = self.rollups.exists()
+                except Exception as e:
+                    logger.warning("Could not check the hour rollup tables: %s", e)
+                    return False
+                self.healthy = self.exists and self.interval_seconds <= 0
+                if self.exists and self.interval_seconds > 0:
+                    self._thread = threading.Thread(target=self._run, name="rollup-refresh", daemon=True)
+                    self._thread.start()
+            return bool(self.exists)
+
+    def ready(self) -> bool:
+        """Whether the rollups can be read (they exist and are not known to be stale)."""
+        return self.start() and self.healthy
+
+    def refresh(self) -> Optional[Dict[str, Any]]:
+        """Refresh now; errors are logged and make ready() false until a refresh succeeds."""
+        start = time.perf_counter()
+        try:
+            result = self.rollups.refresh()
+        except Exception as e:
+            self.healthy = False
+            self.last_error = str(e)
+            self.counters["errors"] += 1
+            logger.warning("Hour rollup refresh failed, reading activity_reports until it succeeds: %s", e)
+            return None
+        self.counters["refreshes"] += 1
+        self.counters["seconds"] += time.perf_counter() - start
+        self.healthy = True
+        self.last_error = None
+        if self.on_refresh:
+            self.on_refresh(result)
+        return result
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.refresh()
+            self._stop.wait(self.interval_seconds)
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self.counters, exists=self.exists, healthy=self.healthy, last_error=self.last_error)
+
+
+if __name__ == "__main__":
+    from run_sql_agent import ActivityReportAgent
+
+    parser = argparse.ArgumentParser(description="Maintain the activity hour rollup tables")
+    parser.add_argument("command", choices=["rebuild", "refresh", "check"])
+    args = parser.parse_args()
+
+    rollups = HourRollups(ActivityReportAgent().db_engine)
+    if args.command == "check" and not rollups.exists():
+        print("❌ Rollup tables do not exist yet; run 'python hour_rollups.py rebuild'")
+        exit(1)
+    if args.command == "check":
+        result = rollups.check()
+        if result["consistent"]:
+            print(f"✅ Rollups consistent with activity_reports ({result['months']} month(s) checked)")
+        else:
+            print(f"❌ {len(result['mismatches'])} month(s) differ; run 'python hour_rollups.py rebuild'")
+            for mismatch in result["mismatches"]:
+                print(f"  {mismatch}")
+            exit(1)
+    else:
+        result = getattr(rollups, args.command)()
+        print(f"✅ {args.command}: " + ", ".join(f"{k}={v}" for k, v in result.items() if k != "mode"))
@@ -0,0 +1,309 @@
+"""
+Composite index suggestions from the query log.
+
+The most expensive fingerprints of a QueryLog are explained and their predicates are
+parsed: per table, equality filters (=, IN, IS NULL, row-value IN) come first in the
+suggested index, most selective first, then the first range filter (BETWEEN, <, >),
+then the ORDER BY columns when the index can also deliver the order. Suggestions that
+an existing index already covers (as a prefix) are dropped, and a suggestion that is
+a prefix of another one on the same table is merged into it. The result is written as
+a migration SQL file to review before applying it.
+
+    python index_advisor.py --log .query_log.jsonl --output migrations/002_indexes.sql
+"""
+import argparse
+import os
+import re
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Iterable, Tuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+from query_guard import _TABLE_ALIAS_RE
+from query_log import FingerprintStats, QueryLog, format_top
+from sql_cache import extract_tables
+
+_COLUMN = r"(?:(\w+)\.)?(\w+)"
+# (a, b, c) IN (...): every column is an equality filter
+_ROW_IN_RE = re.compile(r"\(((?:\s*" + _COLUMN + r"\s*,)+\s*" + _COLUMN + r"\s*)\)\s+in\b", re.I)
+_GROUP_RE = re.compile(r"\(([^()]*)\)")
+_EQ_RE = re.compile(_COLUMN + r"\s*(?:=\s*\?|\bin\s+\?|\bis\s+null\b)", re.I)
+_RANGE_RE = re.compile(_COLUMN + r"\s*(?:<=|>=|<|>|\bbetween\b)\s*\?", re.I)
+_WHERE_RE = re.compile(r"\bwhere\b(.*?)(?:\bgroup\s+by\b|\border\s+by\b|\blimit\b|\bhaving\b|\bunion\b|$)", re.I | re.S)
+_ORDER_RE = re.compile(r"\border\s+by\b(.*?)(?:\blimit\b|$)", re.I | re.S)
+_PREDICATE_RE = re.compile(r"(=|<|>|\bbetween\b|\bin\b|\bis\b)", re.I)
+
+
+class IndexSuggestion:
+    """A composite index and the statements it serves."""
+
+    def __init__(self, table: str, columns: List[str]):
+        self.table = table
+        self.columns = columns
+        self.calls = 0
+        self.total_ms = 0.0
+        self.statements: List[Tuple[str, List[str]]] = []
+
+    @property
+    def name(self) -> str:
+        return f"idx_{self.table}_{'_'.join(self.columns)}"[:64]
+
+    def add(self, stats: FingerprintStats, plan: List[str]) -> None:
+        self.calls += stats.calls
+        self.total_ms += stats.total_ms
+        self.statements.append((stats.fingerprint, plan))
+
+    def ddl(self) -> str:
+        return f"CREATE INDEX {self.name} ON {self.table} ({', '.join(self.columns)});"
+
+    def rollback(self, dialect: str) -> str:
+        return f"DROP INDEX {self.name}" + (f" ON {self.table};" if dialect == "mysql" else ";")
+
+
+def _strip_groups(where: str) -> Tuple[str, List[str]]:
+    """
+    Flatten the parentheses of a WHERE clause.
+
+    Returns the clause with OR-groups, subqueries and value lists replaced by ?, and the
+    columns of row-value IN filters. AND-only groups are unwrapped.
+    """
+    row_columns = []
+    for match in _ROW_IN_RE.finditer(where):
+        row_columns += [column.strip() for column in match.group(1).split(",")]
+    where = _ROW_IN_RE.sub("? in", where)
+    while True:
+        match = _GROUP_RE.search(where)
+        if not match:
+            break
+        content = match.group(1)
+        if re.search(r"\bor\b|^\s*select\b", content, re.I) or not _PREDICATE_RE.search(content):
+            replacement = " ? "
+        else:
+            replacement = f" {content} "
+        where = where[:match.start()] + replacement + where[match.end():]
+    return where, row_columns
+
+
+class IndexAdvisor:
+    """Proposes composite indexes for the most expensive statements of a query log."""
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        self.dialect = engine.dialect.name
+        inspector = inspect(engine)
+        self.columns: Dict[str, List[str]] = {}
+        self.primary_keys: Dict[str, List[str]] = {}
+        self.indexes: Dict[str, List[List[str]]] = {}
+        for table in inspector.get_table_names():
+            self.columns[table] = [column["name"].lower() for column in inspector.get_columns(table)]
+            self.primary_keys[table] = [c.lower() for c in inspector.get_pk_constraint(table).get("constrained_columns") or []]
+            indexes = [self.primary_keys[table]]
+            indexes += [[c.lower() for c in index["column_names"] if c] for index in inspector.get_indexes(table)]
+            indexes += [[c.lower() for c in unique["column_names"]] for unique in inspector.get_unique_constraints(table)]
+            self.indexes[table] = [index for index in indexes if index]
+        self._cardinality: Dict[Tuple[str, str], int] = {}
+
+    def explain(self, statement: str, parameters: Any = None) -> List[str]:
+        """Plan of a logged (DBAPI-level) statement, one line per table access."""
+        with self.engine.connect() as conn:
+            if self.dialect == "sqlite":
+                rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters or ()).fetchall()
+                return [str(row[-1]) for row in rows]
+            rows = [dict(row._mapping) for row in conn.exec_driver_sql(f"EXPLAIN {statement}", parameters or ())]
+        return [
+            f"{row.get('table')}: type={row.get('type')} key={row.get('key')} rows={row.get('rows')} {row.get('Extra') or ''}".strip()
+            for row in rows
+        ]
+
+    def cardinality(self, table: str, column: str) -> int:
+        """Distinct values of a column (cached)."""
+        key = (table, column)
+        if key not in self._cardinality:
+            with self.engine.connect() as conn:
+                self._cardinality[key] = int(conn.execute(text(f"SELECT COUNT(DISTINCT {column}) FROM {table}")).scalar() or 0)
+        return self._cardinality[key]
+
+    def _resolve(self, qualifier: Optional[str], column: str, tables: List[str], aliases: Dict[str, str]) -> Optional[str]:
+        """Table a column reference belongs to (None when unknown or ambiguous)."""
+        column = column.lower()
+        if qualifier:
+            table = aliases.get(qualifier.lower(), qualifier.lower())
+            return table if column in self.columns.get(table, ()) else None
+        owners = [table for table in tables if column in self.columns.get(table, ())]
+        return owners[0] if len(owners) == 1 else None
+
+    def predicates(self, shape: str) -> Dict[str, Dict[str, List[str]]]:
+        """Equality, range and ORDER BY columns per table of a fingerprint."""
+        tables = [table for table in sorted(extract_tables(shape)) if table in self.columns]
+        aliases = {alias.lower(): table.lower() for table, alias in _TABLE_ALIAS_RE.findall(shape)}
+        result: Dict[str, Dict[str, List[str]]] = {}
+
+        def add(kind: str, qualifier: Optional[str], column: str) -> None:
+            table = self._resolve(qualifier, column, tables, aliases)
+            if table:
+                columns = result.setdefault(table, {"eq": [], "range": [], "order": []})[kind]
+                if column.lower() not in columns:
+                    columns.append(column.lower())
+
+        where_match = _WHERE_RE.search(shape)
+        if where_match:
+            where, row_columns = _strip_groups(where_match.group(1))
+            # A top-level OR can't use one composite index
+            if not re.search(r"\bor\b", where, re.I):
+                for reference in row_columns:
+                    qualifier, _, column = reference.rpartition(".")
+                    add("eq", qualifier or None, column)
+                for match in _EQ_RE.finditer(where):
+                    add("eq", match.group(1), match.group(2))
+                for match in _RANGE_RE.finditer(where):
+                    add("range", match.group(1), match.group(2))
+        order_match = _ORDER_RE.search(shape)
+        if order_match:
+            for item in order_match.group(1).split(","):
+                match = re.match(r"\s*" + _COLUMN + r"\s*(asc|desc)?\s*$", item, re.I)
+                if not match:
+                    break
+                add("order", match.group(1), match.group(2))
+        return result
+
+    def candidate(self, table: str, predicates: Dict[str, List[str]]) -> List[str]:
+        """Index columns for one table's predicates: equalities, one range, then the ORDER BY columns."""
+        equalities = sorted(predicates["eq"], key=lambda column: -self.cardinality(table, column))
+        columns = list(equalities)
+        ranges = [column for column in predicates["range"] if column not in columns]
+        order = [column for column in predicates["order"] if column not in columns]
+        if ranges:
+            columns.append(ranges[0])
+        # The index delivers the order only if the range column (if any) leads the ORDER BY
+        if order and (not ranges or order[0] == ranges[0]):
+            columns += [column for column in order if column not in columns]
+        # Primary key columns at the end are implicit in every secondary index (InnoDB, SQLite rowid)
+        pk = self.primary_keys.get(table, [])
+        while columns and columns[-1] in pk and len(columns) > 1:
+            columns.pop()
+        return columns
+
+    def covered(self, table: str, columns: List[str]) -> bool:
+        """Whether an existing index starts with these columns."""
+        return any(index[:len(columns)] == columns for index in self.indexes.get(table, []))
+
+    def analyze(self, fingerprints: Iterable[FingerprintStats]) -> Tuple[List[IndexSuggestion], List[Dict[str, Any]]]:
+        """
+        Suggest indexes for the given fingerprints (typically QueryLog.top()).
+
+        Returns:
+            Tuple[List[IndexSuggestion], List[Dict[str, Any]]]: The suggestions, most expensive
+            first, and one report entry per analyzed fingerprint (plan and outcome)
+        """
+        suggestions: Dict[Tuple[str, Tuple[str, ...]], IndexSuggestion] = {}
+        report = []
+        for stats in fingerprints:
+            if not stats.sample_statement or not re.match(r"\s*(select|with)\b", stats.fingerprint):
+                continue
+            try:
+                plan = self.explain(stats.sample_statement, stats.sample_parameters)
+            except Exception as e:
+                report.append({"fingerprint": stats.fingerprint, "plan": [], "outcome": f"EXPLAIN failed: {e}"})
+                continue
+            outcomes = []
+            for table, predicates in self.predicates(stats.fingerprint).items():
+                columns = self.candidate(table, predicates)
+                if not columns:
+                    continue
+                if self.covered(table, columns):
+                    outcomes.append(f"{table}({', '.join(columns)}) already indexed")
+                    continue
+                key = (table, tuple(columns))
+                suggestion = suggestions.get(key) or suggestions.setdefault(key, IndexSuggestion(table, columns))
+                suggestion.add(stats, plan)
+                outcomes.append(f"suggest {suggestion.name}")
+            report.append({"fingerprint": stats.fingerprint, "plan": plan, "outcome": "; ".join(outcomes) or "no filter"})
+
+        # An index that is a prefix of another one on the same table is served by the longer one
+        merged: List[IndexSuggestion] = []
+        for suggestion in sorted(suggestions.values(), key=lambda s: -len(s.columns)):
+            longer = next(
+                (other for other in merged
+                 if other.table == suggestion.table and other.columns[:len(suggestion.columns)] == suggestion.columns),
+                None,
+            )
+            if longer:
+                longer.calls += suggestion.calls
+                longer.total_ms += suggestion.total_ms
+                longer.statements += suggestion.statements
+            else:
+                merged.append(suggestion)
+        return sorted(merged, key=lambda s: -s.total_ms), report
+
+    def redundant(self, suggestion: IndexSuggestion) -> List[List[str]]:
+        """Existing indexes that become a prefix of the suggested one."""
+        return [
+            index for index in self.indexes.get(suggestion.table, [])
+            if index != self.primary_keys.get(suggestion.table) and suggestion.columns[:len(index)] == index
+        ]
+
+    def render_migration(self, suggestions: List[IndexSuggestion]) -> str:
+        """Migration SQL with the reasoning behind every index as comments, and a commented-out rollback."""
+        lines = [
+            f"-- Composite indexes suggested by index_advisor.py ({self.dialect}) on "
+            f"{datetime.now().isoformat(timespec='seconds')}",
+            "-- REVIEW before applying: check the column order against the statements below and",
+            "-- the write cost on the table; apply during low traffic.",
+            "",
+        ]
+        for suggestion in suggestions:
+            lines.append(f"-- {suggestion.table}: {suggestion.calls} call(s), {suggestion.total_ms:.1f} ms logged")
+            for shape, plan in suggestion.statements:
+                lines.append(f"--   {shape[:200]}")
+                lines += [f"--     plan: {line}" for line in plan]
+            for index in self.redundant(suggestion):
+                lines.append(
+                    f"--   the existing index on ({', '.join(index)}) becomes a prefix of this one; "
+                    "it can be dropped once no foreign key relies on it"
+                )
+            lines += [suggestion.ddl(), ""]
+        if suggestions:
+            lines.append("-- Rollback:")
+            lines += [f"-- {suggestion.rollback(self.dialect)}" for suggestion in suggestions]
+        else:
+            lines.append("-- No index to add: the logged statements are already served by existing indexes.")
+        return "\n".join(lines) + "\n"
+
+    def apply(self, suggestions: List[IndexSuggestion]) -> None:
+        with self.engine.begin() as conn:
+            for suggestion in suggestions:
+                conn.execute(text(suggestion.ddl().rstrip(";")))
+
+    def rollback(self, suggestions: List[IndexSuggestion]) -> None:
+        with self.engine.begin() as conn:
+            for suggestion in suggestions:
+                conn.execute(text(suggestion.rollback(self.dialect).rstrip(";")))
+
+
+if __name__ == "__main__":
+    from run_sql_agent import ActivityReportAgent
+
+    parser = argparse.ArgumentParser(description="Suggest composite indexes from a query log")
+    parser.add_argument("--log", default=os.getenv("QUERY_LOG_PATH"), help="JSON Lines query log (QUERY_LOG_PATH)")
+    parser.add_argument("--top", type=int, default=10, help="Number of fingerprints to analyze, by total time")
+    parser.add_argument("--output", help="Write the migration SQL to this file instead of printing it")
+    args = parser.parse_args()
+
+    if not args.log or not os.path.exists(args.log):
+        print("❌ No query log; run the agent with QUERY_LOG_PATH set, then pass it with --log")
+        exit(1)
+    log = QueryLog.load(args.log)
+    top = log.top(args.top)
+    print(f"📈 {log.statements} statement(s), {len(log.fingerprints)} fingerprint(s); most expensive:")
+    print(format_top(top))
+
+    advisor = IndexAdvisor(ActivityReportAgent().db_engine)
+    suggestions, _ = advisor.analyze(top)
+    migration = advisor.render_migration(suggestions)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(migration)
+        print(f"✅ {len(suggestions)} index(es) suggested, migration written to {args.output}")
+    else:
+        print(migration)
@@ -0,0 +1,278 @@
+"""
+Deterministic fast path for common questions.
+
+Questions such as "who am I", "what is my leave balance", "who is my manager", "show my
+report for last week", "who hasn't submitted their timesheet for yesterday" or
+"temperature in Paris,FR" are matched with anchored patterns and
+answered by calling the corresponding tool directly, without any LLM round trip. Anything
+that does not match exactly falls back to the agent, and so do reporting-line questions
+about someone the employee resolver does not know ("who is the manager of project apollo"),
+weather questions qualified by a time or a unit ("weather in paris on friday") and questions
+whose routed tool answers with an error.
+"""
+import calendar
+import re
+import threading
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Optional, Dict, Any, Callable, Tuple
+
+from answer_cache import AnswerCache
+
+_MONTHS = {name.lower(): i for i, name in enumerate(calendar.month_name) if name}
+_MONTHS.update({name.lower(): i for i, name in enumerate(calendar.month_abbr) if name})
+
+# get_user_information field keyword -> phrases that ask for it
+_USER_FIELDS = {
+    "email": ("email", "email address", "e-mail", "mail"),
+    "name": ("name", "full name"),
+    "role": ("role", "job", "job title", "position"),
+    "leave balance": ("leave balance", "leave days", "remaining leave", "leave days left", "holiday balance"),
+    "employee id": ("employee id", "id", "user id", "employee number"),
+}
+_FIELD_PHRASES = "|".join(
+    sorted((re.escape(p) for phrases in _USER_FIELDS.values() for p in phrases), key=len, reverse=True)
+)
+
+_PROFILE = re.compile(
+    r"^(?:who am i|whoami|tell me about (?:me|myself)|(?:show|get|what is|what's|whats) my (?:profile|information|info|details)"
+    r"|my (?:profile|information|info|details))$"
+)
+_USER_FIELD = re.compile(
+    rf"^(?:(?:what is|what's|whats|show|show me|get|tell me|give me) )?my (?P<field>{_FIELD_PHRASES})$"
+    rf"|^how many (?P<days>leave days|days of leave|holidays) do i have(?: left)?$"
+)
+_WEATHER = re.compile(
+    r"^(?:(?:what is|what's|whats|show|show me|get|check) )?(?:the )?(?:current )?(?:temperature|weather)"
+    r"(?: right now| now)? (?:in|at|for) (?P<location>[a-z][a-z .'-]*?(?:, ?[a-z]{2})?)(?: right now| now| today)?$"
+)
+# Words that qualify a weather question (when, which unit) rather than name a place: the agent handles those
+_WEATHER_QUALIFIER = re.compile(
+    r"\b(?:in|on|at|this|last|yesterday|tonight|weekend|morning|afternoon|evening|night|ago|since|during"
+    r"|monday|tuesday|wednesday|thursday|friday|saturday|sunday|fahrenheit|celsius|kelvin|degrees?|units?|metric|imperial)\b"
+)
+_REPORT = re.compile(
+    r"^(?:(?:show|show me|get|give me|generate|display) )?(?:my )?(?:activity )?(?:report|activities|activity)"
+    r"(?: for| from| over| during| in)? (?P<range>.+)$"
+)
+# Reporting-line questions answered by org_hierarchy; the employee is an ID, a name or absent (the user)
+def _who(group: str) -> str:
+    return rf"(?:employee |manager )?(?P<{group}>\d+|[a-z][a-z .'-]*?)"
+
+
+_ORG = [
+    ("manager", re.compile(
+        rf"^(?:who is|who's|whos) (?:my manager|my boss|the manager of {_who('a')}|{_who('b')}'?s manager)$"
+    )),
+    ("direct_reports", re.compile(
+        rf"^(?:who reports? (?:directly )?to (?:me|{_who('a')})|(?:list |show )?(?:my|the) direct reports(?: of {_who('b')})?)$"
+    )),
+    ("all_reports", re.compile(rf"^(?:everyone|everybody|all employees|who is) (?:under|below) (?:me|{_who('a')})$")),
+    ("chain", re.compile(
+        rf"^(?:show |what is |what's )?(?:my|the) (?:approval|management|reporting) chain(?: (?:of|for) {_who('a')})?$"
+    )),
+    ("team_sizes", re.compile(
+        rf"^(?:how big is|what is the size of|team sizes? (?:of|under)) (?:my team|me|the team of {_who('a')}|{_who('b')})$"
+    )),
+]
+# "Who hasn't submitted their timesheet for yesterday", answered by timesheet_compliance
+_TIMESHEET = re.compile(
+    r"^(?:who|which employees|list (?:the )?employees who) (?:has|have|did)(?: not|n['’]?t) (?:submit|submitted|filled in|fill in) "
+    r"(?:their |a |his or her |the |any )?(?:timesheets?|activity reports?)(?: (?:for|on|in|over|during))? (?P<range>.+)$"
+)
+_ISO = r"\d{4}-\d{2}-\d{2}"
+_EXPLICIT_RANGE = re.compile(rf"^(?:from |between )?(?P<start>{_ISO}) (?:to|and|until|-) (?P<end>{_ISO})$")
+_LAST_DAYS = re.compile(r"^(?:the )?(?:last|past) (?P<n>\d{1,3}) days$")
+_MONTH_YEAR = re.compile(r"^(?P<month>[a-z]+)(?: (?P<year>\d{4}))?$")
+
+
+def parse_date_range(text: str, today: Optional[date] = None) -> Optional[Tuple[date, date]]:
+    """
+    Parse a simple date range expression into (start, end), both inclusive.
+
+    Supports today, yesterday, this/last week (Monday to Sunday), this/last month,
+    last N days, '<month> [year]', a single ISO date and 'from X to Y' with ISO dates.
+    Returns None for anything else.
+    """
+    today = today or date.today()
+    text = text.strip().removeprefix("the ")
+    if text == "today":
+        return today, today
+    if text == "yesterday":
+        day = today - timedelta(days=1)
+        return day, day
+    if text in ("this week", "current week"):
+        monday = today - timedelta(days=today.weekday())
+        return monday, today
+    if text in ("last week", "previous week"):
+        monday = today - timedelta(days=today.weekday() + 7)
+        return monday, monday + timedelta(days=6)
+    if text in ("this month", "current month"):
+        return today.replace(day=1), today
+    if text in ("last month", "previous month"):
+        end = today.replace(day=1) - timedelta(days=1)
+        return end.replace(day=1), end
+
+    match = _LAST_DAYS.match(text)
+    if match and int(match["n"]) > 0:
+        return today - timedelta(days=int(match["n"]) - 1), today
+
+    match = _EXPLICIT_RANGE.match(text)
+    if match:
+        try:
+            start = datetime.strptime(match["start"], "%Y-%m-%d").date()
+            end = datetime.strptime(match["end"], "%Y-%m-%d").date()
+        except ValueError:
+            return None
+        return (start, end) if start <= end else None
+
+    if re.fullmatch(_ISO, text):
+        try:
+            day = datetime.strptime(text, "%Y-%m-%d").date()
+        except ValueError:
+            return None
+        return day, day
+
+    match = _MONTH_YEAR.match(text)
+    if match and match["month"] in _MONTHS:
+        month = _MONTHS[match["month"]]
+        year = int(match["year"]) if match["year"] else (today.year if month <= today.month else today.year - 1)
+        return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+    return None
+
+
+@dataclass
+class RouteMatch:
+    """A question routed to a tool: tool name, tool input and the rule that matched."""
+
+    tool: str
+    args: Dict[str, Any]
+    rule: str
+
+
+@dataclass
+class _RouterStats:
+    hits: int = 0
+    misses: int = 0
+    routed_seconds: float = 0.0
+    agent_calls: int = 0
+    agent_seconds: float = 0.0
+    rules: Dict[str, int] = field(default_factory=dict)
+
+
+class IntentRouter:
+    """Matches questions against fixed patterns and maps them to a tool call."""
+
+    def __init__(self, resolve_employee: Optional[Callable[[str], Any]] = None):
+        """
+        Args:
+            resolve_employee: Resolves an employee ID or name (e.g. OrgHierarchy.resolve), raising
+                ValueError for unknown or ambiguous ones; reporting-line questions about someone
+                it cannot resolve go to the agent. Without it they are not routed at all.
+        """
+        self.resolve_employee = resolve_employee
+        self._lock = threading.Lock()
+        self._stats = _RouterStats()
+
+    def route(self, question: str, today: Optional[date] = None) -> Optional[RouteMatch]:
+        """Return the tool call answering the question, or None if the agent must handle it."""
+        raw = question.strip().rstrip(" ?!.;")
+        text = AnswerCache.normalize_question(question)
+
+        if _PROFILE.match(text):
+            return RouteMatch("get_user_information", {"query": ""}, "profile")
+
+        match = _USER_FIELD.match(text)
+        if match:
+            if match["days"]:
+                return RouteMatch("get_user_information", {"query": "leave balance"}, "user_field")
+            phrase = match["field"]
+            key = next(key for key, phrases in _USER_FIELDS.items() if phrase in phrases)
+            return RouteMatch("get_user_information", {"query": key}, "user_field")
+
+        for relation, pattern in _ORG:
+            match = pattern.match(text)
+            if match:
+                employee = next((value for name, value in match.groupdict().items() if value), None)
+                if employee and not self._known_employee(employee):
+                    # Free text that is not an employee ("project apollo", "the CEO"): the agent decides
+                    return None
+                if employee and not employee.isdigit():
+                    # Keep the caller's spelling of the name
+                    original = re.search(re.escape(employee), raw, re.IGNORECASE)
+                    employee = original.group(0) if original else employee
+                return RouteMatch("org_hierarchy", {"relation": relation, "employee": employee}, "org")
+
+        match = _WEATHER.match(text)
+        if (
+            match
+            and not re.search(r"\b(?:forecast|plan|leave|tomorrow|next|week)\b", text)
+            and not _WEATHER_QUALIFIER.search(match["location"])
+        ):
+            # Keep the caller's spelling of the location (the API is case insensitive anyway)
+            location = match["location"].strip()
+            original = re.search(re.escape(location), raw, re.IGNORECASE)
+            location = (original.group(0) if original else location).replace(", ", ",")
+            return RouteMatch("check_weather_and_suggest_leave", {"location": location}, "weather")
+
+        match = _TIMESHEET.match(text)
+        if match:
+            dates = parse_date_range(match["range"], today)
+            if dates:
+                start, end = dates
+                return RouteMatch(
+                    "timesheet_compliance",
+                    {"start_date": start.isoformat(), "end_date": end.isoformat()},
+                    "timesheet",
+                )
+
+        match = _REPORT.match(text)
+        if match:
+            dates = parse_date_range(match["range"], today)
+            if dates:
+                start, end = dates
+                return RouteMatch(
+                    "generate_activity_report",
+                    {"start_date": start.isoformat(), "end_date": end.isoformat()},
+                    "report",
+                )
+        return None
+
+    def _known_employee(self, employee: str) -> bool:
+        if self.resolve_employee is None:
+            return False
+        try:
+            self.resolve_employee(employee)
+        except ValueError:
+            return False
+        return True
+
+    def record_hit(self, match: RouteMatch, seconds: float) -> None:
+        """Record a question answered by the fast path."""
+        with self._lock:
+            self._stats.hits += 1
+            self._stats.routed_seconds += seconds
+            self._stats.rules[match.rule] = self._stats.rules.get(match.rule, 0) + 1
+
+    def record_miss(self, seconds: float) -> None:
+        """Record a question that fell back to the agent and how long the agent took."""
+        with self._lock:
+            self._stats.misses += 1
+            self._stats.agent_calls += 1
+            self._stats.agent_seconds += seconds
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit rate and estimated latency saved (hits x mean agent latency - time spent on the fast path)."""
+        with self._lock:
+            s = self._stats
+            total = s.hits + s.misses
+            mean_agent = s.agent_seconds / s.agent_calls if s.agent_calls else 0.0
+            return {
+                "hits": s.hits,
+                "misses": s.misses,
+                "hit_rate": s.hits / total if total else 0.0,
+                "rules": dict(s.rules),
+                "mean_routed_ms": s.routed_seconds / s.hits * 1000 if s.hits else 0.0,
+                "mean_agent_ms": mean_agent * 1000,
+                "latency_saved_seconds": max(s.hits * mean_agent - s.routed_seconds, 0.0),
+            }
@@ -0,0 +1,217 @@
+"""
+Batch weather-based leave planning for many employees and locations.
+
+    python leave_planner.py assignments.csv --threshold 35            # plan only
+    python leave_planner.py assignments.csv --threshold 35 --create   # and create the requests
+
+The assignments file maps employees to locations (CSV with employee_id,location columns,
+or a JSON object {"52": "Paris,FR", ...}). Locations are deduplicated, their forecasts
+fetched concurrently through a bounded thread pool (and the weather client's cache), the
+qualifying days computed for everyone at once, and all leave requests written with the
+set-based bulk insert in a single transaction. The summary reports the time spent in
+each phase.
+"""
+import argparse
+import contextvars
+import csv
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Optional, Dict, Any, List, Callable
+
+from weather_client import WeatherClient
+
+PHASES = ("dedupe", "fetch forecasts", "compute", "write")
+
+
+def load_assignments(path: str) -> Dict[str, str]:
+    """Employee ID -> location from a CSV (employee_id,location) or JSON file."""
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".json"):
+            return {str(employee_id): str(location) for employee_id, location in json.load(f).items()}
+        return {str(row["employee_id"]).strip(): row["location"].strip() for row in csv.DictReader(f)}
+
+
+class WeatherLeavePlanner:
+    """Plans (and creates) one-day weather leave requests for many employees at once."""
+
+    def __init__(
+        self,
+        weather: WeatherClient,
+        create_requests: Callable[..., Dict[str, Dict[str, int]]],
+        max_workers: int = 8,
+    ):
+        """
+        Args:
+            weather: Client the forecasts are fetched with
+            create_requests: Bulk writer taking (plan, manager_id=...) and returning per-employee
+                created/skipped counts, e.g. ActivityReportAgent._create_weather_leave_requests_bulk
+            max_workers: Forecasts fetched concurrently
+        """
+        self.weather = weather
+        self.create_requests = create_requests
+        self.max_workers = max_workers
+
+    def plan(
+        self,
+        assignments: Dict[str, str],
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        threshold_celsius: float = 35.0,
+        create: bool = False,
+        manager_id: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Compute the qualifying days of every employee and optionally create their leave requests.
+
+        Args:
+            assignments: Employee ID -> location ('City,CountryCode')
+            start_date: First day considered, YYYY-MM-DD (default: today)
+            end_date: Last day considered, YYYY-MM-DD (default: 5 days from today)
+            threshold_celsius: Daily maximum temperature at or above which a day qualifies
+            create: Create pending one-day leave requests for the qualifying days
+            manager_id: Manager assigned to every request (default: each employee's manager)
+
+        Returns:
+            Dict[str, Any]: 'employees' rows (employee_id, location, days, created, skipped),
+            'locations' (location -> qualifying days or error), 'timings' per phase in seconds,
+            and the created/skipped totals
+        """
+        today = datetime.now().date()
+        start = datetime.strptime(start_date, "%Y-%m-%d").date() if start_date else today
+        end = datetime.strptime(end_date, "%Y-%m-%d").date() if end_date else today + timedelta(days=5)
+        if end < start:
+            raise ValueError("Invalid date range: end_date is before start_date.")
+        timings: Dict[str, float] = {}
+
+        phase_start = time.perf_counter()
+        by_location: Dict[str, str] = {}
+        for location in assignments.values():
+            by_location.setdefault(WeatherClient.normalize_location(location), location)
+        timings["dedupe"] = time.perf_counter() - phase_start
+
+        phase_start = time.perf_counter()
+        forecasts: Dict[str, Any] = {}
+
+        def fetch(location: str) -> None:
+            try:
+                forecasts[location] = self.weather.daily_max(location)
+            except Exception as e:
+                forecasts[location] = e
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(by_location)))) as pool:
+            # Each fetch runs in a copy of the caller's context, so its HTTP span joins the request trace
+            futures = [pool.submit(contextvars.copy_context().run, fetch, location) for location in by_location.values()]
+            for future in futures:
+                future.result()
+        timings["fetch forecasts"] = time.perf_counter() - phase_start
+
+        phase_start = time.perf_counter()
+        locations: Dict[str, Any] = {}
+        for key, location in by_location.items():
+            daily_max = forecasts[location]
+            if isinstance(daily_max, Exception):
+                locations[key] = {"location": location, "error": str(daily_max), "days": []}
+                continue
+            days = sorted(
+                datetime.strptime(day, "%Y-%m-%d").date()
+                for day, tmax in daily_max.items()
+                if start <= datetime.strptime(day, "%Y-%m-%d").date() <= end and float(tmax) >= float(threshold_celsius)
+            )
+            locations[key] = {"location": location, "error": None, "days": days}
+        plan: Dict[str, List[date]] = {}
+        for employee_id, location in assignments.items():
+            days = locations[WeatherClient.normalize_location(location)]["days"]
+            if days:
+                plan[employee_id] = days
+        timings["compute"] = time.perf_counter() - phase_start
+
+        phase_start = time.perf_counter()
+        results = self.create_requests(plan, manager_id=manager_id) if create and plan else {}
+        timings["write"] = time.perf_counter() - phase_start
+        timings["total"] = sum(timings.values())
+
+        employees = []
+        for employee_id, location in assignments.items():
+            entry = locations[WeatherClient.normalize_location(location)]
+            counts = results.get(employee_id, {})
+            employees.append({
+                "employee_id": employee_id,
+                "location": location,
+                "days": [day.isoformat() for day in plan.get(employee_id, [])],
+                "created": counts.get("created", 0),
+                "skipped": counts.get("skipped", 0),
+                "error": entry["error"],
+            })
+        return {
+            "start_date": start.isoformat(),
+            "end_date": end.isoformat(),
+            "threshold_celsius": threshold_celsius,
+            "employees": employees,
+            "locations": {
+                entry["location"]: {"days": [day.isoformat() for day in entry["days"]], "error": entry["error"]}
+                for entry in locations.values()
+            },
+            "created": sum(row["created"] for row in employees),
+            "skipped": sum(row["skipped"] for row in employees),
+            "timings": timings,
+        }
+
+
+def format_plan_summary(result: Dict[str, Any], max_rows: int = 50) -> str:
+    """Summary table of a batch plan: per location, per employee (first max_rows) and per phase."""
+    lines = [
+        "🌡️ Batch Weather-based Leave Plan",
+        "=" * 60,
+        f"Range: {result['start_date']} to {result['end_date']}, threshold {result['threshold_celsius']}°C",
+        f"{len(result['employees'])} employee(s), {len(result['locations'])} location(s)",
+        "-" * 60,
+        f"{'location':<24} {'qualifying days':<34}",
+    ]
+    for location, entry in result["locations"].items():
+        detail = f"❌ {entry['error']}" if entry["error"] else (", ".join(entry["days"]) or "none")
+        lines.append(f"{location:<24} {detail}")
+    lines += ["-" * 60, f"{'employee':<10} {'location':<24} {'days':>5} {'created':>8} {'skipped':>8}"]
+    planned = [row for row in result["employees"] if row["days"]]
+    for row in planned[:max_rows]:
+        lines.append(f"{row['employee_id']:<10} {row['location']:<24} {len(row['days']):>5} {row['created']:>8} {row['skipped']:>8}")
+    if len(planned) > max_rows:
+        lines.append(f"... {len(planned) - max_rows} more employee(s) with qualifying days")
+    lines += [
+        "-" * 60,
+        f"📝 {result['created']} leave request(s) created, {result['skipped']} already existed",
+        "⏱️ " + ", ".join(f"{phase} {result['timings'][phase] * 1000:.0f} ms" for phase in PHASES + ("total",)),
+    ]
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    from run_sql_agent import ActivityReportAgent
+
+    parser = argparse.ArgumentParser(description="Plan weather-based leave for many employees at once")
+    parser.add_argument("assignments", help="CSV (employee_id,location) or JSON {employee_id: location} file")
+    parser.add_argument("--start-date", help="YYYY-MM-DD (default: today)")
+    parser.add_argument("--end-date", help="YYYY-MM-DD (default: 5 days from today)")
+    parser.add_argument("--threshold", type=float, default=35.0, help="Daily max temperature in °C")
+    parser.add_argument("--create", action="store_true", help="Create the pending leave requests")
+    parser.add_argument("--manager-id", type=int, help="Manager of every request (default: each employee's manager)")
+    parser.add_argument("--workers", type=int, default=8, help="Forecasts fetched concurrently")
+    parser.add_argument("--json", action="store_true", help="Print the result as JSON")
+    args = parser.parse_args()
+
+    agent = ActivityReportAgent()
+    try:
+        result = agent.plan_weather_leave_batch(
+            load_assignments(args.assignments),
+            start_date=args.start_date,
+            end_date=args.end_date,
+            threshold_celsius=args.threshold,
+            create=args.create,
+            manager_id=args.manager_id,
+            max_workers=args.workers,
+        )
+    except ValueError as e:
+        print(f"❌ {e}")
+        exit(1)
+    print(json.dumps(result, indent=2) if args.json else format_plan_summary(result))
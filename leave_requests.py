@@ -0,0 +1,173 @@
+from datetime import date
+from typing import Optional, Dict, List, Iterable, Tuple, Any, Callable
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+# Manager assigned when an employee has none on record (the CEO in the sample data)
+DEFAULT_MANAGER_ID = 51
+
+# Rows per multi-row INSERT; keeps statements well below max_allowed_packet
+INSERT_CHUNK_SIZE = 1000
+
+
+def _day_str(value: Any) -> str:
+    """Normalize a date/datetime/str value to YYYY-MM-DD."""
+    if isinstance(value, date):
+        return value.strftime("%Y-%m-%d")
+    return str(value)[:10]
+
+
+def _placeholders(prefix: str, values: Iterable[Any], params: Dict[str, Any]) -> str:
+    """Add values as numbered bind parameters and return the placeholder list."""
+    names = []
+    for i, value in enumerate(values):
+        name = f"{prefix}{i}"
+        params[name] = value
+        names.append(f":{name}")
+    return ", ".join(names)
+
+
+def resolve_managers(
+    conn: Connection,
+    employee_ids: List[str],
+    lock: bool = True,
+) -> Dict[str, Optional[int]]:
+    """
+    Fetch the manager of each employee in one statement.
+
+    With lock=True the employee rows are locked (SELECT ... FOR UPDATE) until the end of
+    the transaction, which serializes concurrent leave creation for the same employees.
+    """
+    if not employee_ids:
+        return {}
+    params: Dict[str, Any] = {}
+    query = (
+        "SELECT employee_id, manager_id FROM employees "
+        f"WHERE employee_id IN ({_placeholders('e', employee_ids, params)})"
+    )
+    if lock and conn.dialect.name != "sqlite":
+        query += " FOR UPDATE"
+    return {str(row[0]): row[1] for row in conn.execute(text(query), params)}
+
+
+def lock_employees(conn: Connection, employee_ids: List[str]) -> None:
+    """Lock the employee rows (SELECT ... FOR UPDATE) until the end of the transaction."""
+    params: Dict[str, Any] = {}
+    conn.execute(
+        text(f"SELECT employee_id FROM employees WHERE employee_id IN ({_placeholders('e', employee_ids, params)}) FOR UPDATE"),
+        params,
+    ).fetchall()
+
+
+def bulk_create_leave_requests(
+    conn: Connection,
+    plan: Dict[str, Iterable[date]],
+    manager_id: Optional[int] = None,
+    leave_type: str = "Weather",
+    status: str = "Pending",
+    manager_lookup: Optional[Callable[[List[str]], Dict[str, Optional[int]]]] = None,
+) -> Dict[str, Dict[str, int]]:
+    """
+    Create one-day leave requests for many employees with set-based statements.
+
+    One statement locks the employees and resolves their managers, then one per
+    INSERT_CHUNK_SIZE (employee, day) pairs finds the requests that already exist and one
+    multi-row INSERT per chunk adds the missing ones. Must run inside a transaction;
+    the employee row locks make concurrent callers idempotent.
+
+    Args:
+        conn: Connection with an open transaction
+        plan: Mapping of employee ID -> days to request
+        manager_id: Manager to assign to every request. If None, each employee's manager is used.
+        leave_type: Leave type stored on the requests
+        status: Status stored on the requests
+        manager_lookup: Resolves employee IDs to their managers without a query (e.g.
+            OrgHierarchy.managers); the employee rows are then only locked, and on SQLite,
+            where writers are serialized anyway, not read at all
+
+    Returns:
+        Dict[str, Dict[str, int]]: Per-employee {'created': n, 'skipped': m}
+    """
+    wanted: Dict[str, List[str]] = {
+        str(employee_id): sorted({_day_str(day) for day in days}) for employee_id, days in plan.items()
+    }
+    results = {employee_id: {"created": 0, "skipped": 0} for employee_id in wanted}
+    tuples: List[Tuple[str, str]] = [(employee_id, day) for employee_id, days in wanted.items() for day in days]
+    if not tuples:
+        return results
+
+    if manager_lookup is None:
+        managers = resolve_managers(conn, list(wanted))
+    else:
+        if conn.dialect.name != "sqlite":
+            lock_employees(conn, list(wanted))
+        managers = manager_lookup(list(wanted))
+
+    # Existing one-day requests of this type for any of the wanted (employee, day) pairs,
+    # probed in chunks like the INSERT so the row-constructor IN list stays bounded
+    existing = set()
+    for start in range(0, len(tuples), INSERT_CHUNK_SIZE):
+        chunk = tuples[start:start + INSERT_CHUNK_SIZE]
+        params: Dict[str, Any] = {"type": leave_type}
+        rows = []
+        for i, (employee_id, day) in enumerate(chunk):
+            params[f"e{i}"] = employee_id
+            params[f"d{i}"] = day
+            rows.append(f"(:e{i}, :d{i}, :d{i})")
+        existing.update(
+            (str(row[0]), _day_str(row[1]))
+            for row in conn.execute(
+                text(
+                    "SELECT employee_id, start_date FROM leave_requests "
+                    "WHERE type = :type AND (employee_id, start_date, end_date) IN (" + ", ".join(rows) + ")"
+                ),
+                params,
+            )
+        )
+
+    missing = []
+    for employee_id, day in tuples:
+        if (employee_id, day) in existing:
+            results[employee_id]["skipped"] += 1
+            continue
+        resolved_manager_id = manager_id
+        if resolved_manager_id is None:
+            resolved_manager_id = managers.get(employee_id)
+        if resolved_manager_id is None:
+            resolved_manager_id = DEFAULT_MANAGER_ID
+        missing.append((employee_id, resolved_manager_id, day))
+        results[employee_id]["created"] += 1
+
+    for start in range(0, len(missing), INSERT_CHUNK_SIZE):
+        chunk = missing[start:start + INSERT_CHUNK_SIZE]
+        params = {"type": leave_type, "status": status}
+        values = []
+        for i, (employee_id, resolved_manager_id, day) in enumerate(chunk):
+            params[f"e{i}"] = employee_id
+            params[f"m{i}"] = resolved_manager_id
+            params[f"d{i}"] = day
+            values.append(f"(:e{i}, :m{i}, :d{i}, :d{i}, :type, :status)")
+        conn.execute(
+            text(
+                "INSERT INTO leave_requests (employee_id, manager_id, start_date, end_date, type, status) "
+                "VALUES " + ", ".join(values)
+            ),
+            params,
+        )
+    return results
+
+
+def create_leave_requests(
+    engine: Engine,
+    plan: Dict[str, Iterable[date]],
+    manager_id: Optional[int] = None,
+    leave_type: str = "Weather",
+    status: str = "Pending",
+    manager_lookup: Optional[Callable[[List[str]], Dict[str, Optional[int]]]] = None,
+) -> Dict[str, Dict[str, int]]:
+    """Run bulk_create_leave_requests in its own transaction."""
+    with engine.begin() as conn:
+        return bulk_create_leave_requests(
+            conn, plan, manager_id=manager_id, leave_type=leave_type, status=status, manager_lookup=manager_lookup,
+        )
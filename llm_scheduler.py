@@ -0,0 +1,490 @@
+"""
+Scheduling of LLM calls: rate limit, bounded concurrency, priority lanes, single-flight and retries.
+
+Every call of the agent's chat model goes through one process-wide LLMScheduler (the quota
+belongs to the API key, not to a session):
+
+    rate limit      a token bucket of LLM_RATE_PER_MINUTE calls (burst LLM_RATE_BURST); 0 disables it
+    concurrency     at most LLM_MAX_CONCURRENCY calls in flight; batch calls may only use
+                    LLM_BATCH_MAX_CONCURRENCY of them, so interactive questions always find a slot
+    priority lanes  'interactive' (default) and 'batch' (see llm_lane); waiting interactive calls
+                    are admitted before any waiting batch call, FIFO within a lane
+    single-flight   identical prompts (same model, messages, tools and stop words) in flight at the
+                    same time share one call; the model runs at temperature 0 so the answer is the same
+    retries         rate-limit (429 / RESOURCE_EXHAUSTED) and transient server errors are retried
+                    LLM_MAX_RETRIES times with full-jitter exponential backoff, honouring the
+                    retryDelay the API suggests. A rate-limit error also pauses admissions until
+                    that delay is over and halves the token bucket rate, which then recovers by 5%
+                    per successful call (adaptive).
+
+When the retries are exhausted, or a call waited LLM_MAX_WAIT_SECONDS for admission,
+LLMRateLimited is raised instead of the raw API error. ScheduledChatModel wraps any LangChain
+chat model (Gemini, the stubs of stub_llm.py) so the agent and single-shot mode use it unchanged.
+Queue depth, wait times, coalesced calls and retries are reported by stats().
+"""
+import copy
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, Dict, Any, Callable, Deque, Iterator, List, Tuple, TypeVar
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage, message_to_dict
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+
+LANES = ("interactive", "batch")
+_LANE: ContextVar = ContextVar("llm_lane", default="interactive")
+
+_RETRYABLE_CODES = (429, 500, 502, 503, 504)
+_RETRYABLE_TEXT = re.compile(r"\b(?:429|500|502|503|504)\b|RESOURCE_EXHAUSTED|UNAVAILABLE|DEADLINE_EXCEEDED|rate limit|quota", re.I)
+_RATE_LIMIT_TEXT = re.compile(r"\b429\b|RESOURCE_EXHAUSTED|rate limit|quota", re.I)
+_RETRY_DELAY = re.compile(r"retry(?:Delay)?['\"]?\s*(?:[:=]|in)\s*['\"]?(\d+(?:\.\d+)?)\s*s", re.I)
+
+T = TypeVar("T")
+
+
+class LLMRateLimited(Exception):
+    """The LLM stayed rate limited or overloaded after every retry, or no call slot freed up in time."""
+
+
+class _Abandoned(Exception):
+    """A coalesced stream was dropped by its caller before it finished."""
+
+
+@contextmanager
+def llm_lane(lane: str):
+    """Run the enclosed LLM calls in the given priority lane ('interactive' or 'batch')."""
+    if lane not in LANES:
+        raise ValueError(f"Unknown LLM lane '{lane}'. Use one of: {', '.join(LANES)}")
+    token = _LANE.set(lane)
+    try:
+        yield lane
+    finally:
+        _LANE.reset(token)
+
+
+def current_lane() -> str:
+    return _LANE.get()
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    for attribute in ("code", "status_code"):
+        value = getattr(error, attribute, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(error, "response", None)
+    value = getattr(response, "status_code", None)
+    return value if isinstance(value, int) else None
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Rate-limit, quota and transient server errors (by status code, else by message)."""
+    if isinstance(error, LLMRateLimited):
+        return False
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    code = _status_code(error)
+    if code is not None:
+        return code in _RETRYABLE_CODES
+    return bool(_RETRYABLE_TEXT.search(f"{type(error).__name__} {error}"))
+
+
+def is_rate_limit(error: BaseException) -> bool:
+    code = _status_code(error)
+    if code is not None:
+        return code == 429
+    return "RateLimit" in type(error).__name__ or bool(_RATE_LIMIT_TEXT.search(str(error)))
+
+
+def suggested_delay(error: BaseException) -> Optional[float]:
+    """Delay the API asks for before retrying ('retryDelay': '17s', 'Please retry in 3.2s'), if any."""
+    match = _RETRY_DELAY.search(str(error))
+    return float(match.group(1)) if match else None
+
+
+class TokenBucket:
+    """Calls allowed per second with a burst; not thread-safe (used under the scheduler's lock)."""
+
+    def __init__(self, rate_per_second: float, burst: float):
+        self.rate = rate_per_second
+        self.burst = max(burst, 1.0)
+        self.tokens = self.burst
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until one token is available (0 when it is now)."""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        self.tokens -= 1
+
+
+class LLMScheduler:
+    """Admission, single-flight and retries of LLM calls shared by every session of the process."""
+
+    def __init__(
+        self,
+        rate_per_minute: float = 0.0,
+        burst: Optional[float] = None,
+        max_concurrency: int = 4,
+        batch_max_concurrency: Optional[int] = None,
+        max_retries: int = 4,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        max_wait_seconds: float = 60.0,
+        single_flight: bool = True,
+        window: int = 1000,
+    ):
+        """
+        Args:
+            rate_per_minute: Calls started per minute at most (0: no rate limit)
+            burst: Calls that may start back to back (default: one second of rate, at least 1)
+            max_concurrency: Calls in flight at most
+            batch_max_concurrency: Calls of the batch lane in flight at most (default: half of max_concurrency)
+            max_retries: Retries of a call after a rate-limit or transient server error
+            base_delay: First backoff delay in seconds, doubled at every retry (full jitter)
+            max_delay: Longest backoff delay in seconds
+            max_wait_seconds: Longest wait for admission before LLMRateLimited is raised (0: no limit)
+            single_flight: Share one call between identical prompts in flight at the same time
+            window: Wait times kept per lane for the percentiles of stats()
+        """
+        self.rate_per_minute = rate_per_minute
+        self.max_concurrency = max(1, max_concurrency)
+        self.batch_max_concurrency = min(
+            self.max_concurrency,
+            batch_max_concurrency if batch_max_concurrency else max(1, self.max_concurrency // 2),
+        )
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_wait_seconds = max_wait_seconds
+        self.single_flight = single_flight
+        self._bucket = (
+            TokenBucket(rate_per_minute / 60.0, burst if burst is not None else max(1.0, rate_per_minute / 60.0))
+            if rate_per_minute > 0 else None
+        )
+        # Fraction of the configured rate currently allowed, lowered by rate-limit errors
+        self._rate_scale = 1.0
+        self._paused_until = 0.0
+        self._cond = threading.Condition()
+        self._queue: List[Tuple[int, int]] = []
+        self._sequence = itertools.count()
+        self._in_flight = {lane: 0 for lane in LANES}
+        self._queued = {lane: 0 for lane in LANES}
+        self._peak_queued = {lane: 0 for lane in LANES}
+        self._waits: Dict[str, Deque[float]] = {lane: deque(maxlen=window) for lane in LANES}
+        self._inflight_calls: Dict[str, Future] = {}
+        self.counters = {
+            "calls": 0, "admitted": 0, "coalesced": 0, "retries": 0, "rate_limited": 0,
+            "exhausted": 0, "wait_timeouts": 0, "errors": 0,
+        }
+
+    @classmethod
+    def from_env(cls) -> "LLMScheduler":
+        """Build a scheduler from the LLM_* environment variables."""
+        burst = os.getenv("LLM_RATE_BURST")
+        return cls(
+            rate_per_minute=float(os.getenv("LLM_RATE_PER_MINUTE", "0")),
+            burst=float(burst) if burst else None,
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "4")),
+            batch_max_concurrency=int(os.getenv("LLM_BATCH_MAX_CONCURRENCY", "0")) or None,
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "4")),
+            base_delay=float(os.getenv("LLM_RETRY_BASE_SECONDS", "1")),
+            max_delay=float(os.getenv("LLM_RETRY_MAX_SECONDS", "30")),
+            max_wait_seconds=float(os.getenv("LLM_MAX_WAIT_SECONDS", "60")),
+            single_flight=os.getenv("LLM_SINGLE_FLIGHT", "1") != "0",
+        )
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._cond:
+            self.counters[name] += amount
+
+    def _admit(self, lane: str) -> None:
+        """Block until the call may start: first of the queue, a free slot of its lane, a token."""
+        waiter = (LANES.index(lane), next(self._sequence))
+        queued_at = time.monotonic()
+        deadline = queued_at + self.max_wait_seconds if self.max_wait_seconds > 0 else None
+        with self._cond:
+            heapq.heappush(self._queue, waiter)
+            self._queued[lane] += 1
+            self._peak_queued[lane] = max(self._peak_queued[lane], self._queued[lane])
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = None
+                    limit = self.batch_max_concurrency if lane == "batch" else self.max_concurrency
+                    if (self._queue[0] == waiter and sum(self._in_flight.values()) < self.max_concurrency
+                            and self._in_flight[lane] < limit):
+                        wait = max(self._paused_until - now, 0.0)
+                        if not wait and self._bucket is not None:
+                            self._bucket.rate = self.rate_per_minute / 60.0 * self._rate_scale
+                            wait = self._bucket.wait_time(now)
+                        if not wait:
+                            if self._bucket is not None:
+                                self._bucket.take()
+                            heapq.heappop(self._queue)
+                            self._in_flight[lane] += 1
+                            self.counters["admitted"] += 1
+                            self._waits[lane].append(now - queued_at)
+                            # The next waiter may be admissible right away
+                            self._cond.notify_all()
+                            return
+                    if deadline is not None:
+                        if now >= deadline:
+                            self._queue.remove(waiter)
+                            heapq.heapify(self._queue)
+                            self.counters["wait_timeouts"] += 1
+                            self._cond.notify_all()
+                            raise LLMRateLimited(
+                                f"No LLM call slot became free within {self.max_wait_seconds:g}s ({lane} lane)"
+                            )
+                        wait = min(wait, deadline - now) if wait else deadline - now
+                    self._cond.wait(wait)
+            finally:
+                self._queued[lane] -= 1
+
+    def _release(self, lane: str, succeeded: bool) -> None:
+        with self._cond:
+            self._in_flight[lane] -= 1
+            if succeeded:
+                self._rate_scale = min(1.0, self._rate_scale * 1.05)
+            self._cond.notify_all()
+
+    def _backoff(self, error: Exception, attempt: int) -> float:
+        """Delay before the next attempt after a retryable error (raises once retries are used up)."""
+        if attempt >= self.max_retries:
+            self._count("exhausted")
+            raise LLMRateLimited(f"The language model is rate limited or unavailable after {attempt + 1} attempt(s): {error}") from error
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        hint = suggested_delay(error)
+        if hint is not None:
+            delay = max(delay, min(hint, self.max_delay))
+        with self._cond:
+            self.counters["retries"] += 1
+            if is_rate_limit(error):
+                # Adaptive: hold every admission until the suggested delay and slow the bucket down
+                self.counters["rate_limited"] += 1
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                self._rate_scale = max(0.1, self._rate_scale / 2)
+        return delay
+
+    def _attempts(self, call: Callable[[], T], lane: str) -> T:
+        for attempt in itertools.count():
+            self._admit(lane)
+            succeeded = False
+            try:
+                result = call()
+                succeeded = True
+                return result
+            except Exception as e:
+                if not is_retryable(e):
+                    self._count("errors")
+                    raise
+                delay = self._backoff(e, attempt)
+            finally:
+                self._release(lane, succeeded)
+            time.sleep(delay)
+
+    def _stream_attempts(self, open_stream: Callable[[], Iterator[T]], lane: str) -> Iterator[T]:
+        """Like _attempts for a stream; only a stream that failed before its first chunk is retried."""
+        for attempt in itertools.count():
+            self._admit(lane)
+            succeeded = yielded = False
+            try:
+                for chunk in open_stream():
+                    yielded = True
+                    yield chunk
+                succeeded = True
+                return
+            except Exception as e:
+                if yielded or not is_retryable(e):
+                    self._count("errors")
+                    raise
+                delay = self._backoff(e, attempt)
+            finally:
+                self._release(lane, succeeded)
+            time.sleep(delay)
+
+    def _join(self, key: Optional[str]) -> Tuple[Optional[Future], bool]:
+        """(future, leader) of the in-flight call for key; (None, True) when calls are not shared."""
+        if key is None or not self.single_flight:
+            return None, True
+        with self._cond:
+            future = self._inflight_calls.get(key)
+            if future is None:
+                future = self._inflight_calls[key] = Future()
+                return future, True
+            self.counters["coalesced"] += 1
+            return future, False
+
+    def _leave(self, key: Optional[str], future: Optional[Future]) -> None:
+        if future is not None:
+            with self._cond:
+                if self._inflight_calls.get(key) is future:
+                    del self._inflight_calls[key]
+
+    def run(self, call: Callable[[], T], key: Optional[str] = None) -> T:
+        """
+        Run one LLM call under the scheduler in the caller's lane.
+
+        Args:
+            call: Performs the call (without retries of its own)
+            key: Identity of the prompt; calls with the same key in flight share one result
+
+        Returns:
+            T: The call's result (a deep copy of the leader's for coalesced calls)
+        """
+        self._count("calls")
+        lane = current_lane()
+        future, leader = self._join(key)
+        if not leader:
+            return copy.deepcopy(future.result())
+        try:
+            result = self._attempts(call, lane)
+            if future is not None:
+                future.set_result(result)
+            return result
+        except Exception as e:
+            if future is not None:
+                future.set_exception(e)
+            raise
+        finally:
+            self._leave(key, future)
+
+    def stream(self, open_stream: Callable[[], Iterator[T]], key: Optional[str] = None) -> Iterator[T]:
+        """
+        Stream one LLM call under the scheduler. Coalesced callers receive the leader's chunks
+        once its stream is complete.
+
+        Args:
+            open_stream: Starts the call and returns its chunks
+            key: Identity of the prompt, as for run()
+        """
+        self._count("calls")
+        lane = current_lane()
+        future, leader = self._join(key)
+        if not leader:
+            try:
+                chunks = future.result()
+            except _Abandoned:
+                chunks = None
+            if chunks is not None:
+                yield from copy.deepcopy(chunks)
+                return
+            future = None
+        chunks: List[T] = []
+        try:
+            for chunk in self._stream_attempts(open_stream, lane):
+                chunks.append(chunk)
+                yield chunk
+            if future is not None:
+                future.set_result(chunks)
+        except Exception as e:
+            if future is not None:
+                future.set_exception(e)
+            raise
+        finally:
+            self._leave(key, future)
+            # The caller stopped reading: callers sharing the stream make their own call
+            if future is not None and not future.done():
+                future.set_exception(_Abandoned())
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters, rate state, and per lane queue depth, in-flight calls and wait percentiles (ms)."""
+        with self._cond:
+            stats: Dict[str, Any] = dict(self.counters)
+            stats["rate_per_minute"] = self.rate_per_minute * self._rate_scale if self.rate_per_minute else None
+            stats["paused_ms"] = max(self._paused_until - time.monotonic(), 0.0) * 1000
+            lanes = {}
+            for lane in LANES:
+                waits = sorted(self._waits[lane])
+                lanes[lane] = {
+                    "queued": self._queued[lane],
+                    "peak_queued": self._peak_queued[lane],
+                    "in_flight": self._in_flight[lane],
+                    "admitted": len(waits),
+                    "wait_mean_ms": sum(waits) / len(waits) * 1000 if waits else 0.0,
+                    "wait_p95_ms": waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000 if waits else 0.0,
+                }
+            stats["lanes"] = lanes
+        return stats
+
+
+def prompt_key(model: Any, messages: List[BaseMessage], stop: Optional[List[str]], kwargs: Dict[str, Any]) -> str:
+    """Identity of a call: the model's parameters, the messages, the stop words and the bound tools."""
+    payload = json.dumps(
+        [getattr(model, "_identifying_params", {}), [message_to_dict(message) for message in messages], stop, kwargs],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ScheduledChatModel(BaseChatModel):
+    """Chat model whose calls (plain or streamed) go through an LLMScheduler; callbacks fire on this model only."""
+
+    inner: Any
+    scheduler: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return f"scheduled-{self.inner._llm_type}"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return self.inner._identifying_params
+
+    def _should_stream(self, **kwargs: Any) -> bool:
+        # Models without a streaming API (the stubs) are called through _generate
+        return self.inner._should_stream(**kwargs)
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> Any:
+        """Bind tools as the wrapped model would, keeping the calls on this model."""
+        bound = self.inner.bind_tools(tools, **kwargs)
+        if bound is self.inner:
+            return self
+        return self.bind(**getattr(bound, "kwargs", {}))
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        return self.scheduler.run(
+            lambda: self.inner._generate(messages, stop=stop, **kwargs),
+            key=prompt_key(self.inner, messages, stop, kwargs),
+        )
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        # The tokens reach the callbacks through this model's stream(), not the wrapped one's
+        return self.scheduler.stream(
+            lambda: self.inner._stream(messages, stop=stop, **kwargs),
+            key=prompt_key(self.inner, messages, stop, kwargs),
+        )
+
+
+SCHEDULER = LLMScheduler.from_env()
@@ -0,0 +1,29 @@
+-- Composite indexes for the hottest statements of the agent (MySQL, kimble_db_merged.sql schema).
+-- Generated with `python -m benchmarks.bench_index_advisor --output ...` and reviewed by hand:
+--   * leave_requests: the advisor ordered the columns by cardinality on synthetic data
+--     (start_date first); employee_id leads here so the index also serves the employee_id
+--     foreign key and per-employee lookups. All four columns are equality filters, so the
+--     probe can use the whole index in either order.
+-- Apply during low traffic; both tables are written to by the agent.
+
+-- activity_reports: generate_activity_report (summary and keyset page), per user and date range
+--   select count(*) as entries, sum(hours) as hours, min(date) as first_date, max(date) as last_date
+--     from activity_reports where date between ? and ? and employee_id = ?
+--   select report_id, date, hours, status, employee_id from activity_reports
+--     where date between ? and ? and employee_id = ? order by date desc, report_id desc limit ?
+--   before: ref on KEY employee_id, every row of the user read, filesort for the page
+--   report_id (primary key) is implicitly the last column of the index, so the page order
+--   date DESC, report_id DESC is read from the index without a filesort.
+--   KEY employee_id becomes a prefix of this index; it can be dropped in a later migration.
+CREATE INDEX idx_activity_reports_employee_id_date ON activity_reports (employee_id, date);
+
+-- leave_requests: existence probe of bulk_create_leave_requests (weather leave planning)
+--   select employee_id, start_date from leave_requests
+--     where type = ? and (employee_id, start_date, end_date) in ((?+))
+--   before: ref on KEY employee_id, or a full scan when the optimizer skips the row constructor
+--   KEY employee_id becomes a prefix of this index; it can be dropped in a later migration.
+CREATE INDEX idx_leave_requests_employee_id_start_date_end_date_type ON leave_requests (employee_id, start_date, end_date, type);
+
+-- Rollback:
+-- DROP INDEX idx_activity_reports_employee_id_date ON activity_reports;
+-- DROP INDEX idx_leave_requests_employee_id_start_date_end_date_type ON leave_requests;
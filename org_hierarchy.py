@@ -0,0 +1,358 @@
+"""
+In-memory index of the reporting hierarchy (employees.manager_id).
+
+Built once from the employees table, the index keeps every employee's chain of managers
+up to the root (ancestor arrays) and a depth-first ordering of the tree in which each
+manager's whole organisation is one contiguous slice, so "manager of", "direct reports",
+"everyone under", "chain to the root" and "team size" are dictionary and slice lookups
+instead of recursive CTEs or repeated self-joins. Manager links that form a cycle are
+detected and cut: the employee whose link closes the cycle is treated as a root and
+reported in `cycles`.
+
+The index refreshes itself when the table changes: at most every `refresh_seconds` the
+(employee_id, manager_id, name, role) rows are read in ID order and hashed, and only when
+the checksum differs are the changed employees applied and the index rebuilt. Writes made
+through the agent mark it stale right away.
+
+    python org_hierarchy.py chain 87        # management chain of employee 87
+    python org_hierarchy.py under "Adam Bryan"
+"""
+import argparse
+import hashlib
+import threading
+import time
+from typing import Optional, Dict, Any, List, Tuple, Union
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+_ROWS_SQL = "SELECT employee_id, manager_id, name, role FROM employees ORDER BY employee_id"
+
+Employee = Union[int, str]
+
+
+class OrgHierarchy:
+    """Reporting hierarchy of the employees table with microsecond lookups."""
+
+    def __init__(self, engine: Engine, refresh_seconds: float = 30.0):
+        """
+        Args:
+            engine: Engine the employees table is read from
+            refresh_seconds: Minimum delay between two change checks (0: check on every lookup)
+        """
+        self.engine = engine
+        self.refresh_seconds = refresh_seconds
+        self.manager: Dict[int, Optional[int]] = {}
+        self.names: Dict[int, str] = {}
+        self.roles: Dict[int, str] = {}
+        self.children: Dict[int, List[int]] = {}
+        self.ancestors: Dict[int, Tuple[int, ...]] = {}
+        self.cycles: List[int] = []
+        self._order: List[int] = []
+        self._span: Dict[int, Tuple[int, int]] = {}
+        self._by_name: Dict[str, List[int]] = {}
+        self._checksum: Optional[str] = None
+        self._checked_at = 0.0
+        self._stale = True
+        self._lock = threading.RLock()
+        self.counters = {"builds": 0, "refreshes": 0, "checks": 0, "changed_rows": 0, "lookups": 0, "lookup_us": 0.0}
+
+    # --- maintenance ---
+
+    def _read_rows(self) -> Tuple[str, Dict[int, Tuple[Any, Any, Any]]]:
+        """The employee rows by ID, and a checksum of all of them."""
+        digest = hashlib.sha256()
+        rows: Dict[int, Tuple[Any, Any, Any]] = {}
+        with self.engine.connect() as conn:
+            for employee_id, manager_id, name, role in conn.execute(text(_ROWS_SQL)):
+                manager_id = int(manager_id) if manager_id is not None else None
+                digest.update(repr((int(employee_id), manager_id, name, role)).encode("utf-8"))
+                rows[int(employee_id)] = (manager_id, name, role)
+        return digest.hexdigest(), rows
+
+    def refresh(self, force: bool = False) -> Dict[str, int]:
+        """
+        Bring the index up to date with the employees table if it changed.
+
+        Args:
+            force: Check the table now even if refresh_seconds has not elapsed
+
+        Returns:
+            Dict[str, int]: Employees added, removed and changed by this refresh
+        """
+        changes = {"added": 0, "removed": 0, "changed": 0}
+        with self._lock:
+            due = self._stale or force or time.monotonic() - self._checked_at >= self.refresh_seconds
+            if not due:
+                return changes
+            self.counters["checks"] += 1
+            checksum, rows = self._read_rows()
+            self._checked_at = time.monotonic()
+            self._stale = False
+            if checksum == self._checksum:
+                return changes
+
+            # Applied to copies, so lookups running meanwhile keep a consistent index
+            manager, names, roles = dict(self.manager), dict(self.names), dict(self.roles)
+            for employee_id in list(manager):
+                if employee_id not in rows:
+                    changes["removed"] += 1
+                    for mapping in (manager, names, roles):
+                        del mapping[employee_id]
+            for employee_id, (manager_id, name, role) in rows.items():
+                if employee_id not in manager:
+                    changes["added"] += 1
+                elif (manager[employee_id], names[employee_id], roles[employee_id]) != (manager_id, name, role):
+                    changes["changed"] += 1
+                else:
+                    continue
+                manager[employee_id] = manager_id
+                names[employee_id] = name
+                roles[employee_id] = role
+            self._reindex(manager, names, roles)
+            self._checksum = checksum
+            self.counters["builds" if self.counters["builds"] == 0 else "refreshes"] += 1
+            self.counters["changed_rows"] += sum(changes.values())
+        return changes
+
+    def mark_stale(self) -> None:
+        """Check the table again on the next lookup (after a write to employees)."""
+        self._stale = True
+
+    def _reindex(self, manager: Dict[int, Optional[int]], names: Dict[int, str], roles: Dict[int, str]) -> None:
+        """Compute children, ancestor arrays, the depth-first order and name lookup, then swap them in."""
+        cycles: List[int] = []
+        parent: Dict[int, Optional[int]] = {}
+        for employee_id, manager_id in manager.items():
+            if manager_id == employee_id:
+                cycles.append(employee_id)
+            # Managers that are not (or no longer) employees make their reports roots
+            parent[employee_id] = manager_id if manager_id in manager and manager_id != employee_id else None
+
+        # Ancestor arrays, resolved iteratively; a chain that comes back on itself is cut
+        ancestors: Dict[int, Tuple[int, ...]] = {}
+        for start in parent:
+            path: List[int] = []
+            on_path = set()
+            node: Optional[int] = start
+            while node is not None and node not in ancestors:
+                if node in on_path:
+                    # Cycle: the last employee walked becomes a root
+                    cut = path.pop()
+                    cycles.append(cut)
+                    parent[cut] = None
+                    ancestors[cut] = ()
+                    node = cut
+                    break
+                on_path.add(node)
+                path.append(node)
+                node = parent[node]
+            chain: Tuple[int, ...] = () if node is None else (node,) + ancestors[node]
+            for member in reversed(path):
+                ancestors[member] = chain
+                chain = (member,) + chain
+
+        children: Dict[int, List[int]] = {employee_id: [] for employee_id in manager}
+        for employee_id, manager_id in parent.items():
+            if manager_id is not None:
+                children[manager_id].append(employee_id)
+        for reports in children.values():
+            reports.sort()
+
+        # Depth-first order: the organisation of e is order[start + 1:end]
+        order: List[int] = []
+        span: Dict[int, Tuple[int, int]] = {}
+        for root in sorted(employee_id for employee_id, manager_id in parent.items() if manager_id is None):
+            stack: List[Tuple[int, bool]] = [(root, False)]
+            while stack:
+                node, done = stack.pop()
+                if done:
+                    span[node] = (span[node][0], len(order))
+                    continue
+                span[node] = (len(order), -1)
+                order.append(node)
+                stack.append((node, True))
+                stack.extend((child, False) for child in reversed(children[node]))
+
+        by_name: Dict[str, List[int]] = {}
+        for employee_id, name in names.items():
+            by_name.setdefault(str(name).strip().lower(), []).append(employee_id)
+
+        (self.manager, self.names, self.roles, self.children, self.ancestors,
+         self.cycles, self._order, self._span, self._by_name) = (
+            manager, names, roles, children, ancestors, cycles, order, span, by_name,
+        )
+
+    def _ensure(self) -> None:
+        if self._stale or self.refresh_seconds <= 0 or time.monotonic() - self._checked_at >= self.refresh_seconds:
+            self.refresh()
+
+    # --- lookups ---
+
+    def resolve(self, employee: Employee) -> int:
+        """
+        Employee ID of an ID or a name (exact, else a unique partial match; case insensitive).
+
+        Raises:
+            ValueError: Unknown or ambiguous employee
+        """
+        self._ensure()
+        if isinstance(employee, int) or str(employee).strip().isdigit():
+            employee_id = int(employee)
+            if employee_id not in self.manager:
+                raise ValueError(f"No employee with ID {employee_id}.")
+            return employee_id
+        key = str(employee).strip().lower()
+        matches = self._by_name.get(key) or [
+            employee_id for name, ids in self._by_name.items() if key in name for employee_id in ids
+        ]
+        if not matches:
+            raise ValueError(f"No employee named '{employee}'.")
+        if len(matches) > 1:
+            raise ValueError(f"'{employee}' matches several employees: " + ", ".join(self.describe(e) for e in matches[:10]))
+        return matches[0]
+
+    def _timed(self, started: float) -> None:
+        with self._lock:
+            self.counters["lookups"] += 1
+            self.counters["lookup_us"] += (time.perf_counter() - started) * 1e6
+
+    def manager_of(self, employee: Employee) -> Optional[int]:
+        """Direct manager of an employee (None at the root)."""
+        started = time.perf_counter()
+        employee_id = self.resolve(employee)
+        chain = self.ancestors[employee_id]
+        self._timed(started)
+        return chain[0] if chain else None
+
+    def managers(self, employee_ids: List[Any]) -> Dict[str, Optional[int]]:
+        """Manager of each of the given employee IDs as stored (unknown IDs are left out)."""
+        self._ensure()
+        started = time.perf_counter()
+        result = {str(employee_id): self.manager[int(employee_id)] for employee_id in employee_ids if int(employee_id) in self.manager}
+        self._timed(started)
+        return result
+
+    def direct_reports(self, employee: Employee) -> List[int]:
+        started = time.perf_counter()
+        employee_id = self.resolve(employee)
+        reports = list(self.children[employee_id])
+        self._timed(started)
+        return reports
+
+    def descendants(self, employee: Employee, max_depth: Optional[int] = None) -> List[int]:
+        """Everyone under an employee, depth first (optionally at most max_depth levels down)."""
+        started = time.perf_counter()
+        employee_id = self.resolve(employee)
+        start, end = self._span[employee_id]
+        members = self._order[start + 1:end]
+        if max_depth is not None:
+            depth = len(self.ancestors[employee_id])
+            members = [member for member in members if len(self.ancestors[member]) - depth <= max_depth]
+        self._timed(started)
+        return members
+
+    def chain(self, employee: Employee) -> List[int]:
+        """Managers of an employee from the direct manager up to the root (the approval chain)."""
+        started = time.perf_counter()
+        employee_id = self.resolve(employee)
+        chain = list(self.ancestors[employee_id])
+        self._timed(started)
+        return chain
+
+    def team_size(self, employee: Employee) -> int:
+        """Number of people under an employee, all levels included."""
+        started = time.perf_counter()
+        employee_id = self.resolve(employee)
+        start, end = self._span[employee_id]
+        self._timed(started)
+        return end - start - 1
+
+    def is_under(self, employee: Employee, manager: Employee) -> bool:
+        """Whether an employee reports (directly or not) to a manager."""
+        manager_id, employee_id = self.resolve(manager), self.resolve(employee)
+        return manager_id in self.ancestors[employee_id]
+
+    def employee_ids(self) -> List[int]:
+        """IDs of every employee, in ID order."""
+        self._ensure()
+        return sorted(self.manager)
+
+    def roots(self) -> List[int]:
+        self._ensure()
+        return [employee_id for employee_id in self._order if not self.ancestors[employee_id]]
+
+    def describe(self, employee_id: int) -> str:
+        return f"{self.names.get(employee_id, '?')} (ID {employee_id}, {self.roles.get(employee_id, '?')})"
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.counters)
+        stats["employees"] = len(self.manager)
+        stats["cycles"] = len(self.cycles)
+        stats["mean_lookup_us"] = stats["lookup_us"] / stats["lookups"] if stats["lookups"] else 0.0
+        return stats
+
+
+def answer(hierarchy: OrgHierarchy, relation: str, employee: Employee, max_depth: Optional[int] = None) -> str:
+    """
+    Text answer about an employee's place in the hierarchy, as returned by the agent tool.
+
+    Args:
+        hierarchy: Index to query
+        relation: 'manager', 'direct_reports', 'all_reports', 'chain' or 'team_sizes'
+        employee: Employee ID or name
+        max_depth: Levels below the employee included by 'all_reports'
+    """
+    try:
+        employee_id = hierarchy.resolve(employee)
+    except ValueError as e:
+        return f"❌ {e}"
+    who = hierarchy.describe(employee_id)
+    if relation == "manager":
+        manager_id = hierarchy.manager_of(employee_id)
+        return f"Manager of {who}: {hierarchy.describe(manager_id)}" if manager_id else f"{who} has no manager."
+    if relation == "direct_reports":
+        reports = hierarchy.direct_reports(employee_id)
+        lines = [f"{len(reports)} direct report(s) of {who}:"]
+        lines += [f"- {hierarchy.describe(e)}, team of {hierarchy.team_size(e)}" for e in reports]
+        return "\n".join(lines)
+    if relation == "all_reports":
+        members = hierarchy.descendants(employee_id, max_depth)
+        depth = len(hierarchy.ancestors[employee_id])
+        lines = [f"{len(members)} employee(s) under {who}:"]
+        for member in members[:200]:
+            indent = "  " * (len(hierarchy.ancestors[member]) - depth - 1)
+            lines.append(f"{indent}- {hierarchy.describe(member)}")
+        if len(members) > 200:
+            lines.append(f"... {len(members) - 200} more")
+        return "\n".join(lines)
+    if relation == "chain":
+        chain = hierarchy.chain(employee_id)
+        if not chain:
+            return f"{who} is at the top of the hierarchy."
+        return f"Management chain of {who}, from the direct manager up:\n" + "\n".join(
+            f"{level}. {hierarchy.describe(manager_id)}" for level, manager_id in enumerate(chain, start=1)
+        )
+    if relation == "team_sizes":
+        reports = hierarchy.direct_reports(employee_id)
+        lines = [f"{who}: {hierarchy.team_size(employee_id)} people in total"]
+        lines += [f"- {hierarchy.describe(e)}: {hierarchy.team_size(e)}" for e in sorted(reports, key=hierarchy.team_size, reverse=True)]
+        return "\n".join(lines)
+    return f"❌ Unknown relation '{relation}'. Use manager, direct_reports, all_reports, chain or team_sizes."
+
+
+if __name__ == "__main__":
+    from run_sql_agent import ActivityReportAgent
+
+    relations = {"manager": "manager", "reports": "direct_reports", "under": "all_reports", "chain": "chain", "teams": "team_sizes"}
+    parser = argparse.ArgumentParser(description="Query the reporting hierarchy of the employees table")
+    parser.add_argument("relation", choices=relations)
+    parser.add_argument("employee", help="Employee ID or name")
+    parser.add_argument("--depth", type=int, help="Levels shown by 'under'")
+    args = parser.parse_args()
+
+    agent = ActivityReportAgent()
+    print(answer(agent.org_hierarchy, relations[args.relation], args.employee, args.depth))
+    stats = agent.org_hierarchy.stats()
+    print(f"⏱️  {stats['employees']} employee(s) indexed, {stats['mean_lookup_us']:.1f} µs per lookup, {stats['cycles']} cycle(s) cut")
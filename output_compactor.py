@@ -0,0 +1,229 @@
+"""
+Size-aware compaction of tool output fed back to the LLM.
+
+Every tool result the agent reads goes back into the next prompt. A broad SELECT on
+activity_reports can be thousands of rows, which adds latency and cost or overflows the
+context. Output over TOOL_OUTPUT_MAX_TOKENS (estimated at ~4 characters per token) is
+replaced before the LLM sees it:
+
+    SQL results   row and column counts, per-column statistics (nulls, distinct values,
+                  min/max/mean/sum of numbers, min/max of dates and text, the most frequent
+                  values of low-cardinality columns), the first TOOL_OUTPUT_TOP_ROWS rows in
+                  the usual format, and a pointer to the full result in the result workspace
+                  (query_results with its ID) or, without one, a hint to narrow the query
+    other text    the first lines that fit, with the number of lines and characters left out
+
+Tools answering the user directly (return_direct) and schema lookups are not compacted.
+Bytes in, out and saved are counted per tool, and per request on the request's trace span
+(tool_output_bytes_saved).
+"""
+import os
+import re
+import threading
+from collections import Counter
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Optional, Dict, Any, List, Sequence
+
+from schema_index import CHARS_PER_TOKEN, estimate_tokens
+from tracing import TRACER
+
+# Columns with at most this many distinct values get their most frequent values listed
+LOW_CARDINALITY = 20
+
+# Dates and timestamps as text (SQLite)
+_ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}([ T][\d:.]+)?$")
+
+
+def _kind(values: List[Any]) -> str:
+    if all(isinstance(value, bool) for value in values):
+        return "bool"
+    if all(isinstance(value, (int, float, Decimal)) and not isinstance(value, bool) for value in values):
+        return "number"
+    if all(isinstance(value, (date, datetime)) for value in values):
+        return "date"
+    if all(isinstance(value, str) and _ISO_DATE.match(value) for value in values):
+        return "date"
+    return "text"
+
+
+def _format_number(value: Any) -> str:
+    value = float(value)
+    return f"{value:,.0f}" if value.is_integer() else f"{value:,.2f}"
+
+
+def column_summary(name: str, values: Sequence[Any], top_values: int = 3) -> str:
+    """One line of statistics about a column of a result set."""
+    present = [value for value in values if value is not None]
+    nulls = len(values) - len(present)
+    if not present:
+        return f"- {name}: all null"
+    kind = _kind(present)
+    counts = Counter(str(value) for value in present)
+    parts = [f"{len(counts)} distinct"]
+    if nulls:
+        parts.append(f"{nulls} null")
+    if kind == "number":
+        total = sum(float(value) for value in present)
+        parts.append(
+            f"min {_format_number(min(present))}, max {_format_number(max(present))}, "
+            f"mean {_format_number(total / len(present))}, sum {_format_number(total)}"
+        )
+    elif kind == "date":
+        parts.append(f"from {min(present)} to {max(present)}")
+    if kind != "number" and len(counts) <= LOW_CARDINALITY:
+        parts.append(", ".join(f"{value} ({count})" for value, count in counts.most_common(top_values))
+                     + (", ..." if len(counts) > top_values else ""))
+    elif kind == "text":
+        lengths = [len(str(value)) for value in present]
+        parts.append(f"e.g. {str(present[0])[:40]!r}, {min(lengths)}-{max(lengths)} chars")
+    return f"- {name} ({kind}): " + "; ".join(parts)
+
+
+class ToolOutputCompactor:
+    """Replaces tool output over a token budget with a summary the LLM can ask slices of."""
+
+    def __init__(self, max_tokens: int = 2000, top_rows: int = 10, top_values: int = 3):
+        """
+        Args:
+            max_tokens: Estimated tokens of tool output passed through unchanged (0: no compaction)
+            top_rows: Rows of a compacted SQL result shown as they are
+            top_values: Most frequent values listed per low-cardinality column
+        """
+        self.max_tokens = max_tokens
+        self.top_rows = top_rows
+        self.top_values = top_values
+        self._lock = threading.Lock()
+        self.counters = {"outputs": 0, "compacted": 0, "requests": 0, "bytes_in": 0, "bytes_out": 0, "bytes_saved": 0}
+        self.by_tool: Dict[str, Dict[str, int]] = {}
+
+    @classmethod
+    def from_env(cls) -> "ToolOutputCompactor":
+        """Build a compactor from TOOL_OUTPUT_* environment variables."""
+        return cls(
+            max_tokens=int(os.getenv("TOOL_OUTPUT_MAX_TOKENS", "2000")),
+            top_rows=int(os.getenv("TOOL_OUTPUT_TOP_ROWS", "10")),
+        )
+
+    def fits(self, text: str) -> bool:
+        return self.max_tokens <= 0 or estimate_tokens(text) <= self.max_tokens
+
+    def _record(self, tool: str, before: str, after: str) -> str:
+        size_in, size_out = len(before.encode("utf-8")), len(after.encode("utf-8"))
+        saved = size_in - size_out
+        trace = TRACER.current()
+        new_request = False
+        if trace is not None and saved > 0:
+            new_request = "tool_output_bytes_saved" not in trace.root
+            trace.root["tool_output_bytes_saved"] = trace.root.get("tool_output_bytes_saved", 0) + saved
+        with self._lock:
+            tool_stats = self.by_tool.setdefault(tool, {"outputs": 0, "compacted": 0, "bytes_saved": 0})
+            self.counters["outputs"] += 1
+            tool_stats["outputs"] += 1
+            self.counters["bytes_in"] += size_in
+            self.counters["bytes_out"] += size_out
+            if saved > 0:
+                self.counters["compacted"] += 1
+                self.counters["bytes_saved"] += saved
+                self.counters["requests"] += new_request
+                tool_stats["compacted"] += 1
+                tool_stats["bytes_saved"] += saved
+        return after
+
+    def compact_text(self, text: Any, tool: str) -> Any:
+        """
+        The output of a tool, cut to the first lines within the budget when it is over it.
+
+        Args:
+            text: Tool output (anything but a string is passed through)
+            tool: Tool name, for the statistics
+        """
+        if not isinstance(text, str):
+            return text
+        return self._record(tool, text, text if self.fits(text) else self._cut(text))
+
+    def _cut(self, text: str) -> str:
+        budget = self.max_tokens * CHARS_PER_TOKEN
+        lines = text.splitlines(keepends=True)
+        kept, size = [], 0
+        for line in lines:
+            if size + len(line) > budget:
+                break
+            kept.append(line)
+            size += len(line)
+        if not kept:
+            kept, size = [lines[0][:budget]], budget
+        note = (
+            f"\n... output cut to fit the tool output budget: {len(lines) - len(kept)} more line(s), "
+            f"{len(text) - size:,} of {len(text):,} characters left out. Ask for a narrower range, "
+            "a specific item or a summary instead."
+        )
+        return "".join(kept).rstrip("\n") + note
+
+    def compact_rows(
+        self,
+        text: str,
+        rows: Sequence[Dict[str, Any]],
+        result_id: Optional[str] = None,
+        tool: str = "sql_db_query",
+        truncated: bool = False,
+    ) -> str:
+        """
+        The text of a SQL result (as SQLDatabase.run formats it), summarized when over the budget.
+
+        Args:
+            text: The full result as text
+            rows: The rows it was made from
+            result_id: ID of the full result in the result workspace, if it was kept
+            tool: Tool name, for the statistics
+            truncated: The rows are only the first ones of a longer result (cut by the query guard)
+        """
+        if self.fits(text) or not rows:
+            return self._record(tool, text, text)
+        columns = list(rows[0].keys())
+        lines = [
+            f"Result{' ' + result_id if result_id else ''}: {len(rows):,} row(s) x {len(columns)} column(s), "
+            f"~{estimate_tokens(text):,} tokens as text, over the {self.max_tokens:,} token budget: summarized."
+        ]
+        if truncated:
+            lines.append(
+                f"Partial result: only the first {len(rows):,} rows of a longer result (cut by the query guard); "
+                "the statistics below cover these rows only and are not totals."
+            )
+        lines.append("Columns:")
+        lines += [column_summary(name, [row[name] for row in rows], self.top_values) for name in columns]
+        head = self._head(rows, columns, self.max_tokens * CHARS_PER_TOKEN - len("\n".join(lines)) - 400)
+        if head:
+            lines.append(f"First {len(head)} row(s) ({', '.join(columns)}):")
+            lines.append(str(head))
+        if result_id and truncated:
+            lines.append(
+                f"These rows are kept as {result_id}: query_results can filter or sort them, but counts and "
+                "totals must be computed in SQL (COUNT/SUM with GROUP BY)."
+            )
+        elif result_id:
+            lines.append(
+                f"The full result is kept as {result_id}: use query_results with result_id '{result_id}' "
+                "(filters, group_by, aggregates, order_by, limit) for specific rows or totals instead of "
+                "running a broader query again."
+            )
+        else:
+            lines.append("Narrow the query (WHERE, GROUP BY with aggregates, LIMIT) to get specific rows or totals.")
+        summary = "\n".join(lines)
+        # Very wide results: even the column statistics can be over the budget
+        return self._record(tool, text, summary if self.fits(summary) else self._cut(summary))
+
+    def _head(self, rows: Sequence[Dict[str, Any]], columns: List[str], budget: int) -> List[tuple]:
+        """The first top_rows rows as tuples, fewer when they do not fit in budget characters."""
+        head = [tuple(row[name] for name in columns) for row in rows[:self.top_rows]]
+        while head and len(str(head)) > budget:
+            head = head[:len(head) // 2]
+        return head
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats: Dict[str, Any] = dict(self.counters)
+            stats["by_tool"] = {tool: dict(values) for tool, values in self.by_tool.items()}
+        stats["saved_per_request"] = stats["bytes_saved"] / stats["requests"] if stats["requests"] else 0.0
+        stats["max_tokens"] = self.max_tokens
+        return stats
@@ -0,0 +1,361 @@
+"""
+EXPLAIN-based cost guard for generated SQL.
+
+Before a read runs, its plan is fetched with EXPLAIN (EXPLAIN QUERY PLAN on SQLite) to
+estimate the rows it examines and returns and to spot full table scans and filesorts.
+Depending on configurable thresholds the statement is then
+
+    allowed    as is,
+    limited    a LIMIT is appended (large detail result without LIMIT); the rows are cut to
+               the cap and the caller shows truncation_note() with them,
+    counted    refused, with the row count (counted up to a cap) and a hint to aggregate (huge result),
+    refused    with a message telling the LLM how to narrow it (too many rows examined).
+
+Refusals raise QueryRefused, whose message is shown to the LLM as the tool error. Only
+generated SQL (the agent's SQL tools, single-shot mode) is checked; the queries of the
+agent's own tools are trusted. Every MySQL connection also gets a server-side MAX_EXECUTION_TIME,
+lowered to what is left of the request budget for statements run under statement_deadline()
+(SQLite statements are interrupted once the deadline has passed).
+"""
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, Dict, Any, List, Deque, Iterator, NamedTuple, Sequence, Tuple
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+
+from sql_cache import _COMMENT_RE, _LITERAL_RE, is_write
+
+logger = logging.getLogger(__name__)
+
+_LIMIT_RE = re.compile(r"\blimit\s+(\d+|:\w+)(\s*(,|offset)\s*(\d+|:\w+))?\s*$", re.I)
+_AGGREGATE_RE = re.compile(r"\b(group\s+by|count|sum|avg|min|max)\b", re.I)
+_PARENS_RE = re.compile(r"\([^()]*\)")
+# Aggregates used as window functions keep one row per input row
+_WINDOW_RE = re.compile(r"\b(count|sum|avg|min|max)\s*over\b", re.I)
+_SQLITE_SCAN_RE = re.compile(r"^(SCAN|SEARCH) (?:TABLE )?(\w+)")
+_SELECT_RE = re.compile(r"^\s*select\b(?!\s*/\*\+)", re.I)
+_TABLE_ALIAS_RE = re.compile(r"(?:\bfrom|\bjoin|,)\s+[`\"]?(\w+)[`\"]?(?:\s+as)?\s+(?!(?:on|where|join|inner|left|right|cross|natural|using|group|order|limit|having|union)\b)(\w+)", re.I)
+
+
+class QueryRefused(SQLAlchemyError):
+    """
+    A statement was refused by the cost guard; the message says how to fix it.
+
+    Raised as a SQLAlchemyError so the SQL agent tools hand it to the LLM like any database error.
+    """
+
+
+class GuardedStatement(NamedTuple):
+    """A read as the guard lets it run."""
+
+    # SQL to run
+    statement: str
+    # SQL the returned rows answer (with the guard's LIMIT, if it added one)
+    source: str
+    # Rows kept at most when the guard added a LIMIT (the statement fetches one more to tell)
+    row_cap: Optional[int] = None
+
+    def cap(self, rows: Any) -> Tuple[Any, bool]:
+        """The rows within the cap, and whether some were cut."""
+        if self.row_cap is None or not isinstance(rows, list) or len(rows) <= self.row_cap:
+            return rows, False
+        return rows[:self.row_cap], True
+
+
+# Monotonic deadline of the current request: statements run before it at the latest
+_DEADLINE: ContextVar[Optional[float]] = ContextVar("statement_deadline", default=None)
+
+
+@contextmanager
+def statement_deadline(deadline: Optional[float]) -> Iterator[None]:
+    """Bound the statements run in the enclosed block (in this context) by a time.monotonic() deadline."""
+    token = _DEADLINE.set(deadline)
+    try:
+        yield
+    finally:
+        _DEADLINE.reset(token)
+
+
+def install_statement_timeout(engine: Engine, max_execution_ms: int) -> None:
+    """
+    Give every new MySQL connection of the engine a server-side SELECT timeout, lowered
+    per statement (MAX_EXECUTION_TIME hint) to the time left before statement_deadline().
+    SQLite connections get a progress handler interrupting statements past the deadline.
+    """
+    if engine.dialect.name == "sqlite":
+        @event.listens_for(engine, "connect")
+        def set_progress_handler(dbapi_connection, connection_record):
+            def past_deadline() -> int:
+                deadline = _DEADLINE.get()
+                return int(deadline is not None and time.monotonic() > deadline)
+
+            dbapi_connection.set_progress_handler(past_deadline, 10_000)
+        return
+    if engine.dialect.name != "mysql":
+        return
+
+    if max_execution_ms > 0:
+        @event.listens_for(engine, "connect")
+        def set_max_execution_time(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            try:
+                cursor.execute(f"SET SESSION MAX_EXECUTION_TIME = {int(max_execution_ms)}")
+            finally:
+                cursor.close()
+
+    @event.listens_for(engine, "before_cursor_execute", retval=True)
+    def add_deadline_hint(conn, cursor, statement, parameters, context, executemany):
+        deadline = _DEADLINE.get()
+        if deadline is None or not _SELECT_RE.match(statement):
+            return statement, parameters
+        remaining_ms = max(int((deadline - time.monotonic()) * 1000), 1)
+        if max_execution_ms > 0:
+            remaining_ms = min(remaining_ms, max_execution_ms)
+        return _SELECT_RE.sub(f"SELECT /*+ MAX_EXECUTION_TIME({remaining_ms}) */", statement, count=1), parameters
+
+
+def _outer_query(code: str) -> str:
+    """The statement without the contents of its parentheses (subqueries, CTE bodies, call arguments)."""
+    while True:
+        outer = _PARENS_RE.sub(" ", code)
+        if outer == code:
+            return _WINDOW_RE.sub(" ", outer)
+        code = outer
+
+
+class QueryPlan:
+    """Estimates extracted from an EXPLAIN."""
+
+    def __init__(self, examined_rows: float, result_rows: float, full_scans: List[str], filesort: bool):
+        self.examined_rows = examined_rows
+        self.result_rows = result_rows
+        self.full_scans = full_scans
+        self.filesort = filesort
+
+    def describe(self) -> str:
+        parts = [f"~{self.examined_rows:,.0f} rows examined", f"~{self.result_rows:,.0f} rows returned"]
+        if self.full_scans:
+            parts.append(f"full scan of {', '.join(self.full_scans)}")
+        if self.filesort:
+            parts.append("filesort")
+        return ", ".join(parts)
+
+
+class QueryGuard:
+    """Checks reads against row and scan thresholds before they run."""
+
+    def __init__(
+        self,
+        engine: Engine,
+        max_examined_rows: int = 5_000_000,
+        max_result_rows: int = 1000,
+        count_result_rows: int = 100_000,
+        full_scan_rows: int = 100_000,
+    ):
+        """
+        Args:
+            engine: Engine the statements run on (EXPLAIN runs there too)
+            max_examined_rows: Refuse statements estimated to examine more rows than this
+            max_result_rows: Append LIMIT to detail queries estimated to return more rows than this
+            count_result_rows: Refuse detail queries returning more rows than this (counted up to this many)
+            full_scan_rows: Full scans of tables larger than this are logged (and limited without LIMIT)
+        """
+        self.engine = engine
+        self.dialect = engine.dialect.name
+        self.max_examined_rows = max_examined_rows
+        self.max_result_rows = max_result_rows
+        self.count_result_rows = count_result_rows
+        self.full_scan_rows = full_scan_rows
+        self.counters: Dict[str, float] = {
+            "checked": 0, "allowed": 0, "limited": 0, "counted": 0, "refused": 0, "full_scan": 0,
+            "explain_errors": 0, "explain_ms": 0.0,
+        }
+        self.violations: Deque[Dict[str, Any]] = deque(maxlen=100)
+        self._table_rows: Dict[str, Tuple[float, int]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, engine: Engine) -> "QueryGuard":
+        """Build a guard from QUERY_GUARD_* environment variables."""
+        return cls(
+            engine,
+            max_examined_rows=int(os.getenv("QUERY_GUARD_MAX_EXAMINED_ROWS", "5000000")),
+            max_result_rows=int(os.getenv("QUERY_GUARD_MAX_RESULT_ROWS", "1000")),
+            count_result_rows=int(os.getenv("QUERY_GUARD_COUNT_RESULT_ROWS", "100000")),
+            full_scan_rows=int(os.getenv("QUERY_GUARD_FULL_SCAN_ROWS", "100000")),
+        )
+
+    def _count(self, name: str, amount: float = 1) -> None:
+        with self._lock:
+            self.counters[name] += amount
+
+    def check(self, sql: str, params: Optional[Dict[str, Any]] = None) -> GuardedStatement:
+        """
+        Return the statement to run in place of sql (possibly with a LIMIT appended: cut
+        the rows with GuardedStatement.cap and show truncation_note() when it cut some)
+
+        Raises:
+            QueryRefused: The statement is too expensive; the message says how to narrow it
+        """
+        stripped = _COMMENT_RE.sub(" ", sql).strip().rstrip(";").strip()
+        if is_write(stripped) or not re.match(r"^(select|with)\b", stripped, re.I):
+            return GuardedStatement(sql, sql)
+        self._count("checked")
+
+        start = time.perf_counter()
+        try:
+            plan = self.explain(stripped, params)
+        except Exception as e:
+            # Let the statement itself report invalid SQL
+            self._count("explain_errors")
+            logger.debug("EXPLAIN failed for %s: %s", stripped, e)
+            return GuardedStatement(sql, sql)
+        finally:
+            self._count("explain_ms", (time.perf_counter() - start) * 1000)
+
+        if plan.examined_rows > self.max_examined_rows:
+            self._violation("refused", stripped, plan)
+            raise QueryRefused(
+                f"Query refused by the cost guard: {plan.describe()} (limit {self.max_examined_rows:,}). "
+                "Filter on indexed columns (employee_id, project_id, date ranges), avoid joining large tables "
+                "without a join condition, or aggregate with GROUP BY."
+            )
+
+        code = _LITERAL_RE.sub("''", stripped)
+        detail = not _AGGREGATE_RE.search(_outer_query(code))
+        if _LIMIT_RE.search(code) or not detail:
+            if plan.full_scans and plan.examined_rows > self.full_scan_rows:
+                self._violation("full_scan", stripped, plan)
+            self._count("allowed")
+            return GuardedStatement(sql, sql)
+
+        if plan.result_rows > self.count_result_rows:
+            # Counted up to the threshold only: the full count would cost as much as the query
+            with self.engine.connect() as conn:
+                rows = conn.execute(
+                    text(f"SELECT COUNT(*) FROM (SELECT 1 FROM ({stripped}) AS guarded LIMIT {self.count_result_rows + 1}) AS capped"),
+                    params or {},
+                ).scalar()
+            if rows > self.count_result_rows:
+                self._violation("counted", stripped, plan)
+                raise QueryRefused(
+                    f"Query refused by the cost guard: it returns more than {self.count_result_rows:,} rows. "
+                    "Aggregate them (COUNT, SUM, GROUP BY) or add filters and a LIMIT."
+                )
+
+        big_scan = plan.full_scans and plan.examined_rows > self.full_scan_rows
+        if plan.result_rows > self.max_result_rows or big_scan:
+            self._violation("limited", stripped, plan)
+            return GuardedStatement(
+                f"{stripped} LIMIT {self.max_result_rows + 1}",
+                f"{stripped} LIMIT {self.max_result_rows}",
+                self.max_result_rows,
+            )
+
+        self._count("allowed")
+        return GuardedStatement(sql, sql)
+
+    @staticmethod
+    def truncation_note(rows: int) -> str:
+        """Text shown with a result the guard cut to its first rows."""
+        return (
+            f"⚠️ Result truncated to the first {rows:,} rows by the query cost guard: counts, sums and other "
+            "totals computed from these rows are incomplete. Use COUNT/SUM with GROUP BY in SQL for totals, "
+            "or add filters."
+        )
+
+    def explain(self, sql: str, params: Optional[Dict[str, Any]] = None) -> QueryPlan:
+        """Run EXPLAIN and estimate examined rows, returned rows, full scans and filesorts."""
+        with self.engine.connect() as conn:
+            if self.dialect == "sqlite":
+                rows = conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"), params or {}).fetchall()
+                return self._sqlite_plan(conn, [(row[0], row[1], row[-1]) for row in rows], sql)
+            rows = [dict(row._mapping) for row in conn.execute(text(f"EXPLAIN {sql}"), params or {})]
+
+        # MySQL: nested-loop estimate, product of the rows of each table within a SELECT
+        examined: Dict[Any, float] = {}
+        returned: Dict[Any, float] = {}
+        full_scans, filesort = [], False
+        for row in rows:
+            select_id = row.get("id")
+            table_rows = float(row.get("rows") or 1)
+            filtered = float(row.get("filtered") or 100) / 100
+            examined[select_id] = examined.get(select_id, 1.0) * table_rows
+            returned[select_id] = returned.get(select_id, 1.0) * max(table_rows * filtered, 1.0)
+            if str(row.get("type") or "").upper() == "ALL" and row.get("table"):
+                full_scans.append(str(row["table"]))
+            filesort = filesort or "filesort" in str(row.get("Extra") or "").lower()
+        first = next(iter(returned), None)
+        return QueryPlan(sum(examined.values()), returned.get(first, 0.0), full_scans, filesort)
+
+    def _sqlite_plan(self, conn, nodes: Sequence[Tuple[int, int, str]], sql: str) -> QueryPlan:
+        """
+        SQLite has no row estimates: scans count the whole table, index searches a hundredth of it.
+
+        The plan is a tree of (id, parent, detail) nodes: the tables of one SELECT multiply
+        (nested loops), while the branches of a compound SELECT (UNION ALL...) and subqueries add up.
+        """
+        # The plan names aliased tables by their alias
+        aliases = {alias.lower(): table for table, alias in _TABLE_ALIAS_RE.findall(_LITERAL_RE.sub("''", sql))}
+        children: Dict[int, List[Tuple[int, str]]] = {}
+        for node_id, parent, detail in nodes:
+            children.setdefault(parent, []).append((node_id, detail))
+        full_scans: List[str] = []
+        filesort = False
+
+        def examined(parent: int) -> float:
+            nonlocal filesort
+            loop, nested, scanned = 1.0, 0.0, False
+            for node_id, detail in children.get(parent, []):
+                filesort = filesort or "TEMP B-TREE" in detail
+                match = _SQLITE_SCAN_RE.match(detail)
+                if match:
+                    scanned = True
+                    table = aliases.get(match.group(2).lower(), match.group(2))
+                    table_rows = self._table_row_count(conn, table)
+                    if match.group(1) == "SCAN":
+                        # A scan of a covering index still reads every row
+                        if "USING" not in detail:
+                            full_scans.append(table)
+                        loop *= max(table_rows, 1)
+                    else:
+                        loop *= max(table_rows / 100, 1)
+                if node_id in children:
+                    # Compound branches, co-routines and subqueries
+                    nested += examined(node_id)
+            return (loop if scanned else 0.0) + nested
+
+        total = max(examined(0), 1.0)
+        return QueryPlan(total, total, full_scans, filesort)
+
+    def _table_row_count(self, conn, table: str, ttl: float = 300.0) -> int:
+        with self._lock:
+            cached = self._table_rows.get(table)
+        if cached and time.monotonic() - cached[0] < ttl:
+            return cached[1]
+        try:
+            count = int(conn.execute(text(f'SELECT COUNT(*) FROM "{table}"')).scalar() or 0)
+        except Exception:
+            count = 0
+        with self._lock:
+            self._table_rows[table] = (time.monotonic(), count)
+        return count
+
+    def _violation(self, action: str, sql: str, plan: QueryPlan) -> None:
+        self._count(action)
+        violation = {"action": action, "sql": sql[:500], "plan": plan.describe(), "at": time.time()}
+        with self._lock:
+            self.violations.append(violation)
+        logger.warning("Query guard %s: %s | %s", action, plan.describe(), sql[:200])
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.counters, violations=len(self.violations))
@@ -0,0 +1,174 @@
+"""
+Log of every statement executed on an engine, aggregated by fingerprint.
+
+A fingerprint is the normalized statement with every literal and bind parameter
+replaced by ? and repeated value lists collapsed, so the report query of two users
+(or a leave probe of 3 or 300 days) lands in the same bucket. Per fingerprint the
+log keeps the call count, total/max/p95 latency and the slowest sample statement
+with its parameters, which index_advisor.py runs EXPLAIN on. Statements can also be
+appended to a JSON Lines file (QUERY_LOG_PATH) and aggregated again later.
+"""
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from typing import Optional, Dict, Any, List, Deque, Iterable
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from sql_cache import extract_tables, normalize_sql
+
+# Single-quoted string literals
+_STRING_RE = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+# Bind parameters of every DBAPI paramstyle (:name, %(name)s, %s, ?) and numeric literals
+_PARAM_RE = re.compile(r"(:\w+|%\(\w+\)s|%s|\?|\b\d+(?:\.\d+)?\b)")
+# A parenthesized list made only of placeholders: (?, ?, ?)
+_VALUE_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+# Repetitions of such lists: (?), (?), (?) / IN (?+), (?+)
+_REPEATED_LIST_RE = re.compile(r"\(\?\+\)(?:\s*,\s*\(\?\+\))+")
+
+
+def fingerprint(sql: str) -> str:
+    """Normalized statement shape with literals, parameters and value lists replaced by placeholders."""
+    shape = _PARAM_RE.sub("?", _STRING_RE.sub("?", normalize_sql(sql)))
+    shape = _VALUE_LIST_RE.sub("(?+)", shape)
+    return _REPEATED_LIST_RE.sub("(?+)", shape)
+
+
+class FingerprintStats:
+    """Aggregated timings of one statement shape."""
+
+    def __init__(self, fingerprint: str):
+        self.fingerprint = fingerprint
+        self.calls = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.latencies: Deque[float] = deque(maxlen=500)
+        self.sample_statement: Optional[str] = None
+        self.sample_parameters: Any = None
+        self.tables = sorted(extract_tables(fingerprint))
+
+    def add(self, statement: str, parameters: Any, elapsed_ms: float) -> None:
+        self.calls += 1
+        self.total_ms += elapsed_ms
+        self.latencies.append(elapsed_ms)
+        if elapsed_ms >= self.max_ms:
+            # Keep the slowest execution as the one to EXPLAIN
+            self.max_ms = elapsed_ms
+            self.sample_statement = statement
+            self.sample_parameters = parameters
+
+    @property
+    def mean_ms(self) -> float:
+        return self.total_ms / self.calls if self.calls else 0.0
+
+    @property
+    def p95_ms(self) -> float:
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] if ordered else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "fingerprint": self.fingerprint,
+            "tables": self.tables,
+            "calls": self.calls,
+            "total_ms": round(self.total_ms, 2),
+            "mean_ms": round(self.mean_ms, 3),
+            "p95_ms": round(self.p95_ms, 3),
+            "max_ms": round(self.max_ms, 3),
+        }
+
+
+class QueryLog:
+    """Times every statement an engine executes and aggregates them by fingerprint."""
+
+    def __init__(self, path: Optional[str] = None, max_recent: int = 1000):
+        """
+        Args:
+            path: Optional JSON Lines file every executed statement is appended to
+            max_recent: Number of recent executions kept in memory
+        """
+        self.path = path
+        self.fingerprints: Dict[str, FingerprintStats] = {}
+        self.recent: Deque[Dict[str, Any]] = deque(maxlen=max_recent)
+        self.statements = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "QueryLog":
+        """Build a log from the QUERY_LOG_PATH environment variable."""
+        return cls(path=os.getenv("QUERY_LOG_PATH") or None)
+
+    def install(self, engine: Engine) -> "QueryLog":
+        """Time every statement executed on the engine."""
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("query_log_start", []).append(time.perf_counter())
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            starts = conn.info.get("query_log_start")
+            if starts:
+                self.record(statement, parameters, (time.perf_counter() - starts.pop()) * 1000)
+
+        return self
+
+    def record(self, statement: str, parameters: Any, elapsed_ms: float) -> None:
+        """Add one execution (statements of the log's own EXPLAINs are ignored)."""
+        if statement.lstrip()[:7].lower() in ("explain", "pragma "):
+            return
+        shape = fingerprint(statement)
+        with self._lock:
+            stats = self.fingerprints.get(shape)
+            if stats is None:
+                stats = self.fingerprints[shape] = FingerprintStats(shape)
+            stats.add(statement, parameters, elapsed_ms)
+            self.statements += 1
+            entry = {"at": time.time(), "ms": round(elapsed_ms, 3), "fingerprint": shape}
+            self.recent.append(entry)
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(dict(entry, statement=statement, parameters=parameters), default=str) + "\n")
+
+    @classmethod
+    def load(cls, path: str) -> "QueryLog":
+        """Aggregate a JSON Lines file written by a previous run."""
+        log = cls()
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    parameters = entry.get("parameters")
+                    log.record(entry["statement"], tuple(parameters) if isinstance(parameters, list) else parameters, entry["ms"])
+        return log
+
+    def top(self, n: int = 10, by: str = "total_ms") -> List[FingerprintStats]:
+        """The n most expensive fingerprints (by total_ms, mean_ms, p95_ms, max_ms or calls)."""
+        with self._lock:
+            return sorted(self.fingerprints.values(), key=lambda stats: getattr(stats, by), reverse=True)[:n]
+
+    def reset(self) -> None:
+        with self._lock:
+            self.fingerprints.clear()
+            self.recent.clear()
+            self.statements = 0
+
+    def stats(self, n: int = 5) -> Dict[str, Any]:
+        return {
+            "statements": self.statements,
+            "fingerprints": len(self.fingerprints),
+            "top": [stats.to_dict() for stats in self.top(n)],
+        }
+
+
+def format_top(fingerprints: Iterable[FingerprintStats], width: int = 90) -> str:
+    """Text table of fingerprint timings."""
+    lines = [f"{'calls':>6} {'total ms':>10} {'mean ms':>8} {'p95 ms':>8}  statement"]
+    for stats in fingerprints:
+        shape = stats.fingerprint if len(stats.fingerprint) <= width else stats.fingerprint[:width - 3] + "..."
+        lines.append(f"{stats.calls:>6} {stats.total_ms:>10.1f} {stats.mean_ms:>8.2f} {stats.p95_ms:>8.2f}  {shape}")
+    return "\n".join(lines)
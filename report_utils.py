@@ -1,5 +1,17 @@
+import csv
+import json
 from datetime import datetime
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Iterable, Iterator
+
+# Plural of each aggregated report dimension, for the "all ..." label of subtotal rows
+DIMENSION_PLURALS = {
+    "project": "projects",
+    "department": "departments",
+    "employee": "employees",
+    "status": "statuses",
+    "week": "weeks",
+    "month": "months",
+}
 
 class ActivityReportGenerator:
     """Utility class for generating activity reports from SQL query results."""
@@ -34,12 +46,7 @@ class ActivityReportGenerator:
         
         # Add each activity entry
         for entry in data:
-            report.append(
-                f"📅 {entry.get('date', 'N/A')} | "
-                f"ID: {entry.get('report_id', 'N/A')} | "
-                f"Hours: {entry.get('hours', 0):.1f} | "
-                f"Status: {entry.get('status', 'N/A')}"
-            )
+            report.append(ActivityReportGenerator.format_activity_entry(entry))
             
         return "\n".join(report)
     
@@ -54,24 +61,204 @@ class ActivityReportGenerator:
         Returns:
             List[Dict[str, Any]]: Formatted activity data
         """
-        formatted_data = []
-        
-        for row in query_results:
-            # Format the date if needed
-            date_value = row.get('date')
-            if isinstance(date_value, datetime):
-                date_str = date_value.strftime("%Y-%m-%d")
-            else:
-                date_str = str(date_value)
-                
-            formatted_row = {
-                'date': date_str,
-                'report_id': row.get('report_id', ''),
-                'hours': float(row.get('hours', 0)),
-                'status': row.get('status', '').capitalize(),
-            }
-            formatted_data.append(formatted_row)
+        formatted_data = list(ActivityReportGenerator.iter_activity_data(query_results))
             
         # Sort by date (most recent first)
         formatted_data.sort(key=lambda x: x['date'], reverse=True)
         return formatted_data
+
+    @staticmethod
+    def format_activity_row(row: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Format one raw query row into the standardized activity report format.
+        
+        Args:
+            row: Raw row from SQL query
+            
+        Returns:
+            Dict[str, Any]: Formatted activity entry
+        """
+        # Format the date if needed
+        date_value = row.get('date')
+        if isinstance(date_value, datetime):
+            date_str = date_value.strftime("%Y-%m-%d")
+        else:
+            date_str = str(date_value)
+            
+        return {
+            'date': date_str,
+            'report_id': row.get('report_id', ''),
+            'hours': float(row.get('hours', 0)),
+            'status': (row.get('status') or '').capitalize(),
+        }
+
+    @staticmethod
+    def iter_activity_data(query_results: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """
+        Lazily format raw query rows, keeping the order of the query (no re-sorting).
+        
+        Args:
+            query_results: Raw rows, e.g. a server-side cursor
+            
+        Yields:
+            Dict[str, Any]: Formatted activity entries
+        """
+        for row in query_results:
+            yield ActivityReportGenerator.format_activity_row(row)
+
+    @staticmethod
+    def format_activity_entry(entry: Dict[str, Any]) -> str:
+        """Format one formatted activity entry as a report line."""
+        return (
+            f"📅 {entry.get('date', 'N/A')} | "
+            f"ID: {entry.get('report_id', 'N/A')} | "
+            f"Hours: {entry.get('hours', 0):.1f} | "
+            f"Status: {entry.get('status', 'N/A')}"
+        )
+
+    @staticmethod
+    def format_activity_page(
+        entries: Iterable[Dict[str, Any]],
+        summary: Dict[str, Any],
+        page: int,
+        page_size: int,
+        next_cursor: Optional[str] = None,
+    ) -> str:
+        """
+        Format one page of a paginated activity report.
+        
+        Args:
+            entries: Formatted activity entries of the page
+            summary: Totals for the whole range ('first_date', 'last_date', 'entries', 'hours')
+            page: 1-based page number
+            page_size: Maximum number of entries per page
+            next_cursor: Cursor of the next page, if there is one
+            
+        Returns:
+            str: Formatted report page as a string
+        """
+        if not summary.get('entries'):
+            return "No activity data found for the specified period."
+
+        total_pages = max(1, -(-int(summary['entries']) // page_size))
+        report = [
+            "📊 Activity Report",
+            "=" * 50,
+            f"Period: {summary['first_date']} to {summary['last_date']}",
+            f"Total Entries: {summary['entries']}",
+            f"Total Hours: {float(summary['hours'] or 0):.1f}",
+            f"Page: {page} of {total_pages} ({page_size} entries per page)",
+            "-" * 50
+        ]
+        report.extend(ActivityReportGenerator.format_activity_entry(entry) for entry in entries)
+        if next_cursor:
+            report.append("-" * 50)
+            report.append(f"➡️  More entries available: request the next page with cursor='{next_cursor}'")
+        return "\n".join(report)
+
+    @staticmethod
+    def export_activity_data(entries: Iterable[Dict[str, Any]], path: str, export_format: str = "csv") -> Dict[str, Any]:
+        """
+        Write formatted activity entries to a CSV or JSON Lines file in constant memory.
+        
+        Args:
+            entries: Formatted activity entries (any iterable, consumed once)
+            path: Output file path
+            export_format: 'csv' or 'jsonl'
+            
+        Returns:
+            Dict[str, Any]: Number of rows and total hours written
+        """
+        if export_format not in ("csv", "jsonl"):
+            raise ValueError(f"Unsupported export format: {export_format} (use 'csv' or 'jsonl')")
+
+        rows = 0
+        total_hours = 0.0
+        fields = ['date', 'report_id', 'hours', 'status']
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=fields, extrasaction='ignore') if export_format == "csv" else None
+            if writer:
+                writer.writeheader()
+            for entry in entries:
+                if writer:
+                    writer.writerow(entry)
+                else:
+                    f.write(json.dumps(entry, default=str) + "\n")
+                rows += 1
+                total_hours += entry.get('hours', 0)
+        return {'rows': rows, 'hours': total_hours, 'path': path}
+
+    @staticmethod
+    def format_aggregated_report(
+        rows: List[Dict[str, Any]],
+        group_by: List[str],
+        start_date: str,
+        end_date: str,
+    ) -> str:
+        """
+        Format the rows of a GROUP BY ... WITH ROLLUP query into a compact summary.
+        
+        Args:
+            rows: Rows with dimension values d0..dN, grouping flags g0..gN, 'hours' and 'entries'
+            group_by: Names of the grouping dimensions, in order
+            start_date: Start of the reported range
+            end_date: End of the reported range
+            
+        Returns:
+            str: Formatted summary as a string
+        """
+        if not rows or not int(rows[-1].get('entries') or 0):
+            return "No activity data found for the specified period."
+
+        report = [
+            "📊 Aggregated Activity Report",
+            "=" * 50,
+            f"Period: {start_date} to {end_date}",
+            f"Grouped by: {', '.join(group_by)}",
+            "-" * 50
+        ]
+        for row in rows:
+            flags = [int(row.get(f'g{i}') or 0) for i in range(len(group_by))]
+            entries = int(row.get('entries') or 0)
+            hours = f"{float(row.get('hours') or 0):.1f} h | {entries} entr{'y' if entries == 1 else 'ies'}"
+            if all(flags):
+                report.append("-" * 50)
+                report.append(f"TOTAL | {hours}")
+                continue
+            labels = []
+            for i, dim in enumerate(group_by):
+                if flags[i]:
+                    labels.append(f"all {DIMENSION_PLURALS.get(dim, dim + 's')}")
+                else:
+                    value = row.get(f'd{i}')
+                    labels.append(str(value) if value is not None else f"(no {dim})")
+            # Subtotal rows (some dimensions rolled up) are marked with a sigma
+            prefix = "Σ " if any(flags) else "  "
+            report.append(f"{prefix}{' | '.join(labels)} | {hours}")
+        return "\n".join(report)
+
+    @staticmethod
+    def format_query_result(rows: List[Dict[str, Any]], max_rows: int = 50) -> str:
+        """
+        Format the rows of an ad hoc query as a compact text table.
+        
+        Args:
+            rows: Query result rows
+            max_rows: Maximum number of rows shown
+            
+        Returns:
+            str: Formatted result as a string
+        """
+        if not rows:
+            return "No matching data found."
+
+        columns = list(rows[0].keys())
+        if len(rows) == 1 and len(columns) == 1:
+            return f"📋 {columns[0]}: {rows[0][columns[0]]}"
+
+        report = ["📋 " + " | ".join(columns), "-" * 50]
+        for row in rows[:max_rows]:
+            report.append("   " + " | ".join("" if row[column] is None else str(row[column]) for column in columns))
+        if len(rows) > max_rows:
+            report.append(f"... {len(rows) - max_rows} more row(s)")
+        return "\n".join(report)
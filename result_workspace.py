@@ -0,0 +1,421 @@
+"""
+Per-session workspace of recent SQL result sets, for answering follow-ups locally.
+
+Every result set returned to the SQL agent is kept (column by column) under an ID such
+as r3, per session, so that follow-ups like "now only the approved ones", "sort by hours"
+or "group that by project" can filter, sort, project and aggregate it with the
+query_results tool instead of generating and running new SQL. The workspace holds the
+last few results of each session and is bounded in memory across sessions with LRU
+eviction; derived results are stored too, so refinements can be chained. Results that
+read a table are dropped when that table is written. Results the query guard cut to its
+row cap are marked partial and cannot be aggregated locally.
+"""
+import os
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Optional, Dict, Any, List, Sequence, Set, Tuple, Callable, Iterable
+
+from sql_cache import extract_tables
+
+AGGREGATES = ("count", "sum", "avg", "min", "max")
+OPERATORS = ("=", "!=", ">", ">=", "<", "<=", "in", "contains")
+
+
+class ResultSet:
+    """A result set stored column by column (ints and floats in typed arrays)."""
+
+    def __init__(
+        self,
+        result_id: str,
+        source: str,
+        rows: Sequence[Dict[str, Any]],
+        query_ms: float,
+        tables: Set[str],
+        columns: Optional[List[str]] = None,
+        truncated: bool = False,
+    ):
+        """
+        Args:
+            result_id: ID the LLM refers to the result by (r1, r2, ...)
+            source: SQL the rows came from, or the refinement that derived them
+            rows: Rows as dictionaries (all with the same keys)
+            query_ms: Time the database took to produce the rows
+            tables: Tables the rows were read from
+            columns: Column names (default: the keys of the first row)
+            truncated: Only the first rows of a longer result (cut by the query guard), or derived from such rows
+        """
+        self.result_id = result_id
+        self.source = source
+        self.query_ms = query_ms
+        self.tables = tables
+        self.truncated = truncated
+        self.columns: List[str] = list(columns) if columns is not None else (list(rows[0].keys()) if rows else [])
+        self.row_count = len(rows)
+        self.data: Dict[str, Sequence[Any]] = {name: _pack([row[name] for row in rows]) for name in self.columns}
+        self.size = sum(_size(values) for values in self.data.values()) + len(source)
+
+    def rows(self) -> List[Dict[str, Any]]:
+        return [dict(zip(self.columns, values)) for values in zip(*(self.data[name] for name in self.columns))]
+
+    def describe(self) -> str:
+        partial = " (partial: cut by the query guard, do not aggregate)" if self.truncated else ""
+        return f"{self.result_id}: {self.row_count} row(s){partial}, columns ({', '.join(self.columns)}) from: {self.source}"
+
+
+def _pack(values: List[Any]) -> Sequence[Any]:
+    """Typed array for int or float columns without NULLs, else a tuple."""
+    if values and all(type(value) is int for value in values):
+        try:
+            return array("q", values)
+        except OverflowError:
+            return tuple(values)
+    if values and all(type(value) is float for value in values):
+        return array("d", values)
+    return tuple(values)
+
+
+def _size(values: Sequence[Any]) -> int:
+    if isinstance(values, array):
+        return values.itemsize * len(values)
+    return sum(len(str(value)) + 8 for value in values) + 8 * len(values)
+
+
+def _comparable(value: Any) -> Any:
+    """Decimals and dates compare against the numbers and strings the LLM sends."""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _matches(value: Any, op: str, expected: Any) -> bool:
+    value = _comparable(value)
+    if op == "contains":
+        return value is not None and str(expected).lower() in str(value).lower()
+    if op == "in":
+        options = expected if isinstance(expected, (list, tuple)) else [expected]
+        return any(_equal(value, option) for option in options)
+    if op in ("=", "!="):
+        return _equal(value, expected) == (op == "=")
+    if value is None or expected is None:
+        return False
+    try:
+        if isinstance(value, (int, float)):
+            expected = float(expected)
+        else:
+            value, expected = str(value), str(expected)
+        return {">": value > expected, ">=": value >= expected, "<": value < expected, "<=": value <= expected}[op]
+    except (TypeError, ValueError):
+        return False
+
+
+def _equal(value: Any, expected: Any) -> bool:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        try:
+            return float(value) == float(expected)
+        except (TypeError, ValueError):
+            return False
+    if isinstance(value, str) and isinstance(expected, str):
+        return value.lower() == expected.lower()
+    return value == expected
+
+
+def _sort_key(value: Any) -> Tuple[int, Any]:
+    # NULLs last, numbers before strings
+    value = _comparable(value)
+    if value is None:
+        return (2, 0)
+    if isinstance(value, (int, float)):
+        return (0, value)
+    return (1, str(value))
+
+
+class ResultWorkspace:
+    """Last result sets of each session, bounded in memory with LRU eviction."""
+
+    def __init__(self, session_key: Callable[[], Optional[str]], max_results: int = 5, max_bytes: int = 8 * 1024 * 1024):
+        """
+        Args:
+            session_key: Returns the current session (e.g. the agent's current user ID)
+            max_results: Result sets kept per session (the oldest is dropped first)
+            max_bytes: Approximate memory bound of all sessions together
+        """
+        self.session_key = session_key
+        self.max_results = max_results
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._results: "OrderedDict[Tuple[str, str], ResultSet]" = OrderedDict()
+        self._next_id: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.counters = {
+            "stored": 0, "evictions": 0, "invalidations": 0, "local_queries": 0,
+            "local_ms": 0.0, "saved_ms": 0.0, "followups": 0, "followups_local": 0,
+        }
+
+    @classmethod
+    def from_env(cls, session_key: Callable[[], Optional[str]]) -> "ResultWorkspace":
+        """Build a workspace from RESULT_WORKSPACE_* environment variables."""
+        return cls(
+            session_key,
+            max_results=int(os.getenv("RESULT_WORKSPACE_MAX_RESULTS", "5")),
+            max_bytes=int(os.getenv("RESULT_WORKSPACE_MAX_BYTES", str(8 * 1024 * 1024))),
+        )
+
+    def _session(self) -> str:
+        return str(self.session_key() or "")
+
+    def add(
+        self,
+        source: str,
+        rows: Sequence[Dict[str, Any]],
+        query_ms: float,
+        tables: Optional[Set[str]] = None,
+        columns: Optional[List[str]] = None,
+        truncated: bool = False,
+    ) -> Optional[ResultSet]:
+        """
+        Store a result set of the current session.
+
+        Args:
+            source: SQL (or refinement) the rows came from
+            rows: Rows as dictionaries
+            query_ms: Time it took to produce the rows, counted as saved by each local follow-up
+            tables: Tables read (default: parsed from the SQL)
+            columns: Column names (default: the keys of the first row)
+            truncated: The rows are only the first ones of a longer result
+
+        Returns:
+            Optional[ResultSet]: The stored result, or None when it does not fit in memory
+        """
+        session = self._session()
+        with self._lock:
+            number = self._next_id.get(session, 0) + 1
+            self._next_id[session] = number
+        tables = extract_tables(source) if tables is None else tables
+        result = ResultSet(f"r{number}", source, rows, query_ms, tables, columns, truncated)
+        if result.size > self.max_bytes:
+            return None
+        with self._lock:
+            self._results[(session, result.result_id)] = result
+            self.bytes += result.size
+            self.counters["stored"] += 1
+            own = [key for key in self._results if key[0] == session]
+            for key in own[:-self.max_results] if self.max_results > 0 else own:
+                self._remove(key)
+            while self._results and self.bytes > self.max_bytes:
+                self._remove(next(iter(self._results)))
+                self.counters["evictions"] += 1
+        return result
+
+    def get(self, result_id: Optional[str] = None) -> Optional[ResultSet]:
+        """A result of the current session by ID, or its latest one."""
+        session = self._session()
+        with self._lock:
+            if result_id:
+                key = (session, result_id.strip().lower())
+                result = self._results.get(key)
+            else:
+                key = next((key for key in reversed(self._results) if key[0] == session), None)
+                result = self._results.get(key) if key else None
+            if result is not None:
+                self._results.move_to_end(key)
+            return result
+
+    def list(self) -> List[ResultSet]:
+        """Results of the current session, oldest first."""
+        session = self._session()
+        with self._lock:
+            results = [result for (owner, _), result in self._results.items() if owner == session]
+        return sorted(results, key=lambda result: int(result.result_id[1:]))
+
+    def describe(self) -> str:
+        """Prompt text listing the current session's results (empty when there are none)."""
+        results = self.list()
+        if not results:
+            return ""
+        lines = [
+            "Results of the previous questions of this session, kept in memory. For follow-ups that only "
+            "filter, sort, select columns of or aggregate one of them, use the query_results tool instead of new SQL:"
+        ]
+        lines += [f"- {result.describe()}" for result in results]
+        return "\n".join(lines)
+
+    def query(
+        self,
+        result_id: Optional[str] = None,
+        filters: Optional[Iterable[Dict[str, Any]]] = None,
+        columns: Optional[List[str]] = None,
+        group_by: Optional[List[str]] = None,
+        aggregates: Optional[Iterable[Dict[str, Any]]] = None,
+        order_by: Optional[Iterable[Dict[str, Any]]] = None,
+        limit: Optional[int] = None,
+    ) -> ResultSet:
+        """
+        Filter, aggregate, sort and project a stored result, and store the outcome as a new result.
+
+        Args:
+            result_id: Result to refine (default: the latest one)
+            filters: {'column', 'op' (one of OPERATORS), 'value'} conditions, all of which must hold
+            columns: Columns to keep (default: all; ignored with group_by/aggregates)
+            group_by: Columns to group on
+            aggregates: {'function' (one of AGGREGATES), 'column' ('*' for count)} per output column
+            order_by: {'column', 'descending'} sort keys
+            limit: Maximum number of rows kept
+
+        Returns:
+            ResultSet: The derived result
+
+        Raises:
+            ValueError: Unknown result, column, operator or aggregate function, or an
+                aggregate of a partial result
+        """
+        start = time.perf_counter()
+        source = self.get(result_id)
+        if source is None:
+            raise ValueError(f"No stored result '{result_id}'." if result_id else "No stored result in this session.")
+        if source.truncated and (group_by or aggregates):
+            raise ValueError(
+                f"{source.result_id} only holds the first {source.row_count} rows of a longer result (cut by the "
+                "query guard), so counts and totals of it would be wrong. Compute them in SQL (COUNT/SUM with GROUP BY)."
+            )
+
+        def column(name: str) -> str:
+            for candidate in source.columns:
+                if candidate.lower() == str(name).lower():
+                    return candidate
+            raise ValueError(f"Unknown column '{name}' in {source.result_id}. Columns: {', '.join(source.columns)}")
+
+        steps = []
+        rows = source.rows()
+        output_columns = list(source.columns)
+        for condition in filters or []:
+            name, op = column(condition["column"]), str(condition.get("op", "=")).lower()
+            if op not in OPERATORS:
+                raise ValueError(f"Unknown operator '{op}'. Use one of: {', '.join(OPERATORS)}")
+            rows = [row for row in rows if _matches(row[name], op, condition.get("value"))]
+            steps.append(f"where {name} {op} {condition.get('value')!r}")
+
+        if group_by or aggregates:
+            keys = [column(name) for name in group_by or []]
+            specs = []
+            for spec in aggregates or [{"function": "count", "column": "*"}]:
+                function = str(spec.get("function", "count")).lower()
+                if function not in AGGREGATES:
+                    raise ValueError(f"Unknown aggregate '{function}'. Use one of: {', '.join(AGGREGATES)}")
+                target = spec.get("column") or "*"
+                target = "*" if target == "*" else column(target)
+                specs.append((function, target, f"{function}_{'rows' if target == '*' else target}"))
+            groups: "OrderedDict[Tuple[Any, ...], List[Dict[str, Any]]]" = OrderedDict()
+            for row in rows:
+                groups.setdefault(tuple(row[name] for name in keys), []).append(row)
+            if not keys and not groups:
+                groups[()] = []
+            rows = []
+            for group_key, members in groups.items():
+                out = dict(zip(keys, group_key))
+                for function, target, label in specs:
+                    if target == "*":
+                        values = members
+                    else:
+                        values = [_comparable(row[target]) for row in members if row[target] is not None]
+                    if function == "count":
+                        out[label] = len(values)
+                    elif not values:
+                        out[label] = None
+                    elif function == "sum":
+                        out[label] = sum(values)
+                    elif function == "avg":
+                        out[label] = sum(values) / len(values)
+                    else:
+                        out[label] = (min if function == "min" else max)(values)
+                rows.append(out)
+            output_columns = keys + [label for _, _, label in specs]
+            steps.append(
+                (f"group by {', '.join(keys)} " if keys else "")
+                + "aggregate " + ", ".join(label for _, _, label in specs)
+            )
+        elif columns:
+            kept = [column(name) for name in columns]
+            rows = [{name: row[name] for name in kept} for row in rows]
+            output_columns = kept
+            steps.append(f"select {', '.join(kept)}")
+
+        for key in reversed(list(order_by or [])):
+            name = next((candidate for candidate in output_columns if candidate.lower() == str(key["column"]).lower()), None)
+            if name is None:
+                raise ValueError(f"Unknown sort column '{key['column']}'. Columns: {', '.join(output_columns)}")
+            rows.sort(key=lambda row: _sort_key(row.get(name)), reverse=bool(key.get("descending")))
+        if order_by:
+            steps.append("order by " + ", ".join(
+                f"{key['column']}{' desc' if key.get('descending') else ''}" for key in order_by
+            ))
+        if limit is not None:
+            rows = rows[:max(0, int(limit))]
+            steps.append(f"limit {limit}")
+
+        derived = f"{source.result_id} | " + (" | ".join(steps) or "all rows")
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        result = self.add(
+            derived, rows, source.query_ms, tables=source.tables, columns=output_columns, truncated=source.truncated,
+        )
+        with self._lock:
+            self.counters["local_queries"] += 1
+            self.counters["local_ms"] += elapsed_ms
+            self.counters["saved_ms"] += max(0.0, source.query_ms - elapsed_ms)
+        if result is None:
+            # Too large to keep: still answer
+            result = ResultSet("(not stored)", derived, rows, source.query_ms, source.tables, output_columns, source.truncated)
+        return result
+
+    def record_followup(self, served_locally: bool) -> None:
+        """Count a question asked while the session had stored results."""
+        with self._lock:
+            self.counters["followups"] += 1
+            self.counters["followups_local"] += served_locally
+
+    def invalidate_tables(self, tables: Iterable[str]) -> int:
+        """Drop the results (of every session) read from any of the given tables."""
+        tables = {table.lower() for table in tables}
+        with self._lock:
+            stale = [key for key, result in self._results.items() if result.tables & tables]
+            for key in stale:
+                self._remove(key)
+            self.counters["invalidations"] += len(stale)
+        return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._results.clear()
+            self.bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.counters)
+            stats["results"] = len(self._results)
+            stats["bytes"] = self.bytes
+            stats["max_bytes"] = self.max_bytes
+        stats["local_share"] = stats["followups_local"] / stats["followups"] if stats["followups"] else 0.0
+        return stats
+
+    def _remove(self, key: Tuple[str, str]) -> None:
+        result = self._results.pop(key, None)
+        if result is not None:
+            self.bytes -= result.size
+
+
+def format_result(result: ResultSet, max_rows: int = 50) -> str:
+    """Result as a small pipe-separated table for the LLM, with its ID for further refinement."""
+    lines = [f"Result {result.result_id}: {result.row_count} row(s)"
+             + (" (partial: from a result cut by the query guard)" if result.truncated else "")]
+    if result.columns:
+        lines.append(" | ".join(result.columns))
+        for row in result.rows()[:max_rows]:
+            lines.append(" | ".join("" if row[name] is None else str(_comparable(row[name])) for name in result.columns))
+    if result.row_count > max_rows:
+        lines.append(f"... {result.row_count - max_rows} more row(s)")
+    return "\n".join(lines)
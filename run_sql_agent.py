@@ -1,69 +1,631 @@
 import os
+import re
+import sys
+import argparse
+import functools
 import json
-from typing import Optional, Type, Dict, Any, List, TypedDict
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, Type, Dict, Any, List, Tuple, TypedDict, Iterator
 from datetime import datetime, timedelta
 from pathlib import Path
+
+from startup_profile import PROFILER
+
+# Must run before the heavy imports below so their cost shows up in the profile
+if "--profile-startup" in sys.argv:
+    PROFILER.enable()
+
 import os
 import json
-import requests
 from dotenv import load_dotenv
 
 from typing import Optional, Type
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_community.agent_toolkits import create_sql_agent
-from langchain_community.utilities import SQLDatabase
 from langchain_core.tools import BaseTool, StructuredTool, tool
 from pydantic import BaseModel, Field, HttpUrl
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 
+from aggregate_reports import ROLLUP_DIMENSIONS, build_aggregate_query, parse_group_by
+from answer_cache import AnswerCache
+from db_pool import create_pooled_engine, pool_stats
+from hour_rollups import DAILY_TABLE, MONTHLY_TABLE, HourRollups, RollupRefresher
+from intent_router import IntentRouter
+from leave_planner import WeatherLeavePlanner
+from leave_requests import create_leave_requests
+from llm_scheduler import SCHEDULER, LLMRateLimited, ScheduledChatModel
+from org_hierarchy import OrgHierarchy, answer as org_answer
+from output_compactor import ToolOutputCompactor
+from query_guard import QueryGuard, install_statement_timeout, statement_deadline
+from query_log import QueryLog, format_top
 from report_utils import ActivityReportGenerator
+from result_workspace import AGGREGATES, OPERATORS, ResultWorkspace, format_result
+from schema_index import SchemaIndex, estimate_tokens
+from schema_snapshot import compute_schema_checksum, create_sql_database
+from single_shot import MODES, ModeLatencyStats, SingleShotSQLEngine
+from sql_cache import SQLResultCache, extract_tables, is_write
+from sql_examples import SQLExampleStore, format_examples
+from streaming import StreamPrinter, stream_run
+from timesheet_compliance import TimesheetCompliance, answer as compliance_answer
+from tracing import TRACER, format_summary, summarize
+from weather_client import WeatherClient
 
 # Load environment variables from .env file
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Per-request user override, so one agent instance can serve many users concurrently
+_UNSET = object()
+_CURRENT_USER_ID: ContextVar = ContextVar("current_user_id", default=_UNSET)
+
 class ActivityReportAgent:
     """Enhanced SQL agent with activity report generation and weather integration."""
     
-    def __init__(self, user_id: Optional[str] = None):
+    def __init__(
+        self,
+        user_id: Optional[str] = None,
+        schema_snapshot_path: Optional[str] = None,
+        prewarm: bool = False,
+        llm: Optional[Any] = None,
+    ):
         """
         Initialize the agent with an optional user ID.
+
+        The LLM client, the reflected SQLDatabase and the tool-calling agent are built
+        lazily on first use (or in a background thread when prewarm is set).
         
         Args:
             user_id: Optional user ID to filter activities. If None, shows all users.
+            schema_snapshot_path: Optional on-disk schema snapshot used instead of live reflection
+                (defaults to the SCHEMA_SNAPSHOT_PATH environment variable)
+            prewarm: Build the LLM client and the agent in a background thread right away
+            llm: Optional chat model to use instead of Gemini (e.g. a stub for local testing)
         """
         self.user_id = user_id
-        self.llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0)
-        self.db_engine = self._create_db_engine()
-        self.db = SQLDatabase(engine=self.db_engine)
-        self.agent = self._create_sql_agent()
+        self.schema_snapshot_path = schema_snapshot_path or os.getenv("SCHEMA_SNAPSHOT_PATH") or None
+        with PROFILER.phase("create engine"):
+            # Primary engine for writes; the SQL agent tools and reports read through read_engine
+            self.db_engine = self._create_db_engine()
+            self.read_engine = self._create_db_engine(read_only=True)
+        # Timing of every executed statement by fingerprint, input of index_advisor.py (disable with QUERY_LOG=0)
+        self.query_log = QueryLog.from_env() if os.getenv("QUERY_LOG", "1") != "0" else None
+        if self.query_log:
+            self.query_log.install(self.db_engine)
+            self.query_log.install(self.read_engine)
+        # Per-request spans of LLM, SQL, tool and HTTP time (TRACING, TRACE_PATH; see tracing.py)
+        self.tracer = TRACER.configure_from_env()
+        self.tracer.install(self.db_engine)
+        self.tracer.install(self.read_engine)
+        # EXPLAIN-based cost checks of reads (disable with QUERY_GUARD=0)
+        self.query_guard = QueryGuard.from_env(self.read_engine) if os.getenv("QUERY_GUARD", "1") != "0" else None
+        # One result cache shared by execute_query and the SQL agent tools
+        self.sql_cache = SQLResultCache(
+            max_bytes=int(os.getenv("SQL_CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+            ttl_seconds=float(os.getenv("SQL_CACHE_TTL_SECONDS", "60")),
+        )
+        # Last result sets of each user's session, refined locally by the query_results tool (disable with RESULT_WORKSPACE=0)
+        self.result_workspace = (
+            ResultWorkspace.from_env(lambda: self.user_id) if os.getenv("RESULT_WORKSPACE", "1") != "0" else None
+        )
+        # Summaries instead of tool output over the token budget fed back to the LLM (TOOL_OUTPUT_MAX_TOKENS=0 disables)
+        self.output_compactor = ToolOutputCompactor.from_env()
+        # Reporting hierarchy index, built on first use and refreshed when employees change
+        self.org_hierarchy = OrgHierarchy(
+            self.read_engine, refresh_seconds=float(os.getenv("ORG_HIERARCHY_REFRESH_SECONDS", "30")),
+        )
+        # Employee x working-day submission matrix behind "who hasn't submitted" questions
+        self.timesheet_compliance = TimesheetCompliance(
+            self.read_engine, self.org_hierarchy,
+            ttl_seconds=float(os.getenv("TIMESHEET_COMPLIANCE_TTL_SECONDS", "300")),
+        )
         self.report_generator = ActivityReportGenerator()
+        # Pooled, cached and coalescing OpenWeatherMap client shared by the weather tools
+        self.weather = WeatherClient.from_env()
+        self.answer_cache = AnswerCache.from_env()
+        # Rate limit, concurrency, priority lanes, single-flight and retries of LLM calls (disable with LLM_SCHEDULER=0)
+        self.llm_scheduler = SCHEDULER if os.getenv("LLM_SCHEDULER", "1") != "0" else None
+        # Size of the aggregated reports vs. the detail rows they summarize
+        self.aggregate_report_stats = {"reports": 0, "summary_rows": 0, "detail_rows": 0, "bytes": 0}
+        self.rollups = HourRollups(self.db_engine)
+        # Keeps the rollups fresh in a background thread once the tables exist (not on the request path)
+        self.rollup_refresher = RollupRefresher(
+            self.rollups,
+            interval_seconds=float(os.getenv("ROLLUP_REFRESH_SECONDS", "60")),
+            on_refresh=self._rollups_refreshed,
+        )
+        # Deterministic fast path for common questions (disable with INTENT_ROUTER=0)
+        self.intent_router = (
+            IntentRouter(resolve_employee=self.org_hierarchy.resolve) if os.getenv("INTENT_ROUTER", "1") != "0" else None
+        )
+        # Inject only the relevant tables' schema into the agent prompt (disable with SCHEMA_PRUNING=0)
+        self.schema_pruning = os.getenv("SCHEMA_PRUNING", "1") != "0"
+        # Verified question/SQL pairs shown as few-shot examples (SQL_EXAMPLES_K=0 disables)
+        self.sql_examples = SQLExampleStore.from_env()
+        self.sql_examples_k = int(os.getenv("SQL_EXAMPLES_K", "3"))
+        # Last agent run (question, final SQL) per user, stored as an example when the user accepts the answer
+        self._last_runs: Dict[Optional[str], Dict[str, str]] = {}
+        # Answering mode used when ask() is not given one, and latency per mode actually used
+        self.default_mode = os.getenv("SQL_MODE", "agent")
+        self.single_shot = SingleShotSQLEngine(
+            self,
+            max_llm_calls=int(os.getenv("SINGLE_SHOT_MAX_LLM_CALLS", "2")),
+            max_seconds=float(os.getenv("SINGLE_SHOT_MAX_SECONDS", "20")),
+        )
+        # Wall-clock budget of one answer: the single-shot attempt, then the agent run and its SQL (0: no cap)
+        self.max_seconds = float(os.getenv("AGENT_MAX_SECONDS", "60"))
+        self.mode_latency = ModeLatencyStats()
+        # Time to first output and total latency of streamed answers
+        self.stream_latency = ModeLatencyStats()
+        self.agent_stats = {
+            "questions": 0, "pruned": 0, "tables_sent": 0, "schema_tokens_sent": 0,
+            "agent_steps": 0, "schema_lookups": 0, "llm_calls": 0, "examples_used": 0,
+        }
+
+        self._build_lock = threading.RLock()
+        self._llm = llm
+        self._db = None
+        self._agent = None
+        self._tools = None
+        self._schema_index = None
+        self._schema_version = None
+        self._prewarm_thread = None
+        if prewarm:
+            self.prewarm()
+
+    @property
+    def user_id(self) -> Optional[str]:
+        """User the current request runs as (see user_context), else the instance default."""
+        user_id = _CURRENT_USER_ID.get()
+        return self._default_user_id if user_id is _UNSET else user_id
+
+    @user_id.setter
+    def user_id(self, value: Optional[str]) -> None:
+        self._default_user_id = value
+
+    @contextmanager
+    def user_context(self, user_id: Optional[str]):
+        """Run the enclosed calls as the given user without touching the instance default."""
+        token = _CURRENT_USER_ID.set(user_id)
+        try:
+            yield self
+        finally:
+            _CURRENT_USER_ID.reset(token)
+
+    @property
+    def llm(self):
+        """Gemini chat model behind the LLM scheduler, created on first use."""
+        with self._build_lock:
+            if self._llm is None:
+                self._llm = self._create_llm()
+            if self.llm_scheduler and not isinstance(self._llm, ScheduledChatModel):
+                self._llm = ScheduledChatModel(inner=self._llm, scheduler=self.llm_scheduler)
+            return self._llm
+
+    @property
+    def db(self):
+        """SQLDatabase used by the SQL agent tools, created on first use."""
+        with self._build_lock:
+            if self._db is None:
+                with PROFILER.phase("load schema" if self.schema_snapshot_path else "reflect schema"):
+                    self._db = create_sql_database(
+                        self.read_engine,
+                        self.schema_version,
+                        snapshot_path=self.schema_snapshot_path,
+                        result_cache=self.sql_cache,
+                        query_guard=self.query_guard,
+                        result_workspace=self.result_workspace,
+                        output_compactor=self.output_compactor,
+                    )
+            return self._db
+
+    @property
+    def agent(self):
+        """Tool-calling SQL agent, created on first use."""
+        with self._build_lock:
+            if self._agent is None:
+                self._agent = self._create_sql_agent()
+            return self._agent
+
+    @property
+    def tools(self) -> List[StructuredTool]:
+        """Custom tools, created on first use (they do not need the LLM)."""
+        with self._build_lock:
+            if self._tools is None:
+                self._tools = self._create_tools()
+            return self._tools
+
+    def get_tool(self, name: str) -> StructuredTool:
+        """Return a custom tool by name."""
+        for candidate in self.tools:
+            if candidate.name == name:
+                return candidate
+        raise KeyError(f"Unknown tool: {name}")
+
+    @property
+    def schema_version(self) -> str:
+        """Checksum of the database schema, computed once."""
+        with self._build_lock:
+            if self._schema_version is None:
+                with PROFILER.phase("schema checksum"):
+                    self._schema_version = compute_schema_checksum(self.read_engine)
+            return self._schema_version
+
+    def prewarm(self) -> threading.Thread:
+        """Build the LLM client, the schema (and its index) and the agent in a background thread."""
+        if self._prewarm_thread is None:
+            def build():
+                self.agent
+                if self.schema_pruning:
+                    self.schema_index
+
+            self._prewarm_thread = threading.Thread(target=build, name="prewarm", daemon=True)
+            self._prewarm_thread.start()
+        return self._prewarm_thread
+
+    def _create_llm(self):
+        """Create and return the Gemini chat model."""
+        with PROFILER.phase("create llm"):
+            # Imported lazily: langchain_google_genai alone takes over a second to import
+            from langchain_google_genai import ChatGoogleGenerativeAI
+            # One attempt per call when the scheduler retries (with backoff shared by every session)
+            return ChatGoogleGenerativeAI(
+                model="gemini-2.5-flash", temperature=0, **({"max_retries": 1} if self.llm_scheduler else {}),
+            )
     
-    def _create_db_engine(self):
-        """Create and return a database engine."""
-        db_user = os.getenv("DB_USER")
-        db_password = os.getenv("DB_PASSWORD")
-        db_host = os.getenv("DB_HOST")
-        db_name = os.getenv("DB_NAME")
-        
-        if not all([db_user, db_password, db_host, db_name]):
-            raise ValueError("Missing required database configuration in .env file")
-            
-        connection_string = f"mysql+pymysql://{db_user}:{db_password}@{db_host}/{db_name}"
-        return create_engine(connection_string)
+    def _create_db_engine(self, read_only: bool = False):
+        """
+        Create and return a pooled database engine (pool settings from DB_POOL_*).
+
+        Args:
+            read_only: Create the read engine instead of the primary one: the replica given by
+                DATABASE_READ_URL or DB_READ_HOST if any, else the primary database with its own
+                pool, with read-only sessions unless DB_READ_ONLY_SESSION=0
+        """
+        # A full SQLAlchemy URL (e.g. a local sqlite:///eis.db) takes precedence over the MySQL settings
+        database_url = (os.getenv("DATABASE_READ_URL") if read_only else None) or os.getenv("DATABASE_URL")
+        if not database_url:
+            db_user = os.getenv("DB_USER")
+            db_password = os.getenv("DB_PASSWORD")
+            db_host = (os.getenv("DB_READ_HOST") if read_only else None) or os.getenv("DB_HOST")
+            db_name = os.getenv("DB_NAME")
+
+            if not all([db_user, db_password, db_host, db_name]):
+                raise ValueError("Missing required database configuration in .env file")
+
+            database_url = f"mysql+pymysql://{db_user}:{db_password}@{db_host}/{db_name}"
+
+        engine = create_pooled_engine(database_url, read_only=read_only and os.getenv("DB_READ_ONLY_SESSION", "1") != "0")
+        # Server-side cap on every SELECT (MySQL MAX_EXECUTION_TIME)
+        install_statement_timeout(engine, int(os.getenv("QUERY_MAX_EXECUTION_MS", "15000")))
+        return engine
     
+    def _rollups_ready(self) -> bool:
+        """
+        Whether reports can read the hour rollup tables: they exist and their last background
+        refresh (every ROLLUP_REFRESH_SECONDS, default 60) succeeded.
+        """
+        return self.rollup_refresher.ready()
+
+    def _rollups_refreshed(self, result: Dict[str, Any]) -> None:
+        """Drop the cached reads of the rollup tables after a refresh that changed them."""
+        if result.get("daily_keys", 1):
+            self.sql_cache.invalidate_tables([DAILY_TABLE, MONTHLY_TABLE])
+
+    @property
+    def data_generation(self) -> int:
+        """Bumped on every write done by the agent so cached answers never outlive them (persisted with the cache)."""
+        return self.answer_cache.generation
+
+    def _cache_version(self) -> str:
+        """Version string mixed into answer cache keys (schema checksum + write generation)."""
+        return f"{self.schema_version}:{self.data_generation}"
+
+    def ask(self, question: str, mode: Optional[str] = None, callbacks: Optional[List[Any]] = None) -> str:
+        """
+        Answer a natural language question, serving repeated questions from the answer cache
+        and common questions (profile, leave balance, simple reports, current temperature)
+        directly from the matching tool without calling the LLM.
+
+        Args:
+            question: The user's question
+            mode: 'agent' (multi-step SQL agent) or 'single-shot' (one generated query, falling
+                back to the agent); defaults to the SQL_MODE environment variable
+            callbacks: LangChain callback handlers attached to the agent run and to routed
+                tool calls (see streaming.py)
+
+        Each call is traced as one request, with its LLM, tool, SQL and HTTP spans (see tracing.py).
+
+        Returns:
+            str: The agent's final answer
+        """
+        mode = mode or self.default_mode
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode '{mode}'. Use one of: {', '.join(MODES)}")
+
+        with self.tracer.request(question, user_id=self.user_id, mode=mode) as trace:
+            handler = self.tracer.callback_handler()
+            if handler is not None:
+                callbacks = list(callbacks or []) + [handler]
+            start = time.perf_counter()
+            # Only an answer produced by this call can be accepted afterwards
+            self._last_runs.pop(self.user_id, None)
+            version = self._cache_version()
+            cached = self.answer_cache.get(question, self.user_id, version)
+            if cached is not None:
+                self.mode_latency.record("cache", time.perf_counter() - start)
+                trace["answered_by"] = "cache"
+                return cached
+
+            reusable = True
+            # The single-shot attempt, the agent run and every statement share the answer's budget
+            deadline = time.monotonic() + self.max_seconds if self.max_seconds > 0 else None
+            route = self.intent_router.route(question) if self.intent_router else None
+            if route is not None:
+                with statement_deadline(deadline):
+                    answer = self.get_tool(route.tool).invoke(route.args, config={"callbacks": callbacks})
+                if self._is_error(answer):
+                    # The routed tool could not answer (unknown location...): let the agent handle the question
+                    route = None
+                else:
+                    self.intent_router.record_hit(route, time.perf_counter() - start)
+                    answered_by = "router"
+            if route is None:
+                answer = None
+                answered_by = mode
+                if mode == "single-shot":
+                    answer, sql = self.single_shot.answer(question, deadline=deadline)
+                    if sql:
+                        self._last_runs[self.user_id] = {"question": question, "sql": sql}
+                    else:
+                        answered_by = "single-shot → agent"
+                if answer is None:
+                    response = self.run_agent(question, callbacks=callbacks, deadline=deadline)
+                    answer = response['output']
+                    # Refinements of earlier results depend on the session, not only on the question
+                    steps = response.get("intermediate_steps", [])
+                    reusable = not any(action.tool == "query_results" for action, _ in steps)
+                    # A tool that failed along the way (weather API down...) makes the answer a one-off
+                    reusable = reusable and not any(self._is_error(observation) for _, observation in steps)
+                if self.intent_router:
+                    self.intent_router.record_miss(time.perf_counter() - start)
+            self.mode_latency.record(answered_by, time.perf_counter() - start)
+            trace["answered_by"] = answered_by
+
+            # Error messages and answers produced by a run that wrote to the database are not reusable
+            if reusable and not self._is_error(answer) and self._cache_version() == version:
+                self.answer_cache.put(question, self.user_id, version, answer)
+            return answer
+
+    def ask_stream(self, question: str, mode: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Answer a question like ask(), yielding the run's events as they happen: tool calls and
+        their SQL, answer tokens, and answers that were not streamed (cached, routed, single-shot
+        or a tool's report) in blocks of lines. See streaming.py for the event types.
+
+        Args:
+            question: The user's question
+            mode: 'agent' or 'single-shot', as for ask()
+
+        Returns:
+            Iterator[Dict[str, Any]]: Events, ending with 'done' (answer, ttft_ms, total_ms)
+        """
+        for event in stream_run(lambda callbacks: self.ask(question, mode=mode, callbacks=callbacks)):
+            if event["type"] == "done":
+                self.stream_latency.record("first output", event["ttft_ms"] / 1000)
+                self.stream_latency.record("total", event["total_ms"] / 1000)
+            yield event
+
+    def run_agent(
+        self, question: str, callbacks: Optional[List[Any]] = None, deadline: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """
+        Run the SQL agent on a question, with the schema of the relevant tables and the most
+        similar verified SQL examples in the prompt.
+
+        Args:
+            question: The user's question
+            callbacks: LangChain callback handlers receiving the run's LLM tokens and tool events
+            deadline: time.monotonic() by which the run stops, its SQL included (default: AGENT_MAX_SECONDS from now)
+
+        Returns:
+            Dict[str, Any]: The agent response ('output' and 'intermediate_steps')
+        """
+        relevant_schema = ""
+        tables: List[str] = []
+        if self.schema_pruning:
+            tables = self.schema_index.select_tables(question)
+            if tables:
+                relevant_schema = (
+                    "Schema and sample rows of the tables relevant to this question "
+                    "(use sql_db_schema only for other tables):\n\n" + self.schema_index.schema_prompt(tables)
+                )
+            else:
+                relevant_schema = "No table was preselected for this question: list the tables and check their schema first."
+
+        # Earlier result sets of this session, which follow-ups can refine with query_results
+        workspace = self.result_workspace.describe() if self.result_workspace else ""
+        if workspace:
+            relevant_schema = f"{relevant_schema}\n\n{workspace}".strip()
+
+        examples = (
+            self.sql_examples.search(question, self.sql_examples_k, user_id=self.user_id) if self.sql_examples_k else []
+        )
+        agent = self.agent
+        if deadline is None and self.max_seconds > 0:
+            deadline = time.monotonic() + self.max_seconds
+        if deadline is not None:
+            # Only what is left of the budget (e.g. after a single-shot attempt), on a copy of the shared executor
+            agent = agent.model_copy(update={"max_execution_time": max(deadline - time.monotonic(), 0.0)})
+        with statement_deadline(deadline):
+            response = agent.invoke({
+                "input": question,
+                "relevant_schema": relevant_schema,
+                "sql_examples": format_examples(examples),
+            }, config={"callbacks": callbacks})
+
+        steps = response.get("intermediate_steps", [])
+        if workspace:
+            used = {action.tool for action, _ in steps}
+            self.result_workspace.record_followup("query_results" in used and "sql_db_query" not in used)
+        final_sql = self._final_sql(steps)
+        if final_sql:
+            self._last_runs[self.user_id] = {"question": question, "sql": final_sql}
+        with self._build_lock:
+            stats = self.agent_stats
+            stats["questions"] += 1
+            stats["llm_calls"] += self._count_llm_calls(steps)
+            stats["examples_used"] += len(examples)
+            stats["pruned"] += bool(tables)
+            stats["tables_sent"] += len(tables)
+            stats["schema_tokens_sent"] += estimate_tokens(relevant_schema)
+            stats["agent_steps"] += len(steps)
+            stats["schema_lookups"] += sum(
+                1 for action, _ in steps if action.tool in ("sql_db_list_tables", "sql_db_schema")
+            )
+        return response
+
+    def _count_llm_calls(self, steps: List[Any]) -> int:
+        """LLM turns of an agent run: one per tool-calling message, plus the final answer unless a tool returned directly."""
+        messages = {id(action.message_log[0]) for action, _ in steps if getattr(action, "message_log", None)}
+        direct_tools = {tool.name for tool in self.tools if tool.return_direct}
+        ended_on_tool = bool(steps) and steps[-1][0].tool in direct_tools
+        return len(messages) + (0 if ended_on_tool else 1)
+
+    @staticmethod
+    def _is_error(output: Any) -> bool:
+        """Whether a tool output or an answer reports a failure (tool error, agent stopped by its limits)."""
+        return isinstance(output, str) and output.lstrip().startswith(("❌", "Agent stopped due to"))
+
+    @staticmethod
+    def _final_sql(steps: List[Any]) -> Optional[str]:
+        """The last successful sql_db_query statement of an agent run."""
+        for action, observation in reversed(steps):
+            if action.tool != "sql_db_query":
+                continue
+            if str(observation).startswith("Error"):
+                continue
+            tool_input = action.tool_input
+            return tool_input.get("query") if isinstance(tool_input, dict) else str(tool_input)
+        return None
+
+    def accept_answer(self, question: Optional[str] = None, shared: bool = False) -> Optional[Dict[str, str]]:
+        """
+        Store the SQL behind the current user's last agent answer as a verified example.
+
+        Args:
+            question: Optional question the acceptance refers to; it must match the last one
+            shared: Use it for every user right away (an operator accepting a reviewed answer);
+                otherwise it stays pending, used for this user only, until approved with
+                `python sql_examples.py approve`
+
+        Returns:
+            Optional[Dict[str, str]]: The stored pair, or None if there was nothing to store
+        """
+        last = self._last_runs.pop(self.user_id, None)
+        if not last or (question and AnswerCache.normalize_question(question) != AnswerCache.normalize_question(last["question"])):
+            return None
+        if not shared and not self.user_id:
+            # A pending pair is scoped to its user
+            return None
+        if not self.sql_examples.add(last["question"], last["sql"], user_id=None if shared else self.user_id):
+            return None
+        return last
+
+    @property
+    def schema_index(self) -> SchemaIndex:
+        """Index of tables, columns, synonyms and foreign keys (from the schema snapshot when there is one)."""
+        with self._build_lock:
+            if self._schema_index is None:
+                self._schema_index = getattr(self.db, "schema_index", None)
+            if self._schema_index is None:
+                with PROFILER.phase("index schema"):
+                    table_info = {table: self.db.get_table_info([table]) for table in self.db.get_usable_table_names()}
+                    self._schema_index = SchemaIndex.build(self.read_engine, table_info)
+            return self._schema_index
+
     def _create_sql_agent(self):
         """Create and return a SQL agent with custom tools and user context."""
+        from langchain_community.agent_toolkits import create_sql_agent
+        from langchain_community.agent_toolkits.sql.prompt import SQL_FUNCTIONS_SUFFIX, SQL_PREFIX
+        from langchain_core.messages import AIMessage
+        from langchain_core.prompts import (
+            ChatPromptTemplate, HumanMessagePromptTemplate, MessagesPlaceholder, SystemMessagePromptTemplate,
+        )
+
+        # The prompt points generated SQL at the rollups: keep them fresh from now on
+        self.rollup_refresher.start()
+
         # Add user context to the system message
         system_message = """You are a helpful assistant that helps with activity reports, user information, and weather-related queries.
         You have access to the current user's information and can use it to provide personalized responses.
         
         When asked about the user (e.g., 'who am I', 'what's my email'), use the get_user_information tool.
         For questions about activities or reports, use the report generation tools.
+        For totals and breakdowns of hours (per project, week, status, employee...), use generate_aggregated_report.
+        When writing SQL for total hours, prefer the pre-aggregated rollup tables (if they exist) over scanning activity_reports:
+        activity_hours_daily (employee_id, project_id, date, hours, entries) and
+        activity_hours_monthly (employee_id, project_id, month_start, hours, entries), where month_start is the first day of the month.
+        They have no status column: use activity_reports when filtering or grouping by status.
         For weather-related queries or to check if conditions warrant taking leave, use the check_weather_and_suggest_leave tool.
+        For follow-ups that refine an earlier result of this session (filter, sort, group), use query_results instead of new SQL.
+        For managers, direct reports, everyone under someone, approval chains and team sizes, use org_hierarchy instead of SQL on employees.manager_id.
+        For who has not submitted their timesheet (on a day or over a range, for everyone or a manager's team), use timesheet_compliance instead of SQL.
         
         When suggesting leave based on weather, be considerate of the user's location and the specific conditions.
         """
         
+        # The schema of the relevant tables and similar SQL examples are filled in per question by run_agent
+        llm, db, tools = self.llm, self.db, self.tools
+        prefix = SQL_PREFIX.format(dialect=db.dialect, top_k=10) + "\n" + system_message
+        if self.schema_pruning:
+            suffix = "I should use the schema of the relevant tables given above, and only look up other tables if needed."
+        else:
+            suffix = SQL_FUNCTIONS_SUFFIX
+        prompt = ChatPromptTemplate.from_messages([
+            SystemMessagePromptTemplate.from_template(
+                prefix.replace("{", "{{").replace("}", "}}") + "\n{relevant_schema}\n\n{sql_examples}"
+            ),
+            HumanMessagePromptTemplate.from_template("{input}"),
+            AIMessage(content=suffix),
+            MessagesPlaceholder(variable_name="agent_scratchpad"),
+        ])
+
+        # Create the agent with custom tools and context
+        with PROFILER.phase("create agent"):
+            return create_sql_agent(
+                llm=llm,
+                db=db,
+                agent_type="openai-tools",
+                # Step-by-step text on stdout; tracing.py records the same steps as structured spans
+                verbose=os.getenv("AGENT_VERBOSE", "1") != "0",
+                extra_tools=[self._compacted(tool) for tool in tools],
+                prompt=prompt,
+                max_iterations=int(os.getenv("AGENT_MAX_ITERATIONS", "15")),
+                agent_executor_kwargs={"return_intermediate_steps": True},
+            )
+
+    def _compacted(self, tool: StructuredTool) -> StructuredTool:
+        """
+        Copy of a tool for the agent whose output is kept within the tool output budget.
+
+        Tools returning directly to the user are left as they are, and so are the originals
+        used by the intent router.
+        """
+        if tool.return_direct or tool.func is None:
+            return tool
+        func = tool.func
+
+        @functools.wraps(func)
+        def run(*args: Any, **kwargs: Any) -> Any:
+            return self.output_compactor.compact_text(func(*args, **kwargs), tool.name)
+
+        return tool.model_copy(update={"func": run})
+
+    def _create_tools(self) -> List[StructuredTool]:
+        """Create the custom tools (reports, user information, weather) used alongside the SQL toolkit."""
         # Define the report generation tool
         class ReportInput(BaseModel):
             start_date: Optional[str] = Field(
@@ -74,13 +636,40 @@ class ActivityReportAgent:
                 None,
                 description="End date in YYYY-MM-DD format (default: today)"
             )
+            page: Optional[int] = Field(
+                None,
+                description="1-based page number (default: 1)"
+            )
+            page_size: Optional[int] = Field(
+                None,
+                description="Entries per page (default: 50)"
+            )
+            cursor: Optional[str] = Field(
+                None,
+                description="Cursor returned by the previous page, to fetch the next one"
+            )
+            export_format: Optional[str] = Field(
+                None,
+                description="Set to 'csv' or 'jsonl' to export the whole range to a file instead of listing it"
+            )
         
         def generate_report_tool(
             start_date: Optional[str] = None,
-            end_date: Optional[str] = None
+            end_date: Optional[str] = None,
+            page: Optional[int] = None,
+            page_size: Optional[int] = None,
+            cursor: Optional[str] = None,
+            export_format: Optional[str] = None,
         ) -> str:
             """Generate an activity report for the specified date range."""
-            return self.generate_activity_report(start_date, end_date)
+            return self.generate_activity_report(
+                start_date,
+                end_date,
+                page=page,
+                page_size=page_size,
+                cursor=cursor,
+                export_format=export_format,
+            )
         
         # Create the report generation tool
         report_tool = StructuredTool.from_function(
@@ -90,11 +679,49 @@ class ActivityReportAgent:
             Generate a formatted activity report showing all activities within a date range.
             Use this when the user asks for a summary, overview, or report of activities.
             The input should be a dictionary with optional 'start_date' and 'end_date' in YYYY-MM-DD format.
+            Long reports are paginated: pass 'cursor' (from the previous page) or 'page' to get more entries.
+            Use 'export_format' ('csv' or 'jsonl') when the user wants the full data as a file.
             """,
             args_schema=ReportInput,
             return_direct=True
         )
         
+        # Aggregated (server-side) report tool
+        class AggregatedReportInput(BaseModel):
+            start_date: Optional[str] = Field(
+                None,
+                description="Start date in YYYY-MM-DD format (default: 30 days ago)"
+            )
+            end_date: Optional[str] = Field(
+                None,
+                description="End date in YYYY-MM-DD format (default: today)"
+            )
+            group_by: Optional[List[str]] = Field(
+                None,
+                description="Up to 3 of: project, department, employee, status, week, month (default: ['project'])"
+            )
+
+        def generate_aggregated_report_tool(
+            start_date: Optional[str] = None,
+            end_date: Optional[str] = None,
+            group_by: Optional[List[str]] = None,
+        ) -> str:
+            """Generate an aggregated hours report for the specified date range."""
+            return self.generate_aggregated_report(start_date, end_date, group_by)
+
+        aggregated_report_tool = StructuredTool.from_function(
+            func=generate_aggregated_report_tool,
+            name="generate_aggregated_report",
+            description="""
+            Summarize logged hours and entry counts per project, department, employee, status, week or month
+            (with subtotals and a grand total) for a date range, computed in the database.
+            Use this for totals, breakdowns and summary questions instead of listing individual entries,
+            e.g. 'hours per project in July 2025' or 'hours by week and status'.
+            """,
+            args_schema=AggregatedReportInput,
+            return_direct=True
+        )
+        
         # Create a tool to get current user information
         def get_user_information(query: str = None) -> str:
             """
@@ -109,13 +736,13 @@ class ActivityReportAgent:
                 
             try:
                 # Query to get user details from the database
-                user_query = f"""
+                user_query = """
                 SELECT * 
                 FROM employees
-                WHERE employee_id = '{self.user_id}'
+                WHERE employee_id = :user_id
                 """
                 
-                user_data = self.execute_query(user_query)
+                user_data = self.execute_query(user_query, {"user_id": self.user_id})
                 
                 if not user_data:
                     return f"No user found with ID: {self.user_id}"
@@ -335,19 +962,144 @@ class ActivityReportAgent:
             return_direct=True,
         )
 
-        # Create the agent with custom tools and context
-        return create_sql_agent(
-            llm=self.llm,
-            db=self.db,
-            agent_type="openai-tools",
-            verbose=True,
-            extra_tools=[report_tool, user_info_tool, temperature_tool, weather_plan_tool, weather_create_tool],
-            agent_kwargs={
-                'system_message': system_message
-            }
+        # Reporting hierarchy lookups from the in-memory index
+        class OrgHierarchyInput(BaseModel):
+            relation: str = Field(
+                ...,
+                description="'manager', 'direct_reports', 'all_reports' (everyone under), 'chain' (managers up to the top, "
+                "i.e. the approval chain) or 'team_sizes'"
+            )
+            employee: Optional[str] = Field(None, description="Employee ID or name (default: the current user)")
+            max_depth: Optional[int] = Field(None, description="Levels below the employee listed by 'all_reports'")
+
+        def org_hierarchy(relation: str, employee: Optional[str] = None, max_depth: Optional[int] = None) -> str:
+            employee = employee or self.user_id
+            if not employee:
+                return "❌ No employee given and no user logged in."
+            return org_answer(self.org_hierarchy, relation, employee, max_depth)
+
+        org_tool = StructuredTool.from_function(
+            func=org_hierarchy,
+            name="org_hierarchy",
+            description="""
+            Answer reporting-line questions from an in-memory index of the employees hierarchy: the manager of an
+            employee, their direct reports, everyone under them, the chain of managers up to the top (approval chain
+            of their leave requests) and team sizes. Use this instead of recursive SQL on employees.manager_id.
+            """,
+            args_schema=OrgHierarchyInput,
         )
+
+        # Timesheet gaps from the cached employee x working-day matrix
+        class TimesheetComplianceInput(BaseModel):
+            start_date: Optional[str] = Field(None, description="First day in YYYY-MM-DD format (default: yesterday)")
+            end_date: Optional[str] = Field(None, description="Last day in YYYY-MM-DD format (default: start_date)")
+            manager: Optional[str] = Field(None, description="Only the people under this manager (ID or name), all levels")
+            employee: Optional[str] = Field(None, description="Only this employee (ID or name)")
+            limit: int = Field(20, description="Maximum number of employees and managers listed")
+
+        def timesheet_compliance(
+            start_date: Optional[str] = None,
+            end_date: Optional[str] = None,
+            manager: Optional[str] = None,
+            employee: Optional[str] = None,
+            limit: int = 20,
+        ) -> str:
+            try:
+                start = (
+                    datetime.strptime(start_date, "%Y-%m-%d").date() if start_date
+                    else datetime.now().date() - timedelta(days=1)
+                )
+                end = datetime.strptime(end_date, "%Y-%m-%d").date() if end_date else start
+            except ValueError:
+                return "❌ Invalid date format. Please use YYYY-MM-DD."
+            if end < start:
+                return "❌ end_date is before start_date."
+            try:
+                return compliance_answer(self.timesheet_compliance, start, end, manager=manager, employee=employee, limit=limit)
+            except ValueError as e:
+                return f"❌ {e}"
+
+        compliance_tool = StructuredTool.from_function(
+            func=timesheet_compliance,
+            name="timesheet_compliance",
+            description="""
+            Who has not submitted their timesheet over a day or a date range, with per-employee and per-manager gap
+            counts. Working days only; approved leave and presence On Leave/Absent are excused; a gap is missing
+            (no entry), still in Draft or Rejected. Use this instead of SQL for missing or late timesheets.
+            """,
+            args_schema=TimesheetComplianceInput,
+        )
+
+        tools = [
+            report_tool, aggregated_report_tool, user_info_tool, temperature_tool, weather_plan_tool, weather_create_tool,
+            org_tool, compliance_tool,
+        ]
+        if not self.result_workspace:
+            return tools
+
+        # Local refinement of the session's earlier result sets (no database round trip)
+        class ResultFilter(BaseModel):
+            column: str = Field(..., description="Column to test")
+            op: str = Field("=", description=f"One of: {', '.join(OPERATORS)}")
+            value: Any = Field(None, description="Value to compare with (a list for 'in')")
+
+        class ResultAggregate(BaseModel):
+            function: str = Field(..., description=f"One of: {', '.join(AGGREGATES)}")
+            column: str = Field("*", description="Column to aggregate ('*' to count rows)")
+
+        class ResultOrder(BaseModel):
+            column: str = Field(..., description="Column to sort on (an aggregate is named function_column, e.g. sum_hours)")
+            descending: bool = Field(False, description="Sort in descending order")
+
+        class QueryResultsInput(BaseModel):
+            result_id: Optional[str] = Field(None, description="ID of the stored result, e.g. 'r2' (default: the latest)")
+            filters: Optional[List[ResultFilter]] = Field(None, description="Conditions that must all hold")
+            columns: Optional[List[str]] = Field(None, description="Columns to keep (default: all)")
+            group_by: Optional[List[str]] = Field(None, description="Columns to group on")
+            aggregates: Optional[List[ResultAggregate]] = Field(None, description="Aggregates computed per group")
+            order_by: Optional[List[ResultOrder]] = Field(None, description="Sort keys, most significant first")
+            limit: Optional[int] = Field(None, description="Maximum number of rows")
+
+        def query_results(
+            result_id: Optional[str] = None,
+            filters: Optional[List[Any]] = None,
+            columns: Optional[List[str]] = None,
+            group_by: Optional[List[str]] = None,
+            aggregates: Optional[List[Any]] = None,
+            order_by: Optional[List[Any]] = None,
+            limit: Optional[int] = None,
+        ) -> str:
+            def plain(items: Optional[List[Any]]) -> Optional[List[Dict[str, Any]]]:
+                return [item.model_dump() if isinstance(item, BaseModel) else dict(item) for item in items] if items else None
+
+            try:
+                result = self.result_workspace.query(
+                    result_id=result_id,
+                    filters=plain(filters),
+                    columns=columns,
+                    group_by=group_by,
+                    aggregates=plain(aggregates),
+                    order_by=plain(order_by),
+                    limit=limit,
+                )
+            except ValueError as e:
+                return f"Error: {e}"
+            return format_result(result)
+
+        query_results_tool = StructuredTool.from_function(
+            func=query_results,
+            name="query_results",
+            description="""
+            Filter, sort, select columns of, group and aggregate a result set returned earlier in this session,
+            in memory without querying the database. Use this for follow-ups such as 'only the approved ones',
+            'sort by hours' or 'group that by project' when the listed earlier results contain the needed columns.
+            The output is a new result (with its own ID) that can be refined further.
+            """,
+            args_schema=QueryResultsInput,
+        )
+        return tools + [query_results_tool]
         
-    def _get_temperature(self, location: str) -> int:
+    def _get_temperature(self, location: str) -> float:
         """
         Get current temperature for a location using OpenWeatherMap API.
         
@@ -357,49 +1109,14 @@ class ActivityReportAgent:
         Returns:
             temperature: Temperature (in Celsius) for the given location
         """
-        api_key = os.getenv("OPENWEATHER_API_KEY")
-        if not api_key:
-            raise ValueError("OpenWeatherMap API key not found in environment variables")
-
-        # Make API request
-        url = f"http://api.openweathermap.org/data/2.5/weather?q={location}&appid={api_key}&units=metric"
-        response = requests.get(url)
-        data = response.json()
-
-        if response.status_code != 200:
-            raise Exception(f"Weather API error: {data.get('message', 'Unknown error')}")
-
-        temperature = data['main']['temp']
-        
-        return temperature
+        return self.weather.temperature(location)
 
     def _get_daily_max_forecast(self, location: str) -> Dict[str, float]:
         """
         Get daily maximum temperatures for the next ~5 days using the 3-hourly forecast API.
         Aggregates to a mapping of YYYY-MM-DD -> max_temp_c.
         """
-        api_key = os.getenv("OPENWEATHER_API_KEY")
-        if not api_key:
-            raise ValueError("OpenWeatherMap API key not found in environment variables")
-
-        url = f"http://api.openweathermap.org/data/2.5/forecast?q={location}&appid={api_key}&units=metric"
-        response = requests.get(url)
-        data = response.json()
-
-        if response.status_code != 200:
-            raise Exception(f"Weather forecast API error: {data.get('message', 'Unknown error')}")
-
-        daily_max: Dict[str, float] = {}
-        for entry in data.get('list', []):
-            # entry['dt_txt'] like '2025-08-08 12:00:00'
-            dt_txt = entry.get('dt_txt')
-            if not dt_txt:
-                continue
-            date_str = dt_txt.split(' ')[0]
-            temp = float(entry.get('main', {}).get('temp_max', entry.get('main', {}).get('temp', 0)))
-            if date_str not in daily_max or temp > daily_max[date_str]:
-                daily_max[date_str] = temp
-        return daily_max
+        return self.weather.daily_max(location)
 
     def _create_weather_leave_requests(self, user_id: str, days: List[datetime.date], manager_id: Optional[int] = None) -> int:
         """
@@ -407,81 +1124,188 @@ class ActivityReportAgent:
         If manager_id is not provided, fetch the user's manager from the employees table.
         Returns the number of created rows.
         """
-        # Resolve manager_id if needed
-        resolved_manager_id = manager_id
-        with self.db_engine.begin() as conn:
-            if resolved_manager_id is None:
-                manager_row = conn.execute(text("SELECT manager_id FROM employees WHERE employee_id = :eid"), {"eid": user_id}).fetchone()
-                resolved_manager_id = manager_row[0] if manager_row and manager_row[0] is not None else 51  # default to CEO if unknown
-
-            created = 0
-            for day in days:
-                params = {
-                    "employee_id": user_id,
-                    "manager_id": resolved_manager_id,
-                    "start_date": day.strftime("%Y-%m-%d"),
-                    "end_date": day.strftime("%Y-%m-%d"),
-                    "type": "Weather",
-                    "status": "Pending",
-                }
-                # Skip duplicates for same user/day/type
-                exists = conn.execute(
-                    text(
-                        """
-                        SELECT 1 FROM leave_requests
-                        WHERE employee_id = :employee_id
-                          AND start_date = :start_date
-                          AND end_date = :end_date
-                          AND type = :type
-                        LIMIT 1
-                        """
-                    ),
-                    params,
-                ).fetchone()
-                if exists:
-                    continue
-                conn.execute(
-                    text(
-                        """
-                        INSERT INTO leave_requests (employee_id, manager_id, start_date, end_date, type, status)
-                        VALUES (:employee_id, :manager_id, :start_date, :end_date, :type, :status)
-                        """
-                    ),
-                    params,
-                )
-                created += 1
-        return created
-
-    def execute_query(self, query: str) -> List[Dict[str, Any]]:
-        """Execute a raw SQL query and return results as dictionaries."""
-        with self.db_engine.connect() as connection:
-            result = connection.execute(text(query))
-            return [dict(row._mapping) for row in result]
-    
-    def generate_activity_report(self, start_date: Optional[str] = None, end_date: Optional[str] = None) -> str:
+        results = self._create_weather_leave_requests_bulk({user_id: days}, manager_id=manager_id)
+        return results[str(user_id)]["created"]
+
+    def _create_weather_leave_requests_bulk(
+        self,
+        plan: Dict[str, List[datetime.date]],
+        manager_id: Optional[int] = None,
+    ) -> Dict[str, Dict[str, int]]:
         """
-        Generate an activity report for the specified date range and user.
-        
+        Create one-day pending 'Weather' leave requests for many users in one transaction.
+
         Args:
-            start_date: Start date in YYYY-MM-DD format (default: 30 days ago)
-            end_date: End date in YYYY-MM-DD format (default: today)
-            
+            plan: Mapping of employee ID -> days to request
+            manager_id: Manager for every request. If None, each employee's manager is used.
+
         Returns:
-            str: Formatted activity report
-        
-        Example:
-            generate_activity_report("2023-01-01", "2023-01-31") -> "📊 Activity Report..."
+            Dict[str, Dict[str, int]]: Per-employee created/skipped counts
+        """
+        results = create_leave_requests(
+            self.db_engine, plan, manager_id=manager_id, manager_lookup=self.org_hierarchy.managers,
+        )
+        if any(counts["created"] for counts in results.values()):
+            self.sql_cache.invalidate_tables(["leave_requests"])
+            if self.result_workspace:
+                self.result_workspace.invalidate_tables(["leave_requests"])
+            self.answer_cache.bump_generation()
+        return results
+
+    def plan_weather_leave_batch(
+        self,
+        assignments: Dict[str, str],
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        threshold_celsius: float = 35.0,
+        create: bool = False,
+        manager_id: Optional[int] = None,
+        max_workers: int = 8,
+    ) -> Dict[str, Any]:
+        """
+        Plan weather-based leave for many employees and locations at once (see leave_planner.py).
+
+        Each distinct location's forecast is fetched once, concurrently, and all leave
+        requests are written in a single transaction.
+
+        Args:
+            assignments: Employee ID -> location ('City,CountryCode')
+            start_date: First day considered, YYYY-MM-DD (default: today)
+            end_date: Last day considered, YYYY-MM-DD (default: 5 days from today)
+            threshold_celsius: Daily maximum temperature at or above which a day qualifies
+            create: Create pending one-day leave requests for the qualifying days
+            manager_id: Manager for every request. If None, each employee's manager is used.
+            max_workers: Forecasts fetched concurrently
+
+        Returns:
+            Dict[str, Any]: Per-employee and per-location results with per-phase timings
+        """
+        planner = WeatherLeavePlanner(self.weather, self._create_weather_leave_requests_bulk, max_workers=max_workers)
+        return planner.plan(
+            {str(employee_id): location for employee_id, location in assignments.items()},
+            start_date=start_date,
+            end_date=end_date,
+            threshold_celsius=threshold_celsius,
+            create=create,
+            manager_id=manager_id,
+        )
+
+    def execute_query(self, query: str, params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Execute a raw SQL query and return results as dictionaries.
+
+        Deterministic reads are served from the shared SQL result cache; writes
+        invalidate the cached entries of the tables they touch. Reads run on the read
+        engine, writes on the primary. The statements of the agent's own tools are trusted:
+        generated SQL goes through execute_generated_query instead.
+        """
+        cacheable = self.sql_cache.is_cacheable(query)
+        if cacheable:
+            cached = self.sql_cache.get(query, params)
+            if cached is not None:
+                self.tracer.sql_result(cached, query, cached=True)
+                return [dict(row) for row in cached]
+
+        engine = self.db_engine if is_write(query) else self.read_engine
+        with engine.begin() as connection:
+            result = connection.execute(text(query), params or {})
+            rows = [dict(row._mapping) for row in result] if result.returns_rows else []
+        if rows:
+            self.tracer.sql_result(rows)
+
+        if cacheable:
+            self.sql_cache.put(query, params, rows)
+            return [dict(row) for row in rows]
+        if is_write(query):
+            self.sql_cache.invalidate_statement(query)
+            tables = extract_tables(query)
+            if self.result_workspace:
+                self.result_workspace.invalidate_tables(tables)
+            if "employees" in tables:
+                self.org_hierarchy.mark_stale()
+            if tables & {"activity_reports", "presence", "leave_requests"}:
+                self.timesheet_compliance.invalidate()
+            # Cached answers predating the write are no longer served
+            self.answer_cache.bump_generation()
+        return rows
+
+    def execute_generated_query(self, query: str, params: Optional[Dict[str, Any]] = None) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Execute a read generated by the LLM, checked by the query cost guard first.
+
+        Returns:
+            Tuple[List[Dict[str, Any]], bool]: The rows, and whether the guard cut them to its row cap
+
+        Raises:
+            QueryRefused: The guard refused the statement
+        """
+        if not self.query_guard:
+            return self.execute_query(query, params), False
+        cacheable = self.sql_cache.is_cacheable(query)
+        if cacheable:
+            cached = self.sql_cache.get(query, params, namespace="generated")
+            if cached is not None:
+                self.tracer.sql_result(cached[0], query, cached=True)
+                return [dict(row) for row in cached[0]], cached[1]
+
+        guarded = self.query_guard.check(query, params)
+        with self.read_engine.connect() as connection:
+            result = connection.execute(text(guarded.statement), params or {})
+            rows = [dict(row._mapping) for row in result] if result.returns_rows else []
+        rows, truncated = guarded.cap(rows)
+        if rows:
+            self.tracer.sql_result(rows)
+        if cacheable:
+            self.sql_cache.put(query, params, (rows, truncated), namespace="generated")
+        return [dict(row) for row in rows], truncated
+
+    def stream_query(
+        self,
+        query: str,
+        params: Optional[Dict[str, Any]] = None,
+        batch_size: int = 1000,
+    ) -> Iterator[Dict[str, Any]]:
         """
+        Execute a read query on a server-side cursor and yield rows as dictionaries.
+
+        Rows are fetched in batches of batch_size, so memory stays constant however
+        many rows match. Results bypass the SQL result cache.
         """
-        Generate an activity report for the specified date range.
+        with self.read_engine.connect() as connection:
+            result = connection.execution_options(stream_results=True, max_row_buffer=batch_size).execute(
+                text(query), params or {}
+            )
+            for row in result:
+                yield dict(row._mapping)
+
+    def generate_activity_report(
+        self,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        page: Optional[int] = None,
+        page_size: Optional[int] = None,
+        cursor: Optional[str] = None,
+        export_format: Optional[str] = None,
+    ) -> str:
+        """
+        Generate an activity report for the specified date range and user.
+
+        The report is paginated: the header carries the totals of the whole range (computed
+        in SQL) and only one page of entries is fetched, with a keyset cursor on
+        (date, report_id) for the next page. With export_format, every entry of the range is
+        streamed from a server-side cursor into a CSV or JSON Lines file instead.
         
         Args:
             start_date: Start date in YYYY-MM-DD format (default: 30 days ago)
             end_date: End date in YYYY-MM-DD format (default: today)
+            page: 1-based page number (ignored when a cursor is given)
+            page_size: Entries per page (default: REPORT_PAGE_SIZE or 50)
+            cursor: Cursor of the next page, as returned in the previous page
+            export_format: 'csv' or 'jsonl' to export the whole range to a file
             
         Returns:
             str: Formatted activity report
-            
+        
         Example:
             generate_activity_report("2023-01-01", "2023-01-31") -> "📊 Activity Report..."
         """
@@ -489,31 +1313,168 @@ class ActivityReportAgent:
         end_date = end_date or datetime.now().strftime("%Y-%m-%d")
         start_date = start_date or (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d")
         
-        # Build the query with optional user filter
-        query = f"""
-        SELECT report_id, date, hours, status, employee_id
-        FROM activity_reports
-        WHERE date BETWEEN '{start_date}' AND '{end_date}'
-        """
+        # Build the filter with optional user restriction
+        where = "WHERE date BETWEEN :start_date AND :end_date"
+        params: Dict[str, Any] = {"start_date": start_date, "end_date": end_date}
         
         # Add user filter if user_id is provided
-        if self.user_id:
-            query += f" AND employee_id = '{self.user_id}'"
-            
-        # Add sorting
-        query += " ORDER BY date DESC"
+        user_id = self.user_id
+        if user_id:
+            where += " AND employee_id = :user_id"
+            params["user_id"] = user_id
         
         try:
-            # Execute query and format results
-            results = self.execute_query(query)
-            formatted_data = self.report_generator.format_activity_data(results)
-            
+            if export_format:
+                return self._export_activity_report(where, params, start_date, end_date, export_format.lower())
+
+            page_size = max(1, min(int(page_size or os.getenv("REPORT_PAGE_SIZE", "50")), 1000))
+            page = max(1, int(page or 1))
+
+            summary = self.execute_query(
+                f"""
+                SELECT COUNT(*) AS entries, SUM(hours) AS hours, MIN(date) AS first_date, MAX(date) AS last_date
+                FROM activity_reports
+                {where}
+                """,
+                params,
+            )[0]
+
+            query = f"SELECT report_id, date, hours, status, employee_id FROM activity_reports {where}"
+            page_params = dict(params, limit=page_size + 1)
+            if cursor:
+                # Cursor format: <date>|<report_id>|<page number>
+                cursor_date, cursor_id, cursor_page = (cursor.split("|") + ["2"])[:3]
+                query += " AND (date < :cursor_date OR (date = :cursor_date AND report_id < :cursor_id))"
+                page_params.update(cursor_date=cursor_date, cursor_id=int(cursor_id))
+                page = int(cursor_page)
+            query += " ORDER BY date DESC, report_id DESC LIMIT :limit"
+            if page > 1 and not cursor:
+                query += " OFFSET :offset"
+                page_params["offset"] = (page - 1) * page_size
+
+            rows = self.execute_query(query, page_params)
+            next_cursor = None
+            if len(rows) > page_size:
+                rows = rows[:page_size]
+                last = self.report_generator.format_activity_row(rows[-1])
+                next_cursor = f"{last['date']}|{last['report_id']}|{page + 1}"
+
             # Generate and return formatted report
-            return self.report_generator.format_activity_report(formatted_data)
+            with self.tracer.span("format", "activity report page", rows=len(rows)):
+                return self.report_generator.format_activity_page(
+                    self.report_generator.iter_activity_data(rows),
+                    summary,
+                    page=page,
+                    page_size=page_size,
+                    next_cursor=next_cursor,
+                )
             
         except Exception as e:
             return f"❌ Error generating activity report: {str(e)}"
 
+    def generate_aggregated_report(
+        self,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        group_by: Optional[List[str]] = None,
+    ) -> str:
+        """
+        Generate a summary of hours per project/department/employee/status/week/month.
+
+        The aggregation (with subtotals from GROUP BY ... WITH ROLLUP) runs in the database,
+        so only the summary rows cross the network and reach the LLM.
+        
+        Args:
+            start_date: Start date in YYYY-MM-DD format (default: 30 days ago)
+            end_date: End date in YYYY-MM-DD format (default: today)
+            group_by: Up to 3 grouping dimensions, in rollup order (default: ['project'])
+            
+        Returns:
+            str: Formatted summary with row-count and byte-size metrics
+        
+        Example:
+            generate_aggregated_report("2025-07-01", "2025-07-31", ["project", "week"]) -> "📊 Aggregated..."
+        """
+        end_date = end_date or datetime.now().strftime("%Y-%m-%d")
+        start_date = start_date or (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d")
+
+        where = "WHERE ar.date BETWEEN :start_date AND :end_date"
+        params: Dict[str, Any] = {"start_date": start_date, "end_date": end_date}
+        user_id = self.user_id
+        if user_id:
+            where += " AND ar.employee_id = :user_id"
+            params["user_id"] = user_id
+
+        try:
+            dims = parse_group_by(group_by)
+            rows = None
+            if set(dims) <= ROLLUP_DIMENSIONS and self._rollups_ready():
+                source = DAILY_TABLE
+                query = build_aggregate_query(
+                    self.db_engine.dialect.name, dims, where, table=DAILY_TABLE, entries="SUM(ar.entries)"
+                )
+                try:
+                    rows = self.execute_query(query, params)
+                except Exception as e:
+                    # Rollups unreadable (dropped, locked by a rebuild...): fall back to the raw rows
+                    logger.warning("Reading %s failed, using activity_reports: %s", DAILY_TABLE, e)
+            if rows is None:
+                source = "activity_reports"
+                query = build_aggregate_query(self.db_engine.dialect.name, dims, where)
+                rows = self.execute_query(query, params)
+            with self.tracer.span("format", "aggregated report", rows=len(rows)):
+                report = self.report_generator.format_aggregated_report(rows, dims, start_date, end_date)
+            if not rows:
+                return report
+
+            detail_rows = int(rows[-1].get('entries') or 0)
+            size = len(report.encode("utf-8"))
+            self.aggregate_report_stats["reports"] += 1
+            self.aggregate_report_stats["summary_rows"] += len(rows)
+            self.aggregate_report_stats["detail_rows"] += detail_rows
+            self.aggregate_report_stats["bytes"] += size
+            return (
+                f"{report}\n"
+                f"📦 {len(rows)} summary row(s) for {detail_rows} activity entr{'y' if detail_rows == 1 else 'ies'}, "
+                f"{size} bytes (from {source})"
+            )
+
+        except Exception as e:
+            return f"❌ Error generating aggregated report: {str(e)}"
+
+    def _export_activity_report(
+        self,
+        where: str,
+        params: Dict[str, Any],
+        start_date: str,
+        end_date: str,
+        export_format: str,
+    ) -> str:
+        """Stream every matching entry into a file under REPORT_EXPORT_DIR."""
+        if export_format not in ("csv", "jsonl"):
+            return f"❌ Unsupported export format: {export_format}. Use 'csv' or 'jsonl'."
+
+        export_dir = Path(os.getenv("REPORT_EXPORT_DIR", "exports"))
+        export_dir.mkdir(parents=True, exist_ok=True)
+        suffix = f"_{self.user_id}" if self.user_id else ""
+        file_name = re.sub(r"[^A-Za-z0-9_.-]", "", f"activity_report_{start_date}_{end_date}{suffix}")
+        path = export_dir / f"{file_name}.{export_format}"
+
+        rows = self.stream_query(
+            f"SELECT report_id, date, hours, status, employee_id FROM activity_reports {where} "
+            "ORDER BY date DESC, report_id DESC",
+            params,
+        )
+        with self.tracer.span("format", f"{export_format} export") as span:
+            result = self.report_generator.export_activity_data(
+                self.report_generator.iter_activity_data(rows), str(path), export_format
+            )
+            span["rows"] = result["rows"]
+        return (
+            f"📁 Exported {result['rows']} activity entr{'y' if result['rows'] == 1 else 'ies'} "
+            f"({result['hours']:.1f} hours) from {start_date} to {end_date} to {path}"
+        )
+
 def get_user_id() -> Optional[str]:
     """Get the user ID from environment or prompt the user."""
     user_id = os.getenv("USER_ID")
@@ -523,7 +1484,48 @@ def get_user_id() -> Optional[str]:
             user_id = user_input
     return user_id or None
 
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description="Activity Report Agent (powered by Gemini)")
+    parser.add_argument(
+        "--schema-snapshot",
+        metavar="PATH",
+        default=os.getenv("SCHEMA_SNAPSHOT_PATH"),
+        help="Load the schema from this snapshot file instead of reflecting it (rebuilt when the schema changes)",
+    )
+    parser.add_argument(
+        "--no-prewarm",
+        action="store_true",
+        help="Build the LLM client and agent on the first question instead of in the background",
+    )
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="Report time-to-first-prompt and an import-time breakdown",
+    )
+    parser.add_argument(
+        "--no-stream",
+        action="store_true",
+        help="Print each answer once it is complete instead of streaming tool calls and tokens",
+    )
+    parser.add_argument(
+        "--mode",
+        choices=MODES,
+        default=os.getenv("SQL_MODE", "agent"),
+        help="Answer with the multi-step agent or with one generated query (falling back to the agent)",
+    )
+    parser.add_argument(
+        "--share-accepted",
+        action="store_true",
+        help="Operators only: 'accept' shares the SQL with every user right away instead of keeping it pending "
+             "for your user until approved with 'python sql_examples.py approve'",
+    )
+    return parser.parse_args(argv)
+
 if __name__ == "__main__":
+    PROFILER.mark("imports done")
+    args = parse_args()
+
     if not os.getenv("GOOGLE_API_KEY"):
         print("❌ GOOGLE_API_KEY not found. Please set it in your .env file.")
         exit(1)
@@ -531,7 +1533,13 @@ if __name__ == "__main__":
     try:
         # Get user ID from environment or prompt
         user_id = get_user_id()
-        agent = ActivityReportAgent(user_id=user_id)
+        PROFILER.mark("user id resolved")
+        agent = ActivityReportAgent(
+            user_id=user_id,
+            schema_snapshot_path=args.schema_snapshot,
+            prewarm=not args.no_prewarm,
+        )
+        agent.default_mode = args.mode
         
         # Show current user context
         if user_id:
@@ -539,20 +1547,197 @@ if __name__ == "__main__":
         else:
             print("ℹ️  No user ID provided. Showing all activities.")
         print("🤖 Activity Report Agent (powered by Gemini) is ready.")
-        print("Type 'exit' to quit.")
+        print("Type 'exit' to quit, 'stats' for cache statistics, 'trace' for the slowest questions and hottest spans, "
+              "'accept' to save the SQL behind a correct answer.")
+        print("Prefix a question with '/agent ' or '/single-shot ' to pick the answering mode for that question.")
+        PROFILER.mark("first prompt")
+        if args.profile_startup:
+            print(PROFILER.report())
         
         while True:
             try:
                 user_input = input("\nYou: ").strip().lower()
                 
                 if user_input == 'exit':
+                    if args.profile_startup:
+                        print(PROFILER.report())
                     print("👋 Goodbye!")
                     break
+
+                elif user_input in ('accept', 'correct', '+1'):
+                    accepted = agent.accept_answer(shared=args.share_accepted)
+                    if accepted and args.share_accepted:
+                        print(f"✅ Saved as a verified example for every user: {accepted['sql']}")
+                    elif accepted:
+                        print(f"✅ Saved as a pending example for your questions until approved: {accepted['sql']}")
+                    elif not user_id and not args.share_accepted:
+                        print("ℹ️  Log in with a user ID to save examples (or run with --share-accepted as an operator).")
+                    else:
+                        print("ℹ️  No new SQL answer to save.")
+
+                elif user_input == 'trace':
+                    spans = agent.tracer.recent()
+                    if not spans:
+                        print("ℹ️  No traced question yet." if agent.tracer.enabled else "ℹ️  Tracing is off (TRACING=0).")
+                    else:
+                        print(f"🔎 {agent.tracer.requests} question(s) traced, {len(spans)} span(s) in memory"
+                              + (f", written to {agent.tracer.path}" if agent.tracer.path else ""))
+                        print(format_summary(summarize(spans, top=5)))
+
+                elif user_input == 'stats':
+                    stats = agent.answer_cache.stats()
+                    print(
+                        f"📈 Answer cache: {stats['hits']} hit(s), {stats['misses']} miss(es), "
+                        f"hit rate {stats['hit_rate']:.0%}, {stats['entries']} cached answer(s)"
+                    )
+                    stats = agent.sql_cache.stats()
+                    print(
+                        f"📈 SQL cache: {stats['hits']} hit(s), {stats['misses']} miss(es), "
+                        f"hit rate {stats['hit_rate']:.0%}, {stats['entries']} cached result(s), "
+                        f"{stats['bytes'] / 1024:.0f}/{stats['max_bytes'] / 1024:.0f} KiB, "
+                        f"{stats['invalidations']} invalidation(s), {stats['expirations']} expired"
+                    )
+                    stats = agent.aggregate_report_stats
+                    if stats['reports']:
+                        print(
+                            f"📈 Aggregated reports: {stats['reports']} report(s), {stats['summary_rows']} summary row(s) "
+                            f"for {stats['detail_rows']} entries, {stats['bytes']} bytes sent"
+                        )
+                    stats = agent.agent_stats
+                    if stats['questions']:
+                        print(
+                            f"📈 Schema pruning: {stats['pruned']}/{stats['questions']} question(s) pruned, "
+                            f"{stats['tables_sent'] / stats['questions']:.1f} table(s) and "
+                            f"~{stats['schema_tokens_sent'] / stats['questions']:.0f} schema tokens per question "
+                            f"(all tables: ~{agent.schema_index.full_schema_tokens()})"
+                        )
+                        print(
+                            f"📈 Agent: {stats['llm_calls'] / stats['questions']:.1f} LLM call(s), "
+                            f"{stats['agent_steps'] / stats['questions']:.1f} step(s), "
+                            f"{stats['schema_lookups'] / stats['questions']:.1f} schema lookup(s) and "
+                            f"{stats['examples_used'] / stats['questions']:.1f} SQL example(s) per question; "
+                            f"{agent.sql_examples.stats()['examples']} verified example(s) stored"
+                        )
+                    if agent.intent_router:
+                        stats = agent.intent_router.stats()
+                        print(
+                            f"📈 Intent router: {stats['hits']} routed, {stats['misses']} sent to the agent, "
+                            f"hit rate {stats['hit_rate']:.0%}, ~{stats['latency_saved_seconds']:.1f}s saved "
+                            f"({stats['mean_routed_ms']:.0f} ms routed vs {stats['mean_agent_ms']:.0f} ms agent)"
+                        )
+                    stats = agent.single_shot.counters
+                    if stats['questions']:
+                        print(
+                            f"📈 Single-shot: {stats['answered']}/{stats['questions']} answered, "
+                            f"{stats['repairs']} repair(s), {stats['llm_calls']} LLM call(s), fallbacks: "
+                            f"{stats['fallback_no_sql']} not SQL, {stats['fallback_error']} error, "
+                            f"{stats['fallback_budget']} budget"
+                        )
+                    if agent.query_guard:
+                        stats = agent.query_guard.stats()
+                        print(
+                            f"📈 Query guard: {stats['checked']} checked, {stats['limited']} limited, "
+                            f"{stats['counted'] + stats['refused']} refused, {stats['full_scan']} full scan(s) logged, "
+                            f"{stats['explain_ms'] / max(stats['checked'], 1):.1f} ms per EXPLAIN"
+                        )
+                    if agent.result_workspace:
+                        stats = agent.result_workspace.stats()
+                        if stats['followups'] or stats['local_queries']:
+                            print(
+                                f"📈 Result workspace: {stats['followups_local']}/{stats['followups']} follow-up(s) "
+                                f"served locally ({stats['local_share']:.0%}), {stats['local_queries']} local quer(ies) "
+                                f"in {stats['local_ms']:.1f} ms, ~{stats['saved_ms']:.0f} ms of database time saved, "
+                                f"{stats['results']} result(s) kept ({stats['bytes'] / 1024:.0f} KiB)"
+                            )
+                    stats = agent.output_compactor.stats()
+                    if stats['compacted']:
+                        print(
+                            f"📈 Tool output: {stats['compacted']}/{stats['outputs']} output(s) summarized, "
+                            f"{stats['bytes_saved'] / 1024:.0f} KiB kept out of prompts "
+                            f"({stats['saved_per_request'] / 1024:.1f} KiB per request that needed it)"
+                        )
+                    stats = agent.org_hierarchy.stats()
+                    if stats['lookups']:
+                        print(
+                            f"📈 Org hierarchy: {stats['employees']} employee(s), {stats['lookups']} lookup(s) at "
+                            f"{stats['mean_lookup_us']:.1f} µs, {stats['refreshes']} refresh(es), {stats['cycles']} cycle(s) cut"
+                        )
+                    stats = agent.rollup_refresher.stats()
+                    if stats['refreshes'] or stats['errors']:
+                        print(
+                            f"📈 Hour rollups: {stats['refreshes']} background refresh(es) in {stats['seconds']:.1f}s, "
+                            f"{stats['errors']} error(s){' (reading activity_reports)' if not stats['healthy'] else ''}"
+                        )
+                    stats = agent.timesheet_compliance.stats()
+                    if stats['questions']:
+                        print(
+                            f"📈 Timesheet compliance: {stats['questions']} question(s), {stats['days_cached']} day(s) cached "
+                            f"(hit rate {stats['day_hit_rate']:.0%}), {stats['load_ms']:.0f} ms loading, "
+                            f"{stats['compute_ms'] / stats['questions']:.1f} ms per summary"
+                        )
+                    if agent.llm_scheduler:
+                        stats = agent.llm_scheduler.stats()
+                        if stats['calls']:
+                            lanes = ", ".join(
+                                f"{lane} wait mean {lane_stats['wait_mean_ms']:.0f} ms / p95 {lane_stats['wait_p95_ms']:.0f} ms "
+                                f"(peak queue {lane_stats['peak_queued']})"
+                                for lane, lane_stats in stats['lanes'].items() if lane_stats['admitted']
+                            )
+                            print(
+                                f"📈 LLM scheduler: {stats['calls']} call(s), {stats['coalesced']} coalesced, "
+                                f"{stats['retries']} retr(ies) ({stats['rate_limited']} rate limited), "
+                                f"{stats['exhausted'] + stats['wait_timeouts']} given up; {lanes}"
+                            )
+                    stats = agent.weather.stats()
+                    if stats['http_requests'] or stats['cache_hits']:
+                        print(
+                            f"📈 Weather: {stats['http_requests']} HTTP call(s), {stats['cache_hits']} cache hit(s), "
+                            f"{stats['coalesced']} coalesced, {stats['errors']} error(s)"
+                        )
+                    for name, engine in (("primary", agent.db_engine), ("read", agent.read_engine)):
+                        stats = pool_stats(engine)
+                        if "checkouts" in stats:
+                            print(
+                                f"📈 Pool [{name}]: {stats['checked_out']} checked out, {stats['checked_in']} idle, "
+                                f"{stats['overflow']} overflow, {stats['checkouts']} checkout(s), "
+                                f"wait mean {stats['mean_wait_ms']:.2f} ms / max {stats['max_wait_ms']:.1f} ms, "
+                                f"{stats['timeouts']} timeout(s)"
+                            )
+                    if agent.query_log and agent.query_log.statements:
+                        print(
+                            f"📈 Query log: {agent.query_log.statements} statement(s), "
+                            f"{len(agent.query_log.fingerprints)} fingerprint(s); most expensive:"
+                        )
+                        for line in format_top(agent.query_log.top(3), width=70).splitlines():
+                            print(f"   {line}")
+                    for name, latency in agent.stream_latency.stats().items():
+                        print(
+                            f"📈 Streaming [{name}]: mean {latency['mean_ms']:.0f} ms, "
+                            f"p50 {latency['p50_ms']:.0f} ms, p95 {latency['p95_ms']:.0f} ms"
+                        )
+                    for mode, latency in agent.mode_latency.stats().items():
+                        print(
+                            f"📈 Latency [{mode}]: {latency['count']} answer(s), mean {latency['mean_ms']:.0f} ms, "
+                            f"p50 {latency['p50_ms']:.0f} ms, p95 {latency['p95_ms']:.0f} ms"
+                        )
                         
                 else:
                     try:
-                        response = agent.agent.invoke({"input": user_input})
-                        print(f"\n🤖 {response['output']}")
+                        start = time.perf_counter()
+                        mode = None
+                        for candidate in MODES:
+                            if user_input.startswith(f"/{candidate} "):
+                                mode, user_input = candidate, user_input[len(candidate) + 2:].strip()
+                        if args.no_stream:
+                            answer = agent.ask(user_input, mode=mode)
+                            print(f"\n🤖 {answer}")
+                            print(f"⏱️  {time.perf_counter() - start:.2f}s")
+                        else:
+                            printer = StreamPrinter()
+                            for event in agent.ask_stream(user_input, mode=mode):
+                                printer(event)
+                    except LLMRateLimited as e:
+                        print(f"⏳ {e}. Please try again in a moment.")
                     except Exception as e:
                         print(f"❌ Error processing your query: {e}")
                     
@@ -0,0 +1,174 @@
+"""
+Question-aware schema selection for the SQL agent.
+
+A small local index of the tables, their columns, business synonyms and foreign keys
+is built once (and stored in the schema snapshot when there is one). For each question
+the index picks the relevant tables, adds the tables needed to join them, and returns
+their DDL and sample rows so they can be injected into the prompt instead of letting
+the agent list the tables and fetch every schema itself.
+"""
+import re
+from collections import deque
+from typing import Optional, Dict, Any, List, Set, Tuple
+
+from sqlalchemy import inspect
+from sqlalchemy.engine import Engine
+
+# Words and phrases that point at a table without naming it
+SYNONYMS: Dict[str, Tuple[str, ...]] = {
+    "employees": (
+        "employee", "employees", "staff", "people", "person", "colleague", "colleagues", "who", "manager",
+        "managers", "team", "report to", "reports to", "email", "role", "leave balance",
+    ),
+    "projects": ("project", "projects", "department", "departments", "client"),
+    "project_assignments": (
+        "assigned", "assignment", "assignments", "staffed", "allocated", "allocation", "working on", "works on",
+    ),
+    "activity_reports": (
+        "activity", "activities", "report", "reports", "timesheet", "timesheets", "hours", "worked", "logged",
+        "approved", "submitted", "rejected",
+    ),
+    "leave_requests": (
+        "leave", "leaves", "holiday", "holidays", "vacation", "vacations", "absence", "absences", "time off",
+        "day off", "days off", "pto", "sick",
+    ),
+    "presence": ("presence", "present", "absent", "attendance", "office", "remote", "remotely", "from home", "on site", "onsite", "wfh"),
+    "activity_hours_daily": ("total hours", "hours per day", "daily hours"),
+    "activity_hours_monthly": ("hours per month", "monthly hours", "monthly total", "per month"),
+}
+
+# Column name parts too generic to point at a single table
+_GENERIC_TOKENS = {"id", "date", "status", "type", "name", "created", "at", "start", "end"}
+
+# Rough characters per token, for prompt size estimates without a tokenizer
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count of a prompt fragment."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _words(text: str) -> str:
+    """Lowercase text with every non-alphanumeric run replaced by one space, padded with spaces."""
+    return " " + re.sub(r"[^a-z0-9]+", " ", text.lower()).strip() + " "
+
+
+class SchemaIndex:
+    """Tables, columns, foreign keys and per-table prompt info (DDL + sample rows)."""
+
+    def __init__(
+        self,
+        columns: Dict[str, List[str]],
+        foreign_keys: List[Tuple[str, str, str, str]],
+        table_info: Dict[str, str],
+    ):
+        """
+        Args:
+            columns: Table name -> column names
+            foreign_keys: (table, column, referred table, referred column) tuples
+            table_info: Table name -> DDL and sample rows as shown to the LLM
+        """
+        self.columns = columns
+        self.foreign_keys = [tuple(fk) for fk in foreign_keys]
+        self.table_info = table_info
+        self._neighbours: Dict[str, Set[str]] = {table: set() for table in columns}
+        for table, _, referred, _ in self.foreign_keys:
+            if table in self._neighbours and referred in self._neighbours and table != referred:
+                self._neighbours[table].add(referred)
+                self._neighbours[referred].add(table)
+        self._terms = self._build_terms()
+
+    @classmethod
+    def build(cls, engine: Engine, table_info: Dict[str, str]) -> "SchemaIndex":
+        """Build the index of the tables in table_info from the live database."""
+        inspector = inspect(engine)
+        columns: Dict[str, List[str]] = {}
+        foreign_keys: List[Tuple[str, str, str, str]] = []
+        for table in table_info:
+            columns[table] = [column["name"] for column in inspector.get_columns(table)]
+            for fk in inspector.get_foreign_keys(table):
+                for column, referred in zip(fk["constrained_columns"], fk["referred_columns"]):
+                    foreign_keys.append((table, column, fk["referred_table"], referred))
+        return cls(columns, foreign_keys, table_info)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "columns": self.columns,
+            "foreign_keys": [list(fk) for fk in self.foreign_keys],
+            "table_info": self.table_info,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SchemaIndex":
+        return cls(data["columns"], data["foreign_keys"], data["table_info"])
+
+    def _build_terms(self) -> Dict[str, Set[str]]:
+        """Search term -> tables it points at (table names, synonyms, distinctive column names)."""
+        terms: Dict[str, Set[str]] = {}
+        for table in self.columns:
+            for term in [table, table.replace("_", " ")] + list(SYNONYMS.get(table, ())):
+                terms.setdefault(_words(term).strip(), set()).add(table)
+
+        # A column name (or part of one) only counts when it belongs to a single table
+        owners: Dict[str, Set[str]] = {}
+        for table, columns in self.columns.items():
+            for column in columns:
+                parts = [column.replace("_", " ")] + column.split("_")
+                for part in parts:
+                    if part not in _GENERIC_TOKENS and len(part) > 2:
+                        owners.setdefault(part, set()).add(table)
+        for term, tables in owners.items():
+            if len(tables) == 1:
+                terms.setdefault(term, set()).update(tables)
+        return terms
+
+    def select_tables(self, question: str) -> List[str]:
+        """
+        Tables relevant to a question, plus the tables needed to join them.
+
+        Returns an empty list when nothing in the question points at a table.
+        """
+        text = _words(question)
+        selected: Set[str] = set()
+        for term, tables in self._terms.items():
+            if f" {term} " in text:
+                selected |= tables
+        # A rollup table is only useful next to the table it summarizes
+        if selected & {"activity_hours_daily", "activity_hours_monthly"} and "activity_reports" in self.columns:
+            selected.add("activity_reports")
+        if not selected:
+            return []
+
+        # Connect the selected tables through the foreign key graph
+        ordered = sorted(selected)
+        connected = {ordered[0]}
+        for other in ordered[1:]:
+            connected |= set(self._join_path(connected, other))
+        return sorted(connected | selected)
+
+    def _join_path(self, sources: Set[str], goal: str) -> List[str]:
+        """Shortest chain of tables linking any of the source tables to goal via foreign keys (empty if none)."""
+        previous: Dict[str, Optional[str]] = {source: None for source in sources}
+        queue = deque(sorted(sources))
+        while queue:
+            table = queue.popleft()
+            if table == goal:
+                path = []
+                while table is not None:
+                    path.append(table)
+                    table = previous[table]
+                return path
+            for neighbour in sorted(self._neighbours.get(table, ())):
+                if neighbour not in previous:
+                    previous[neighbour] = table
+                    queue.append(neighbour)
+        return []
+
+    def schema_prompt(self, tables: List[str]) -> str:
+        """DDL and sample rows of the given tables, as shown to the LLM."""
+        return "\n\n".join(self.table_info[table] for table in tables if table in self.table_info)
+
+    def full_schema_tokens(self) -> int:
+        """Estimated tokens of the schema of every table (what an unpruned agent may fetch)."""
+        return estimate_tokens(self.schema_prompt(list(self.table_info)))
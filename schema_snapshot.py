@@ -0,0 +1,125 @@
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import Optional, Dict, Any, List
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+from schema_index import SchemaIndex
+from sql_cache import CachedSQLDatabase
+
+# Bump whenever the layout of the snapshot file changes
+SNAPSHOT_FORMAT_VERSION = 2
+
+
+def compute_schema_checksum(engine: Engine) -> str:
+    """
+    Return a short checksum of the table and column definitions of the database.
+
+    On MySQL this is a single information_schema query; other dialects go through
+    the SQLAlchemy inspector.
+    """
+    if engine.dialect.name == "mysql":
+        with engine.connect() as connection:
+            rows = connection.execute(
+                text(
+                    """
+                    SELECT table_name, column_name, column_type, is_nullable, column_key
+                    FROM information_schema.columns
+                    WHERE table_schema = DATABASE()
+                    ORDER BY table_name, ordinal_position
+                    """
+                )
+            ).fetchall()
+        payload = [list(row) for row in rows]
+    else:
+        inspector = inspect(engine)
+        payload = [
+            [table, [(col["name"], str(col["type"]), col["nullable"]) for col in inspector.get_columns(table)]]
+            for table in sorted(inspector.get_table_names())
+        ]
+    return hashlib.sha256(json.dumps(payload, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+def load_snapshot(path: str, checksum: str) -> Optional[Dict[str, Any]]:
+    """Load a snapshot file, returning None if it is missing, from another format version or stale."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if snapshot.get("format_version") != SNAPSHOT_FORMAT_VERSION or snapshot.get("checksum") != checksum:
+        return None
+    return snapshot
+
+
+def save_snapshot(path: str, checksum: str, db: CachedSQLDatabase) -> Dict[str, Any]:
+    """Write the table list, per-table info (DDL + sample rows) and schema index of a reflected database."""
+    table_names = list(db.get_usable_table_names())
+    table_info = {table: db.get_table_info([table]) for table in table_names}
+    snapshot = {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "checksum": checksum,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "table_names": table_names,
+        "table_info": table_info,
+        "schema_index": SchemaIndex.build(db._engine, table_info).to_dict(),
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f, indent=2)
+    os.replace(tmp_path, path)
+    return snapshot
+
+
+class SnapshotSQLDatabase(CachedSQLDatabase):
+    """CachedSQLDatabase that answers table info from a schema snapshot instead of reflecting tables."""
+
+    def get_table_info(self, table_names: Optional[List[str]] = None, get_col_comments: bool = False) -> str:
+        requested = list(table_names) if table_names is not None else list(self.get_usable_table_names())
+        custom = self._custom_table_info or {}
+        if get_col_comments or any(table not in custom for table in requested):
+            return super().get_table_info(table_names, get_col_comments)
+        return "\n\n".join(custom[table] for table in requested)
+
+
+def create_sql_database(
+    engine: Engine,
+    checksum: str,
+    snapshot_path: Optional[str] = None,
+    **kwargs: Any,
+) -> CachedSQLDatabase:
+    """
+    Build the SQLDatabase used by the agent.
+
+    Without a snapshot path every table is reflected live. With one, a snapshot matching
+    the schema checksum is loaded instead; a missing or stale snapshot is rebuilt from a
+    live reflection and written back to disk. A database built from a snapshot carries
+    the stored schema index as its schema_index attribute.
+
+    Args:
+        engine: SQLAlchemy engine
+        checksum: Current schema checksum (see compute_schema_checksum)
+        snapshot_path: Optional path of the on-disk snapshot
+        **kwargs: Extra arguments for the SQLDatabase constructor
+    """
+    if not snapshot_path:
+        return CachedSQLDatabase(engine=engine, **kwargs)
+
+    snapshot = load_snapshot(snapshot_path, checksum)
+    if snapshot is None:
+        db = CachedSQLDatabase(engine=engine, **kwargs)
+        snapshot = save_snapshot(snapshot_path, checksum, db)
+    else:
+        db = SnapshotSQLDatabase(
+            engine=engine,
+            lazy_table_reflection=True,
+            custom_table_info=snapshot["table_info"],
+            **kwargs,
+        )
+    db.schema_index = SchemaIndex.from_dict(snapshot["schema_index"])
+    return db
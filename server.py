@@ -0,0 +1,310 @@
+"""
+Async HTTP serving mode for the Activity Report Agent.
+
+One ActivityReportAgent (one engine pool, one LLM client) serves every user; the
+user ID travels with each request. Requests run on a bounded worker pool, extra
+requests wait in a bounded queue and are rejected with 503 once it is full, and
+each request is answered with 504 when it exceeds its timeout.
+
+    python server.py --port 8000 --max-concurrency 8 --max-queue 32 --timeout 60
+    curl -s localhost:8000/ask -d '{"user_id": "52", "question": "who am I"}'
+    curl -s localhost:8000/ask -d '{"user_id": "52", "question": "hours per project", "mode": "single-shot"}'
+    curl -s localhost:8000/ask -d '{"user_id": "52", "question": "hours per project", "priority": "batch"}'
+    curl -s localhost:8000/accept -d '{"user_id": "52"}'   # the last answer was right: keep its SQL (for user 52 until reviewed)
+    curl -s localhost:8000/traces?top=5                      # hottest spans and slowest questions
+    curl -s "localhost:8000/traces?request_id=..."           # every span of one answer
+
+Local testing without Gemini or MySQL:
+
+    DATABASE_URL=sqlite:///eis.db python server.py --stub-llm
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, Tuple
+from urllib.parse import parse_qsl
+
+from db_pool import pool_stats
+from llm_scheduler import LANES, LLMRateLimited, llm_lane
+from run_sql_agent import ActivityReportAgent
+from single_shot import MODES
+from tracing import format_summary, new_request_id, summarize
+
+MAX_BODY_BYTES = 64 * 1024
+
+_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+    504: "Gateway Timeout",
+}
+
+
+class AgentServer:
+    """Serves ActivityReportAgent.ask over HTTP with bounded concurrency, backpressure and timeouts."""
+
+    def __init__(
+        self,
+        agent: ActivityReportAgent,
+        max_concurrency: int = 8,
+        max_queue: int = 32,
+        request_timeout: float = 60.0,
+    ):
+        """
+        Args:
+            agent: Shared agent used for every request
+            max_concurrency: Maximum number of questions processed at the same time
+            max_queue: Maximum number of questions waiting for a worker before new ones get 503
+            request_timeout: Seconds after which a request is answered with 504
+        """
+        self.agent = agent
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.request_timeout = request_timeout
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="agent")
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.pending = 0
+        self.in_flight = 0
+        self.stats: Dict[str, int] = {"requests": 0, "ok": 0, "rejected": 0, "timeouts": 0, "rate_limited": 0, "errors": 0}
+
+    async def start(self, host: str, port: int) -> asyncio.base_events.Server:
+        """Start listening; returns the asyncio server."""
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        return await asyncio.start_server(self._handle_connection, host, port)
+
+    async def ask(
+        self, question: str, user_id: Optional[str], mode: Optional[str] = None, priority: str = "interactive",
+    ) -> Tuple[int, Dict[str, Any]]:
+        """Answer one question for one user, enforcing queue bound and timeout; priority is its LLM lane."""
+        self.stats["requests"] += 1
+        if self.pending >= self.max_concurrency + self.max_queue:
+            self.stats["rejected"] += 1
+            return 503, {"error": "Server busy, retry later"}
+
+        self.pending += 1
+        start = time.perf_counter()
+        # Waiting for a slot counts against the request's timeout
+        request_id = new_request_id()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.request_timeout)
+        except asyncio.TimeoutError:
+            self.pending -= 1
+            self.stats["timeouts"] += 1
+            return 504, {"error": f"Request timed out after {self.request_timeout:.0f}s", "request_id": request_id}
+        except BaseException:
+            self.pending -= 1
+            raise
+        remaining = self.request_timeout - (time.perf_counter() - start)
+        if remaining <= 0:
+            # Granted too late: nobody would receive the answer, so do not compute it
+            self.pending -= 1
+            self._slots.release()
+            self.stats["timeouts"] += 1
+            return 504, {"error": f"Request timed out after {self.request_timeout:.0f}s", "request_id": request_id}
+
+        # The slot is only released when the worker thread really finishes, so a timed
+        # out request keeps counting against the concurrency limit until it is done.
+        self.in_flight += 1
+        # request_id ties the response to the spans of its trace (see tracing.py and GET /traces)
+        future = asyncio.get_running_loop().run_in_executor(self.executor, self._answer, question, user_id, mode, request_id, priority)
+        future.add_done_callback(self._release_slot)
+        try:
+            remaining = max(self.request_timeout - (time.perf_counter() - start), 0.001)
+            answer = await asyncio.wait_for(asyncio.shield(future), timeout=remaining)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            return 504, {"error": f"Request timed out after {self.request_timeout:.0f}s", "request_id": request_id}
+        except LLMRateLimited as e:
+            self.stats["rate_limited"] += 1
+            return 503, {"error": f"{e}. Retry later.", "request_id": request_id}
+        except Exception as e:
+            self.stats["errors"] += 1
+            return 500, {"error": f"Error processing your query: {e}", "request_id": request_id}
+
+        self.stats["ok"] += 1
+        return 200, {
+            "answer": answer,
+            "user_id": user_id,
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+            "request_id": request_id,
+        }
+
+    def accept(self, user_id: Optional[Any], question: Optional[str]) -> Tuple[int, Dict[str, Any]]:
+        """Store the SQL behind a user's last answer as a pending example, used for that user until approved."""
+        if user_id is None or str(user_id) == "":
+            return 400, {"error": "Missing 'user_id'"}
+        with self.agent.user_context(str(user_id)):
+            accepted = self.agent.accept_answer(question)
+        if not accepted:
+            return 404, {"error": "No new SQL answer to accept for this user"}
+        return 200, {"accepted": accepted}
+
+    def _answer(
+        self, question: str, user_id: Optional[str], mode: Optional[str], request_id: Optional[str] = None,
+        priority: str = "interactive",
+    ) -> str:
+        with self.agent.user_context(user_id), llm_lane(priority), \
+                self.agent.tracer.request(question, request_id, user_id=user_id, mode=mode, priority=priority):
+            return self.agent.ask(question, mode=mode)
+
+    def _release_slot(self, _future: asyncio.Future) -> None:
+        self.in_flight -= 1
+        self.pending -= 1
+        self._slots.release()
+
+    def traces(self, query: Dict[str, str]) -> Tuple[int, Dict[str, Any]]:
+        """Spans of one request (?request_id=...) or a summary of the recent ones (?top=N)."""
+        spans = self.agent.tracer.recent()
+        if query.get("request_id"):
+            spans = [span for span in spans if span["request_id"] == query["request_id"]]
+            if not spans:
+                return 404, {"error": "Unknown or expired request_id"}
+            return 200, {"spans": spans}
+        try:
+            top = int(query.get("top", "10"))
+        except ValueError:
+            return 400, {"error": "'top' must be an integer"}
+        summary = summarize(spans, top)
+        return 200, {"text": format_summary(summary), **summary}
+
+    def snapshot_stats(self) -> Dict[str, Any]:
+        """Server, cache, intent router, query guard, query log, result workspace, tool output compaction, org hierarchy, timesheet compliance, LLM scheduler, tracing, weather, pool and per-mode latency statistics."""
+        return {
+            "server": dict(self.stats, pending=self.pending, in_flight=self.in_flight),
+            "answer_cache": self.agent.answer_cache.stats(),
+            "sql_cache": self.agent.sql_cache.stats(),
+            "intent_router": self.agent.intent_router.stats() if self.agent.intent_router else None,
+            "single_shot": dict(self.agent.single_shot.counters),
+            "latency_by_mode": self.agent.mode_latency.stats(),
+            "query_guard": self.agent.query_guard.stats() if self.agent.query_guard else None,
+            "query_log": self.agent.query_log.stats() if self.agent.query_log else None,
+            "weather": self.agent.weather.stats(),
+            "tool_output": self.agent.output_compactor.stats(),
+            "org_hierarchy": self.agent.org_hierarchy.stats(),
+            "timesheet_compliance": self.agent.timesheet_compliance.stats(),
+            "result_workspace": self.agent.result_workspace.stats() if self.agent.result_workspace else None,
+            "llm_scheduler": self.agent.llm_scheduler.stats() if self.agent.llm_scheduler else None,
+            "tracing": {key: value for key, value in self.agent.tracer.stats().items() if key != "slowest_requests"},
+            "pools": {"primary": pool_stats(self.agent.db_engine), "read": pool_stats(self.agent.read_engine)},
+        }
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            status, payload = await self._handle_request(reader)
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            status, payload = 400, {"error": "Malformed request"}
+        body = json.dumps(payload, default=str).encode("utf-8")
+        headers = [
+            f"HTTP/1.1 {status} {_REASONS.get(status, '')}",
+            "Content-Type: application/json",
+            f"Content-Length: {len(body)}",
+            "Connection: close",
+        ]
+        if status == 503:
+            headers.append("Retry-After: 1")
+        try:
+            writer.write(("\r\n".join(headers) + "\r\n\r\n").encode("latin-1") + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_request(self, reader: asyncio.StreamReader) -> Tuple[int, Dict[str, Any]]:
+        request_line = (await reader.readline()).decode("latin-1").strip()
+        method, path, _ = request_line.split(" ", 2)
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get("content-length", "0"))
+        if length > MAX_BODY_BYTES:
+            return 413, {"error": "Request body too large"}
+        body = await reader.readexactly(length) if length else b""
+
+        path, _, query_string = path.partition("?")
+        if path == "/health":
+            return 200, {"status": "ok"}
+        if path == "/stats":
+            return 200, self.snapshot_stats()
+        if path == "/traces":
+            return self.traces(dict(parse_qsl(query_string)))
+        if path not in ("/ask", "/accept"):
+            return 404, {"error": f"Unknown path: {path}"}
+        if method != "POST":
+            return 405, {"error": f"Use POST {path}"}
+
+        try:
+            data = json.loads(body or b"{}")
+        except ValueError:
+            return 400, {"error": "Body must be JSON"}
+        if path == "/accept":
+            return self.accept(data.get("user_id"), data.get("question"))
+        question = str(data.get("question", "")).strip()
+        if not question:
+            return 400, {"error": "Missing 'question'"}
+        user_id = data.get("user_id")
+        mode = data.get("mode")
+        if mode is not None and mode not in MODES:
+            return 400, {"error": f"Unknown mode '{mode}'. Use one of: {', '.join(MODES)}"}
+        priority = data.get("priority", "interactive")
+        if priority not in LANES:
+            return 400, {"error": f"Unknown priority '{priority}'. Use one of: {', '.join(LANES)}"}
+        return await self.ask(question, str(user_id) if user_id is not None else None, mode, priority)
+
+
+async def serve(args: argparse.Namespace) -> None:
+    """Build the shared agent and serve until interrupted."""
+    llm = None
+    if args.stub_llm:
+        from stub_llm import StubChatModel
+        llm = StubChatModel(latency_seconds=args.stub_latency)
+
+    agent = ActivityReportAgent(schema_snapshot_path=args.schema_snapshot, prewarm=True, llm=llm)
+    app = AgentServer(
+        agent,
+        max_concurrency=args.max_concurrency,
+        max_queue=args.max_queue,
+        request_timeout=args.timeout,
+    )
+    server = await app.start(args.host, args.port)
+    print(f"🤖 Activity Report Agent serving on http://{args.host}:{args.port} "
+          f"(concurrency {args.max_concurrency}, queue {args.max_queue}, timeout {args.timeout:.0f}s)")
+    async with server:
+        await server.serve_forever()
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description="Serve the Activity Report Agent over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-concurrency", type=int, default=int(os.getenv("SERVER_MAX_CONCURRENCY", "8")))
+    parser.add_argument("--max-queue", type=int, default=int(os.getenv("SERVER_MAX_QUEUE", "32")))
+    parser.add_argument("--timeout", type=float, default=float(os.getenv("SERVER_REQUEST_TIMEOUT", "60")))
+    parser.add_argument("--schema-snapshot", metavar="PATH", default=os.getenv("SCHEMA_SNAPSHOT_PATH"))
+    parser.add_argument("--stub-llm", action="store_true", help="Use an offline stub model instead of Gemini")
+    parser.add_argument("--stub-latency", type=float, default=0.0, help="Simulated stub LLM latency in seconds")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if not args.stub_llm and not os.getenv("GOOGLE_API_KEY"):
+        print("❌ GOOGLE_API_KEY not found. Please set it in your .env file.")
+        exit(1)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        print("\n👋 Goodbye!")
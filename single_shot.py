@@ -0,0 +1,219 @@
+"""
+Single-shot SQL generation: one LLM call, one query, at most one repair.
+
+The schema of the relevant tables (see schema_index) and the most similar verified
+examples are put in one prompt; the LLM answers with a single SELECT statement which
+is executed directly and formatted without another LLM turn. A database error gets
+one repair call. Questions that are not read-only SQL (weather, leave creation...),
+a second failure or an exhausted budget hand the question back to the multi-step agent.
+"""
+import contextvars
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Optional, Dict, Any, List, Deque, Tuple, TYPE_CHECKING
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from query_guard import statement_deadline
+from report_utils import ActivityReportGenerator
+from sql_cache import is_write
+from sql_examples import format_examples
+from tracing import TRACER, token_usage
+
+if TYPE_CHECKING:
+    from run_sql_agent import ActivityReportAgent
+
+MODES = ("agent", "single-shot")
+
+NO_SQL = "NO_SQL"
+
+_PROMPT = """You translate questions about a company's employees, projects, activity reports (timesheets),
+leave requests and presence into exactly one read-only {dialect} SELECT statement.
+Reply with the SQL only, in a ```sql code block. Return at most {top_k} rows unless the user asks for all of them.
+If the question cannot be answered by one SELECT on these tables (weather, creating or changing data,
+small talk...), reply with {no_sql}.
+{user}
+{schema}
+
+{examples}"""
+
+_SQL_BLOCK = re.compile(r"```(?:sql)?\s*(.*?)```", re.S | re.I)
+
+
+class BudgetExceeded(Exception):
+    """The wall-clock or LLM-call budget of a request is used up."""
+
+
+def extract_sql(content: Any) -> Optional[str]:
+    """Pull the SQL statement out of an LLM reply (None for NO_SQL or an empty reply)."""
+    if isinstance(content, list):
+        content = "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+    content = str(content).strip()
+    match = _SQL_BLOCK.search(content)
+    sql = (match.group(1) if match else content).strip().rstrip(";").strip()
+    if not sql or NO_SQL in sql:
+        return None
+    return sql
+
+
+class ModeLatencyStats:
+    """Latency of the last answers per answering mode."""
+
+    def __init__(self, window: int = 1000):
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._window = window
+        self._lock = threading.Lock()
+
+    def record(self, mode: str, seconds: float) -> None:
+        with self._lock:
+            self._latencies.setdefault(mode, deque(maxlen=self._window)).append(seconds)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Count, mean, p50 and p95 in milliseconds per mode."""
+        with self._lock:
+            result = {}
+            for mode, latencies in self._latencies.items():
+                ordered = sorted(latencies)
+                result[mode] = {
+                    "count": len(ordered),
+                    "mean_ms": sum(ordered) / len(ordered) * 1000,
+                    "p50_ms": ordered[len(ordered) // 2] * 1000,
+                    "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+                }
+            return result
+
+
+class SingleShotSQLEngine:
+    """Answers a question with one generated SELECT under a wall-clock and LLM-call budget."""
+
+    def __init__(self, agent: "ActivityReportAgent", max_llm_calls: int = 2, max_seconds: float = 20.0, top_k: int = 50):
+        """
+        Args:
+            agent: Agent providing the LLM, the schema index, the SQL examples and query execution
+            max_llm_calls: LLM calls allowed per question (generation + repair)
+            max_seconds: Wall-clock budget per question
+            top_k: Default row limit asked of the LLM (also the number of rows shown)
+        """
+        self.agent = agent
+        self.max_llm_calls = max_llm_calls
+        self.max_seconds = max_seconds
+        self.top_k = top_k
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="single-shot")
+        self._lock = threading.Lock()
+        self.counters: Dict[str, int] = {
+            "questions": 0, "answered": 0, "repairs": 0, "llm_calls": 0,
+            "fallback_no_sql": 0, "fallback_error": 0, "fallback_budget": 0,
+        }
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += amount
+
+    def answer(self, question: str, deadline: Optional[float] = None) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Answer a question in one shot.
+
+        Args:
+            question: The user's question
+            deadline: time.monotonic() of the end of the whole answer's budget, if sooner than max_seconds
+
+        Returns:
+            Tuple[Optional[str], Optional[str]]: (answer, SQL), or (None, None) when the
+            question must go to the multi-step agent
+        """
+        self._count("questions")
+        deadline = min(time.monotonic() + self.max_seconds, deadline if deadline is not None else float("inf"))
+        calls = 0
+
+        def invoke(messages: List[Any]) -> Optional[str]:
+            nonlocal calls
+            if calls >= self.max_llm_calls:
+                raise BudgetExceeded()
+            calls += 1
+            return extract_sql(self._invoke(messages, deadline))
+
+        try:
+            messages = self._prompt(question)
+            sql = invoke(messages)
+            if sql is None:
+                self._count("fallback_no_sql")
+                return None, None
+
+            for attempt in range(2):
+                if self._refuse(sql):
+                    self._count("fallback_no_sql")
+                    return None, None
+                if time.monotonic() >= deadline:
+                    raise BudgetExceeded()
+                try:
+                    # The statement is cut when the budget runs out (MAX_EXECUTION_TIME on MySQL)
+                    with statement_deadline(deadline):
+                        rows, truncated = self.agent.execute_generated_query(sql)
+                except Exception as e:
+                    if attempt or calls >= self.max_llm_calls:
+                        self._count("fallback_error")
+                        return None, None
+                    # One repair turn with the database error
+                    self._count("repairs")
+                    messages = messages + [
+                        HumanMessage(content=f"This SQL failed:\n{sql}\nError: {str(e)[:500]}\nReply with the corrected SQL only."),
+                    ]
+                    sql = invoke(messages)
+                    if sql is None:
+                        self._count("fallback_error")
+                        return None, None
+                    continue
+                self._count("answered")
+                answer = ActivityReportGenerator.format_query_result(rows, max_rows=self.top_k)
+                if truncated:
+                    answer = f"{answer}\n{self.agent.query_guard.truncation_note(len(rows))}"
+                return f"{answer}\n\n🧾 SQL: {sql}", sql
+            return None, None
+        except BudgetExceeded:
+            self._count("fallback_budget")
+            return None, None
+        finally:
+            self._count("llm_calls", calls)
+
+    def _prompt(self, question: str) -> List[Any]:
+        agent = self.agent
+        tables = agent.schema_index.select_tables(question) or list(agent.schema_index.table_info)
+        examples = (
+            agent.sql_examples.search(question, agent.sql_examples_k, user_id=agent.user_id) if agent.sql_examples_k else []
+        )
+        user = f"The current user is employee_id {agent.user_id}." if agent.user_id else ""
+        system = _PROMPT.format(
+            dialect=agent.db_engine.dialect.name,
+            top_k=self.top_k,
+            no_sql=NO_SQL,
+            user=user,
+            schema=agent.schema_index.schema_prompt(tables),
+            examples=format_examples(examples),
+        )
+        return [SystemMessage(content=system), HumanMessage(content=question)]
+
+    def _invoke(self, messages: List[Any], deadline: float) -> Any:
+        """Call the LLM within the remaining wall-clock budget."""
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise BudgetExceeded()
+        with TRACER.span("llm", "single-shot", messages=len(messages)) as span:
+            # With the caller's context variables, so the call keeps its LLM priority lane
+            future = self._executor.submit(contextvars.copy_context().run, self.agent.llm.invoke, messages)
+            try:
+                response = future.result(timeout=remaining)
+            except FutureTimeoutError:
+                # The call keeps running in the background; its result is discarded
+                span["timed_out"] = True
+                raise BudgetExceeded()
+            span.update(token_usage(response))
+            return response.content
+
+    @staticmethod
+    def _refuse(sql: str) -> bool:
+        """Only single SELECT (or WITH ... SELECT) statements are executed."""
+        statement = sql.strip().lower()
+        return is_write(sql) or ";" in statement or not statement.startswith(("select", "with"))
@@ -0,0 +1,294 @@
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Set, Tuple, Union, Sequence, Iterable
+
+from langchain_community.utilities import SQLDatabase
+from sqlalchemy.engine import Result
+from sqlalchemy.sql.expression import Executable
+
+from tracing import TRACER
+
+# Quoted literals/identifiers are kept verbatim when normalizing SQL text
+_LITERAL_RE = re.compile(r"('(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\")")
+_COMMENT_RE = re.compile(r"(--[^\n]*|#[^\n]*|/\*(?!\+).*?\*/)", re.S)
+_IDENT = r"`?(?:[A-Za-z0-9_]+`?\.`?)?([A-Za-z0-9_]+)`?"
+_TABLE_RE = re.compile(r"\b(?:from|join|update|into|table)\s+" + _IDENT, re.I)
+_FROM_LIST_RE = re.compile(r"\bfrom\s+([^()]*?)(?:\bwhere\b|\bgroup\b|\border\b|\blimit\b|\bhaving\b|\bjoin\b|\)|$)", re.I | re.S)
+_WRITE_RE = re.compile(r"^\s*(insert|update|delete|replace|create|alter|drop|truncate|rename|merge|grant|revoke)\b", re.I)
+_NONDETERMINISTIC_RE = re.compile(
+    r"\b(now|curdate|curtime|current_date|current_time|current_timestamp|sysdate|rand|uuid|last_insert_id|utc_date|utc_timestamp)\b",
+    re.I,
+)
+
+
+def normalize_sql(sql: str) -> str:
+    """Strip comments, lowercase keywords/identifiers and collapse whitespace, leaving literals untouched."""
+    sql = _COMMENT_RE.sub(" ", sql)
+    parts = _LITERAL_RE.split(sql)
+    normalized = []
+    for i, part in enumerate(parts):
+        if i % 2:
+            normalized.append(part)
+        else:
+            normalized.append(re.sub(r"\s+", " ", part.lower()))
+    return "".join(normalized).strip().rstrip(";").strip()
+
+
+def extract_tables(sql: str) -> Set[str]:
+    """Return the (lowercased) table names referenced by a statement."""
+    stripped = _LITERAL_RE.sub("''", _COMMENT_RE.sub(" ", sql))
+    tables = {match.group(1).lower() for match in _TABLE_RE.finditer(stripped)}
+    # Comma-separated FROM lists: FROM employees e, projects p
+    for match in _FROM_LIST_RE.finditer(stripped):
+        for item in match.group(1).split(","):
+            ident = re.match(r"\s*" + _IDENT, item)
+            if ident:
+                tables.add(ident.group(1).lower())
+    return tables
+
+
+def is_write(sql: str) -> bool:
+    """Whether a statement modifies data or schema."""
+    return bool(_WRITE_RE.match(_COMMENT_RE.sub(" ", sql)))
+
+
+class SQLResultCache:
+    """
+    Memory-bounded LRU cache of SQL result sets.
+
+    Entries are keyed on the normalized SQL text and its bound parameters and are
+    indexed by the tables they read, so a write only invalidates the entries of
+    the tables it touches. Writes made by other applications are not seen: entries
+    also expire after ttl_seconds.
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024, max_entries: int = 2048, ttl_seconds: float = 60.0):
+        """
+        Args:
+            max_bytes: Approximate upper bound on the memory held by cached results
+            max_entries: Maximum number of cached statements
+            ttl_seconds: Time-to-live of a cached result in seconds (0: until invalidated or evicted)
+        """
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.expirations = 0
+        self.bytes = 0
+        self._entries: "OrderedDict[str, Tuple[Any, Set[str], int, float]]" = OrderedDict()
+        self._by_table: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(sql: str, params: Optional[Dict[str, Any]] = None, namespace: str = "") -> str:
+        """Build the cache key of a statement and its bound parameters."""
+        return json.dumps([namespace, normalize_sql(sql), params or {}], sort_keys=True, default=str)
+
+    @staticmethod
+    def is_cacheable(sql: str) -> bool:
+        """Only deterministic reads are cached."""
+        return not is_write(sql) and not _NONDETERMINISTIC_RE.search(_LITERAL_RE.sub("''", sql))
+
+    def get(self, sql: str, params: Optional[Dict[str, Any]] = None, namespace: str = "") -> Optional[Any]:
+        """Return a cached result, or None on a miss or an expired entry."""
+        key = self.make_key(sql, params, namespace)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl_seconds > 0 and time.monotonic() - entry[3] > self.ttl_seconds:
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, sql: str, params: Optional[Dict[str, Any]], value: Any, namespace: str = "") -> None:
+        """Cache the result of a read statement."""
+        size = len(repr(value))
+        if size > self.max_bytes:
+            return
+        key = self.make_key(sql, params, namespace)
+        tables = extract_tables(sql)
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (value, tables, size, time.monotonic())
+            self.bytes += size
+            for table in tables:
+                self._by_table.setdefault(table, set()).add(key)
+            while self._entries and (self.bytes > self.max_bytes or len(self._entries) > self.max_entries):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate_tables(self, tables: Iterable[str]) -> int:
+        """Drop every entry that reads one of the given tables. Returns the number of dropped entries."""
+        dropped = 0
+        with self._lock:
+            for table in tables:
+                for key in list(self._by_table.get(table.lower(), ())):
+                    self._remove(key)
+                    dropped += 1
+            self.invalidations += dropped
+        return dropped
+
+    def invalidate_statement(self, sql: str) -> int:
+        """Invalidate the tables touched by a write statement."""
+        return self.invalidate_tables(extract_tables(sql))
+
+    def clear(self) -> None:
+        """Drop every cached result."""
+        with self._lock:
+            self._entries.clear()
+            self._by_table.clear()
+            self.bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit-rate and memory statistics."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "expirations": self.expirations,
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        _, tables, size, _ = entry
+        self.bytes -= size
+        for table in tables:
+            keys = self._by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_table[table]
+
+
+class CachedSQLDatabase(SQLDatabase):
+    """SQLDatabase whose statements (as run by the SQL agent tools) go through a SQLResultCache."""
+
+    def __init__(
+        self,
+        *args,
+        result_cache: Optional[SQLResultCache] = None,
+        query_guard: Optional[Any] = None,
+        result_workspace: Optional[Any] = None,
+        output_compactor: Optional[Any] = None,
+        **kwargs,
+    ):
+        self.result_cache = result_cache or SQLResultCache()
+        # Optional query_guard.QueryGuard checking reads before they run
+        self.query_guard = query_guard
+        # Optional result_workspace.ResultWorkspace keeping the result sets for follow-ups
+        self.result_workspace = result_workspace
+        # Optional output_compactor.ToolOutputCompactor summarizing results over the token budget
+        self.output_compactor = output_compactor
+        # Rows (and workspace ID) of the last result of each thread, for the compactor
+        self._last = threading.local()
+        super().__init__(*args, **kwargs)
+
+    def _read(
+        self,
+        command: str,
+        fetch: str,
+        parameters: Optional[Dict[str, Any]],
+        execution_options: Optional[Dict[str, Any]],
+    ) -> Tuple[Any, str, bool]:
+        """
+        Run a read through the query guard: its result, the statement the result answers
+        (with the guard's LIMIT, if any) and whether the guard cut its rows.
+        """
+        if not self.query_guard:
+            return super()._execute(command, fetch, parameters=parameters, execution_options=execution_options), command, False
+        guarded = self.query_guard.check(command, parameters)
+        result = super()._execute(guarded.statement, fetch, parameters=parameters, execution_options=execution_options)
+        result, truncated = guarded.cap(result)
+        return result, guarded.source, truncated
+
+    def _execute(
+        self,
+        command: Union[str, Executable],
+        fetch: str = "all",
+        *,
+        parameters: Optional[Dict[str, Any]] = None,
+        execution_options: Optional[Dict[str, Any]] = None,
+    ) -> Union[Sequence[Dict[str, Any]], Result]:
+        if not isinstance(command, str) or fetch == "cursor":
+            return super()._execute(command, fetch, parameters=parameters, execution_options=execution_options)
+
+        start = time.perf_counter()
+        if is_write(command):
+            result = super()._execute(command, fetch, parameters=parameters, execution_options=execution_options)
+            self.result_cache.invalidate_statement(command)
+            if self.result_workspace:
+                self.result_workspace.invalidate_tables(extract_tables(command))
+            return result
+        if not self.result_cache.is_cacheable(command):
+            result, source, truncated = self._read(command, fetch, parameters, execution_options)
+            TRACER.sql_result(result)
+            self._keep(source, fetch, result, start, truncated)
+            return result
+
+        namespace = f"sql_database:{fetch}"
+        cached = self.result_cache.get(command, parameters, namespace=namespace)
+        if cached is not None:
+            result, source, truncated = cached
+            TRACER.sql_result(result, command, cached=True)
+            self._keep(source, fetch, result, start, truncated)
+            return result
+        result, source, truncated = self._read(command, fetch, parameters, execution_options)
+        TRACER.sql_result(result)
+        self.result_cache.put(command, parameters, (result, source, truncated), namespace=namespace)
+        self._keep(source, fetch, result, start, truncated)
+        return result
+
+    def _keep(self, statement: str, fetch: str, result: Any, start: float, truncated: bool = False) -> None:
+        """
+        Store a result set in the result workspace.
+
+        Args:
+            statement: Statement that produced the rows (with the query guard's LIMIT, if any)
+            truncated: The query guard cut the rows, so the result is partial
+        """
+        stored = None
+        if self.result_workspace and fetch == "all" and isinstance(result, list):
+            stored = self.result_workspace.add(
+                statement, result, (time.perf_counter() - start) * 1000, truncated=truncated,
+            )
+        self._last.result = (result, stored.result_id if stored is not None else None, truncated)
+
+    def run(
+        self,
+        command: Union[str, Executable],
+        fetch: str = "all",
+        include_columns: bool = False,
+        **kwargs: Any,
+    ) -> Union[str, Sequence[Dict[str, Any]], Result]:
+        """
+        Run a statement like SQLDatabase.run, summarizing a result text over the output budget
+        and saying so when the query guard cut the rows.
+        """
+        self._last.result = None
+        output = super().run(command, fetch, include_columns, **kwargs)
+        last = self._last.result
+        if self.output_compactor and isinstance(output, str) and output and last and isinstance(last[0], list):
+            output = self.output_compactor.compact_rows(output, last[0], result_id=last[1], truncated=last[2])
+        if isinstance(output, str) and last and last[2]:
+            output = f"{output}\n{self.query_guard.truncation_note(len(last[0]))}"
+        return output
@@ -0,0 +1,286 @@
+"""
+Verified natural language -> SQL examples, retrieved per question with BM25.
+
+A few hand-checked examples ship with the agent (the joins it most often gets wrong:
+activity_reports -> projects for project names, the employees.manager_id self-join,
+...); pairs accepted by users are appended to a JSON Lines file and indexed as well.
+The top matches for a question are shown to the LLM as few-shot examples.
+
+Pairs accepted by a user (POST /accept) stay pending: they are only shown for that
+user's questions until an operator approves them for everyone.
+
+    python sql_examples.py pending           # list the pending pairs
+    python sql_examples.py approve 1 3       # share pairs 1 and 3 with every user
+    python sql_examples.py reject 2          # drop pair 2
+"""
+import argparse
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Optional, Dict, Any, List
+
+SEED_EXAMPLES: List[Dict[str, str]] = [
+    {
+        "question": "Total hours per project in July 2025",
+        "sql": "SELECT p.project_name, SUM(ar.hours) AS total_hours FROM activity_reports ar "
+               "JOIN projects p ON p.project_id = ar.project_id "
+               "WHERE ar.date BETWEEN '2025-07-01' AND '2025-07-31' "
+               "GROUP BY p.project_name ORDER BY total_hours DESC",
+    },
+    {
+        "question": "Approved hours per department",
+        "sql": "SELECT p.department, SUM(ar.hours) AS total_hours FROM activity_reports ar "
+               "JOIN projects p ON p.project_id = ar.project_id WHERE ar.status = 'Approved' "
+               "GROUP BY p.department ORDER BY total_hours DESC",
+    },
+    {
+        "question": "Who is the manager of Jacob Lee?",
+        "sql": "SELECT m.employee_id, m.name, m.email FROM employees e "
+               "JOIN employees m ON m.employee_id = e.manager_id WHERE e.name = 'Jacob Lee'",
+    },
+    {
+        "question": "Which employees report to Adam Bryan?",
+        "sql": "SELECT e.employee_id, e.name, e.role FROM employees e "
+               "JOIN employees m ON m.employee_id = e.manager_id WHERE m.name = 'Adam Bryan' ORDER BY e.name",
+    },
+    {
+        "question": "How many pending leave requests does each manager have to review?",
+        "sql": "SELECT m.name, COUNT(*) AS pending_requests FROM leave_requests lr "
+               "JOIN employees m ON m.employee_id = lr.manager_id WHERE lr.status = 'Pending' "
+               "GROUP BY m.name ORDER BY pending_requests DESC",
+    },
+    {
+        "question": "Who is currently assigned to Project I1?",
+        "sql": "SELECT e.employee_id, e.name FROM project_assignments pa "
+               "JOIN employees e ON e.employee_id = pa.employee_id "
+               "JOIN projects p ON p.project_id = pa.project_id "
+               "WHERE p.project_name = 'Project I1' AND (pa.end_date IS NULL OR pa.end_date >= CURRENT_DATE)",
+    },
+    {
+        "question": "Who was absent on 2025-07-24?",
+        "sql": "SELECT e.employee_id, e.name FROM presence pr JOIN employees e ON e.employee_id = pr.employee_id "
+               "WHERE pr.date = '2025-07-24' AND pr.status = 'Absent'",
+    },
+    {
+        "question": "Which employees have not logged any activity in July 2025?",
+        "sql": "SELECT e.employee_id, e.name FROM employees e WHERE NOT EXISTS ("
+               "SELECT 1 FROM activity_reports ar WHERE ar.employee_id = e.employee_id "
+               "AND ar.date BETWEEN '2025-07-01' AND '2025-07-31')",
+    },
+    {
+        "question": "How many vacation days did each employee take in 2025?",
+        "sql": "SELECT e.name, COUNT(*) AS requests FROM leave_requests lr "
+               "JOIN employees e ON e.employee_id = lr.employee_id "
+               "WHERE lr.type = 'Vacation' AND lr.status = 'Approved' AND lr.start_date >= '2025-01-01' "
+               "GROUP BY e.name ORDER BY requests DESC",
+    },
+]
+
+_STOPWORDS = {
+    "a", "an", "the", "of", "in", "on", "for", "to", "by", "and", "or", "is", "are", "was", "were", "be",
+    "do", "does", "did", "i", "me", "my", "what", "which", "who", "how", "many", "much", "show", "list",
+    "give", "get", "all", "each", "per", "with", "from", "at", "this", "that", "have", "has", "any",
+}
+
+
+def _stem(word: str) -> str:
+    """Naive suffix stripping so that 'manages', 'manager' and 'managed' share a term."""
+    for suffix in ("ing", "ed", "er", "s"):
+        if word.endswith(suffix) and not word.endswith("ss") and len(word) - len(suffix) >= 4:
+            word = word[:-len(suffix)]
+            break
+    return word[:-1] if len(word) > 4 and word.endswith("e") else word
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, stemmed words without stopwords."""
+    return [_stem(word) for word in re.findall(r"[a-z0-9]+", text.lower()) if word not in _STOPWORDS]
+
+
+def format_examples(examples: List[Dict[str, Any]]) -> str:
+    """Few-shot prompt block for retrieved examples ('' when there are none)."""
+    if not examples:
+        return ""
+    return "Verified SQL for similar questions (adapt it instead of exploring the schema again):\n\n" + "\n\n".join(
+        f"Question: {example['question']}\nSQL: {example['sql']}" for example in examples
+    )
+
+
+class SQLExampleStore:
+    """Seed and user-accepted question/SQL pairs with an in-memory BM25 index."""
+
+    # BM25 parameters
+    K1 = 1.5
+    B = 0.75
+
+    def __init__(self, path: Optional[str] = None, seed: bool = True):
+        """
+        Args:
+            path: Optional JSON Lines file holding the accepted examples (appended to)
+            seed: Include the built-in SEED_EXAMPLES
+        """
+        self.path = path
+        self.examples: List[Dict[str, Any]] = []
+        self._questions = set()
+        self._doc_tokens: List[Counter] = []
+        self._doc_freq: Counter = Counter()
+        self._total_length = 0
+        self._lock = threading.Lock()
+        for example in SEED_EXAMPLES if seed else []:
+            self._index(dict(example, source="seed"))
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        self._index(json.loads(line))
+
+    @classmethod
+    def from_env(cls) -> "SQLExampleStore":
+        """Build a store from the SQL_EXAMPLES_PATH environment variable."""
+        return cls(path=os.getenv("SQL_EXAMPLES_PATH", ".sql_examples.jsonl") or None)
+
+    @staticmethod
+    def _key(question: str) -> str:
+        return " ".join(re.findall(r"[a-z0-9]+", question.lower()))
+
+    def _index(self, example: Dict[str, Any]) -> bool:
+        key = self._key(example["question"])
+        if example.get("user_id") is not None:
+            # Pending pairs are per user: another user may accept the same question
+            key = f"{example['user_id']}:{key}"
+        if key in self._questions:
+            return False
+        tokens = Counter(tokenize(example["question"]))
+        self._questions.add(key)
+        self.examples.append(example)
+        self._doc_tokens.append(tokens)
+        self._doc_freq.update(tokens.keys())
+        self._total_length += sum(tokens.values())
+        return True
+
+    def add(self, question: str, sql: str, source: str = "accepted", user_id: Optional[str] = None) -> bool:
+        """
+        Add a verified pair and persist it. Returns False if the question is already known.
+
+        Args:
+            user_id: Keep the pair pending, shown only for this user's questions until approved
+        """
+        example = {
+            "question": question.strip(),
+            "sql": sql.strip(),
+            "source": "pending" if user_id is not None else source,
+            "added_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        if user_id is not None:
+            example["user_id"] = str(user_id)
+        with self._lock:
+            if user_id is not None and self._key(question) in self._questions:
+                return False
+            if not self._index(example):
+                return False
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(example) + "\n")
+        return True
+
+    def pending(self) -> List[Dict[str, Any]]:
+        """Pairs accepted by users and not reviewed yet, in the order they were added."""
+        with self._lock:
+            return [example for example in self.examples if example.get("user_id") is not None]
+
+    def review(self, indexes: List[int], approve: bool = True) -> int:
+        """
+        Approve (share with every user) or reject pending pairs, rewriting the file.
+
+        Args:
+            indexes: 1-based positions in pending()
+
+        Returns:
+            int: Number of reviewed pairs
+        """
+        with self._lock:
+            pending = [example for example in self.examples if example.get("user_id") is not None]
+            chosen = [pending[i - 1] for i in sorted(set(indexes)) if 1 <= i <= len(pending)]
+            if not chosen:
+                return 0
+            examples = [example for example in self.examples if not any(example is c for c in chosen)]
+            if approve:
+                examples += [
+                    {key: value for key, value in dict(example, source="accepted").items() if key != "user_id"}
+                    for example in chosen
+                ]
+            self.examples, self._questions, self._doc_tokens = [], set(), []
+            self._doc_freq, self._total_length = Counter(), 0
+            for example in examples:
+                self._index(example)
+            if self.path:
+                tmp = f"{self.path}.tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    for example in self.examples:
+                        if example.get("source") != "seed":
+                            f.write(json.dumps(example) + "\n")
+                os.replace(tmp, self.path)
+            return len(chosen)
+
+    def search(
+        self, question: str, k: int = 3, min_score: float = 1.0, user_id: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Return up to k examples most similar to the question, best first, with their BM25 score.
+
+        Args:
+            user_id: User asking; their pending pairs are included, other users' are not
+        """
+        user_id = str(user_id) if user_id is not None else None
+        query = set(tokenize(question))
+        with self._lock:
+            n = len(self.examples)
+            if not n or not query or k <= 0:
+                return []
+            avg_length = self._total_length / n
+            scored = []
+            for i, tokens in enumerate(self._doc_tokens):
+                owner = self.examples[i].get("user_id")
+                if owner is not None and owner != user_id:
+                    continue
+                length = sum(tokens.values())
+                score = 0.0
+                for term in query:
+                    tf = tokens.get(term)
+                    if not tf:
+                        continue
+                    idf = math.log(1 + (n - self._doc_freq[term] + 0.5) / (self._doc_freq[term] + 0.5))
+                    score += idf * tf * (self.K1 + 1) / (tf + self.K1 * (1 - self.B + self.B * length / avg_length))
+                if score >= min_score:
+                    scored.append((score, i))
+            scored.sort(reverse=True)
+            return [dict(self.examples[i], score=round(score, 2)) for score, i in scored[:k]]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            sources = Counter(example.get("source", "accepted") for example in self.examples)
+            return {"examples": len(self.examples), **dict(sources)}
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Review the SQL examples accepted by users")
+    parser.add_argument("command", choices=["pending", "approve", "reject"])
+    parser.add_argument("indexes", nargs="*", type=int, help="Positions in the pending list")
+    args = parser.parse_args()
+
+    store = SQLExampleStore.from_env()
+    if args.command == "pending":
+        for i, example in enumerate(store.pending(), 1):
+            print(f"{i}. [user {example['user_id']}, {example.get('added_at', '?')}] {example['question']}\n   {example['sql']}")
+        if not store.pending():
+            print("✅ No pending examples")
+    else:
+        reviewed = store.review(args.indexes, approve=args.command == "approve")
+        print(f"✅ {reviewed} example(s) {'approved' if args.command == 'approve' else 'rejected'}")
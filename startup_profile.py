@@ -0,0 +1,92 @@
+import builtins
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+
+class StartupProfiler:
+    """
+    Records startup phases and per-package import times for --profile-startup.
+
+    Phases are cheap no-ops until the profiler is enabled. Import times are
+    inclusive: a module's figure also covers the modules it pulls in.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.started_at = time.perf_counter()
+        self.phases: List[Tuple[str, float, str]] = []
+        self.imports: Dict[str, float] = {}
+        self.marks: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._original_import = None
+
+    def enable(self) -> None:
+        """Start recording and hook builtins.__import__ to time top-level imports."""
+        if self.enabled:
+            return
+        self.enabled = True
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._timed_import
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        depth = getattr(self._local, "depth", 0)
+        if depth or level or not name or name in sys.modules:
+            self._local.depth = depth + 1
+            try:
+                return self._original_import(name, globals, locals, fromlist, level)
+            finally:
+                self._local.depth = depth
+
+        start = time.perf_counter()
+        self._local.depth = 1
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            self._local.depth = 0
+            with self._lock:
+                self.imports[name] = self.imports.get(name, 0.0) + time.perf_counter() - start
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time a named startup phase (records the thread it ran on)."""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases.append((name, time.perf_counter() - start, threading.current_thread().name))
+
+    def mark(self, name: str) -> None:
+        """Record the elapsed time since process start under a name (e.g. 'first prompt')."""
+        if self.enabled:
+            self.marks[name] = time.perf_counter() - self.started_at
+
+    def report(self) -> str:
+        """Format the recorded marks, phases and import breakdown."""
+        with self._lock:
+            phases = list(self.phases)
+            imports = sorted(self.imports.items(), key=lambda item: item[1], reverse=True)
+        lines = ["⏱️  Startup profile", "=" * 62]
+        for name, elapsed in self.marks.items():
+            lines.append(f"{name:<44} {elapsed * 1000:9.1f} ms")
+        lines.append("-" * 62)
+        lines.append("Phases:")
+        for name, elapsed, thread in phases:
+            lines.append(f"  {name:<42} {elapsed * 1000:9.1f} ms  [{thread}]")
+        lines.append("-" * 62)
+        lines.append("Imports (inclusive):")
+        for name, elapsed in imports:
+            if elapsed >= 0.001:
+                lines.append(f"  {name:<42} {elapsed * 1000:9.1f} ms")
+        return "\n".join(lines)
+
+
+# Process-wide profiler; enabled by run_sql_agent.py when --profile-startup is passed
+PROFILER = StartupProfiler()
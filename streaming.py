@@ -0,0 +1,205 @@
+"""
+Streaming of agent runs: tool calls, generated SQL and answer tokens as they happen.
+
+A callback handler attached to the agent run turns LangChain's callback events into
+plain event dicts:
+
+    {"type": "token", "text": ...}                        answer text as the LLM produces it
+    {"type": "tool_call", "name": ..., "args": ...}       a tool call being generated (args arrive in pieces)
+    {"type": "tool_start", "name": ..., "input": ...}     a tool starts; for sql_db_query the input is the SQL
+    {"type": "tool_end", "name": ..., "output": ...}      a tool finished (output truncated)
+    {"type": "chunk", "text": ...}                        a block of lines of a final answer that was not streamed
+    {"type": "done", "answer": ..., "ttft_ms": ..., "total_ms": ...}
+
+The run itself executes in a worker thread (with the caller's context variables, so the
+user context follows) and the events are handed over through a queue, so a synchronous
+caller such as the CLI can print them while the agent works.
+"""
+import contextvars
+import queue
+import sys
+import threading
+import time
+from typing import Optional, Dict, Any, Callable, Iterator, List
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Lines per chunk when a long final answer (e.g. a report) is emitted in pieces
+CHUNK_LINES = 20
+
+_DONE = object()
+
+
+def iter_text_chunks(text: str, lines: int = CHUNK_LINES) -> Iterator[str]:
+    """Split text into blocks of at most `lines` lines (each block keeps its line breaks)."""
+    all_lines = text.splitlines(keepends=True)
+    for start in range(0, len(all_lines), lines):
+        yield "".join(all_lines[start:start + lines])
+
+
+class StreamingEventHandler(BaseCallbackHandler):
+    """Forwards LLM tokens and tool activity of an agent run to a callback as event dicts."""
+
+    def __init__(self, emit: Callable[[Dict[str, Any]], None], max_output_chars: int = 300):
+        """
+        Args:
+            emit: Called with every event
+            max_output_chars: Tool outputs are truncated to this many characters in tool_end events
+        """
+        self.emit = emit
+        self.max_output_chars = max_output_chars
+        # Text of the LLM turn in progress / of the last finished one
+        self.current_text = ""
+        self.last_text = ""
+        self._streamed_run = False
+        self._tools: Dict[UUID, str] = {}
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[Any]], **kwargs: Any) -> None:
+        self.current_text = ""
+        self._streamed_run = False
+
+    def on_llm_new_token(self, token: Any, *, chunk: Any = None, **kwargs: Any) -> None:
+        self._streamed_run = True
+        message = getattr(chunk, "message", None)
+        for call in getattr(message, "tool_call_chunks", None) or []:
+            if call.get("name") or call.get("args"):
+                self.emit({"type": "tool_call", "name": call.get("name"), "args": call.get("args") or ""})
+        text = _text(token)
+        if text:
+            self.current_text += text
+            self.emit({"type": "token", "text": text})
+
+    def on_llm_end(self, response: Any, **kwargs: Any) -> None:
+        if not self._streamed_run:
+            # The model did not stream: emit its whole text at once
+            generations = getattr(response, "generations", None) or [[]]
+            text = "".join(_text(getattr(generation, "text", "")) for generation in generations[0])
+            if text:
+                self.current_text = text
+                self.emit({"type": "token", "text": text})
+        self.last_text = self.current_text
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID, **kwargs: Any) -> None:
+        name = (serialized or {}).get("name") or kwargs.get("name") or "tool"
+        self._tools[run_id] = name
+        # Text produced before a tool call is not the final answer
+        self.last_text = ""
+        inputs = kwargs.get("inputs")
+        if isinstance(inputs, dict) and isinstance(inputs.get("query"), str) and inputs["query"]:
+            # Show the SQL itself rather than the argument dict
+            input_str = inputs["query"]
+        self.emit({"type": "tool_start", "name": name, "input": input_str})
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        name = self._tools.pop(run_id, "tool")
+        text = str(getattr(output, "content", output))
+        if len(text) > self.max_output_chars:
+            text = text[:self.max_output_chars] + "…"
+        self.emit({"type": "tool_end", "name": name, "output": text})
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self.emit({"type": "tool_end", "name": self._tools.pop(run_id, "tool"), "output": f"Error: {error}"})
+
+
+def _text(token: Any) -> str:
+    """Text of a token, which may be a list of content parts."""
+    if isinstance(token, list):
+        return "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in token)
+    return str(token or "")
+
+
+def stream_run(run: Callable[[List[BaseCallbackHandler]], str]) -> Iterator[Dict[str, Any]]:
+    """
+    Run `run(callbacks)` in a worker thread and yield its events as they arrive.
+
+    The final answer is emitted in chunks unless the LLM already streamed it token by token.
+    The last event is 'done', with the answer, the time to the first event (ttft_ms) and the
+    total latency; an exception raised by the run is re-raised after the events before it.
+    """
+    events: "queue.Queue[Any]" = queue.Queue()
+    handler = StreamingEventHandler(events.put)
+    outcome: Dict[str, Any] = {}
+    start = time.perf_counter()
+
+    def worker() -> None:
+        try:
+            outcome["answer"] = run([handler])
+        except BaseException as e:
+            outcome["error"] = e
+        finally:
+            events.put(_DONE)
+
+    context = contextvars.copy_context()
+    threading.Thread(target=context.run, args=(worker,), name="stream-run", daemon=True).start()
+
+    first_event_at: Optional[float] = None
+    while True:
+        event = events.get()
+        if event is _DONE:
+            break
+        if first_event_at is None:
+            first_event_at = time.perf_counter()
+        yield event
+
+    if "error" in outcome:
+        raise outcome["error"]
+    answer = str(outcome.get("answer", ""))
+    if answer.strip() and answer.strip() != handler.last_text.strip():
+        for chunk in iter_text_chunks(answer):
+            if first_event_at is None:
+                first_event_at = time.perf_counter()
+            yield {"type": "chunk", "text": chunk}
+    end = time.perf_counter()
+    yield {
+        "type": "done",
+        "answer": answer,
+        "ttft_ms": ((first_event_at or end) - start) * 1000,
+        "total_ms": (end - start) * 1000,
+    }
+
+
+class StreamPrinter:
+    """Prints stream events to a terminal as they arrive."""
+
+    def __init__(self, out=None):
+        self.out = out or sys.stdout
+        self._in_text = False
+
+    def _write(self, text: str) -> None:
+        self.out.write(text)
+        self.out.flush()
+
+    def _end_text(self) -> None:
+        if self._in_text:
+            self._write("\n")
+            self._in_text = False
+
+    def __call__(self, event: Dict[str, Any]) -> None:
+        kind = event["type"]
+        if kind == "token":
+            if not self._in_text:
+                self._write("\n🤖 ")
+                self._in_text = True
+            self._write(event["text"])
+        elif kind == "tool_call":
+            # Arguments (e.g. the SQL of sql_db_query) as the LLM generates them
+            if event.get("name"):
+                self._end_text()
+                self._write(f"\n🛠️  {event['name']} ")
+            self._write(event["args"])
+        elif kind == "tool_start":
+            self._end_text()
+            label = "🧾 SQL" if event["name"] in ("sql_db_query", "sql_db_query_checker") else f"🔧 {event['name']}"
+            self._write(f"\n{label}: {event['input']}\n")
+        elif kind == "tool_end":
+            first_line = event["output"].strip().splitlines()[0] if event["output"].strip() else ""
+            self._write(f"   ↳ {first_line[:120]}\n")
+        elif kind == "chunk":
+            if not self._in_text:
+                self._write("\n🤖 ")
+                self._in_text = True
+            self._write(event["text"])
+        elif kind == "done":
+            self._end_text()
+            self._write(f"⏱️  first output {event['ttft_ms'] / 1000:.2f}s, total {event['total_ms'] / 1000:.2f}s\n")
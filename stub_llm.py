@@ -0,0 +1,94 @@
+import time
+from typing import Optional, Any, Dict, List
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+
+class StubChatModel(BaseChatModel):
+    """
+    Deterministic offline chat model for local testing of the agent and the server.
+
+    Never calls a tool: every turn answers the last human message with the response
+    template, after an optional simulated latency.
+    """
+
+    response_template: str = "Stub answer to: {question}"
+    latency_seconds: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "StubChatModel":
+        """Tools are accepted and ignored."""
+        return self
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        question = next(
+            (message.content for message in reversed(messages) if isinstance(message, HumanMessage)),
+            "",
+        )
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        message = AIMessage(content=self.response_template.format(question=question))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+class ReplayChatModel(BaseChatModel):
+    """
+    Deterministic offline chat model replaying recorded tool-call traces, for benchmarks.
+
+    traces maps each question to its turns, in order: {"tool_calls": [{"name": ..., "args": {...}}]}
+    for a tool-calling turn, {"content": ...} for the final answer, where {observation} is
+    replaced by the output of the last tool call. The turn to replay is the number of tool-calling
+    turns since the question, so the same trace drives every run of the question. Unknown
+    questions (or a trace that ran out of turns) get the fallback answer.
+    """
+
+    traces: Dict[str, List[Dict[str, Any]]] = {}
+    latency_seconds: float = 0.0
+    fallback: str = "No recorded trace for: {question}"
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "ReplayChatModel":
+        """Tools are accepted; the recorded calls name them directly."""
+        return self
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        asked_at = max((i for i, message in enumerate(messages) if isinstance(message, HumanMessage)), default=-1)
+        question = messages[asked_at].content if asked_at >= 0 else ""
+        since = messages[asked_at + 1:]
+        turn = sum(1 for message in since if isinstance(message, AIMessage) and message.tool_calls)
+        observation = next((str(message.content) for message in reversed(since) if isinstance(message, ToolMessage)), "")
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+
+        turns = self.traces.get(question, [])
+        if turn < len(turns) and turns[turn].get("tool_calls"):
+            message = AIMessage(content="", tool_calls=[
+                {"name": call["name"], "args": call.get("args", {}), "id": f"replay_{turn}_{i}"}
+                for i, call in enumerate(turns[turn]["tool_calls"])
+            ])
+        elif turn < len(turns):
+            message = AIMessage(content=turns[turn].get("content", "").replace("{observation}", observation))
+        else:
+            message = AIMessage(content=self.fallback.format(question=question))
+        return ChatResult(generations=[ChatGeneration(message=message)])
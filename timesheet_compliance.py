@@ -0,0 +1,428 @@
+"""
+Timesheet compliance: who has not submitted their timesheet, over any range of working days.
+
+For every working day (Monday to Friday) the engine keeps an employee x day matrix as one
+column per day, each column a set of bitmasks over the employees (bit i is employee i):
+
+    submitted   an activity report with status Submitted or Approved
+    draft       an entry still in Draft
+    rejected    an entry that was Rejected
+    excused     approved leave (leave_requests) or presence status On Leave / Absent
+
+An employee is expected on a day unless excused, and has a gap when expected and not
+submitted. The gap is 'draft' when a draft entry exists, else 'rejected' when a rejected
+entry exists, else 'missing'. The employees table has no start or end date, so every
+current employee is expected on every working day.
+
+Columns are loaded in bulk (three range queries per run of uncached days) and cached per
+day for `ttl_seconds`; writes made through the agent invalidate them. Per-employee gap
+counts are computed with bit-sliced counters: the count of every employee over the whole
+range is accumulated with a few bitwise operations per day, whatever the number of
+employees, so hundreds of employees over months are summarized in milliseconds.
+
+    python timesheet_compliance.py 2025-07-01 2025-07-31 --manager "Adam Bryan"
+"""
+import argparse
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Optional, Dict, Any, List, Iterable, Iterator, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from org_hierarchy import OrgHierarchy
+
+SUBMITTED_STATUSES = ("Submitted", "Approved")
+EXCUSED_PRESENCE = ("On Leave", "Absent")
+GAP_KINDS = ("missing", "draft", "rejected")
+
+_ACTIVITY_SQL = (
+    "SELECT DISTINCT employee_id, date, status FROM activity_reports WHERE date BETWEEN :start AND :end"
+)
+_PRESENCE_SQL = (
+    "SELECT employee_id, date FROM presence WHERE date BETWEEN :start AND :end "
+    "AND status IN ('" + "', '".join(EXCUSED_PRESENCE) + "')"
+)
+_LEAVE_SQL = (
+    "SELECT employee_id, start_date, end_date FROM leave_requests "
+    "WHERE status = 'Approved' AND start_date <= :end AND end_date >= :start"
+)
+
+
+class DayColumn:
+    """Bitmasks of one working day over the employee positions."""
+
+    __slots__ = ("submitted", "draft", "rejected", "excused")
+
+    def __init__(self):
+        self.submitted = self.draft = self.rejected = self.excused = 0
+
+
+class BitCounter:
+    """Per-bit counters over many bitmasks (bit-sliced: plane k holds bit k of every count)."""
+
+    def __init__(self):
+        self.planes: List[int] = []
+
+    def add(self, mask: int) -> None:
+        """Increment the counter of every bit set in mask (ripple-carry over the planes)."""
+        for k in range(len(self.planes)):
+            if not mask:
+                return
+            carry = self.planes[k] & mask
+            self.planes[k] ^= mask
+            mask = carry
+        if mask:
+            self.planes.append(mask)
+
+    def counts(self, size: int) -> List[int]:
+        """The counter of each of the first `size` bits."""
+        counts = [0] * size
+        for k, plane in enumerate(self.planes):
+            weight = 1 << k
+            # bin() of the plane, least significant bit first
+            bits = bin(plane)[:1:-1]
+            position = bits.find("1")
+            while position != -1 and position < size:
+                counts[position] += weight
+                position = bits.find("1", position + 1)
+        return counts
+
+
+def working_days(start: date, end: date) -> List[date]:
+    return [start + timedelta(days=i) for i in range((end - start).days + 1) if (start + timedelta(days=i)).weekday() < 5]
+
+
+def _as_date(value: Any) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value)[:10], "%Y-%m-%d").date()
+
+
+def _bits(mask: int) -> Iterator[int]:
+    """Positions of the bits set in mask."""
+    bits = bin(mask)[:1:-1]
+    position = bits.find("1")
+    while position != -1:
+        yield position
+        position = bits.find("1", position + 1)
+
+
+class TimesheetCompliance:
+    """Cached employee x working-day submission matrix with gap summaries."""
+
+    def __init__(self, engine: Engine, hierarchy: OrgHierarchy, ttl_seconds: float = 300.0, max_days: int = 400):
+        """
+        Args:
+            engine: Engine activity_reports, presence and leave_requests are read from
+            hierarchy: Index of the employees (names, managers)
+            ttl_seconds: How long a loaded day stays valid (late submissions show up after that)
+            max_days: Maximum number of days kept in the cache (least recently used evicted)
+        """
+        self.engine = engine
+        self.hierarchy = hierarchy
+        self.ttl_seconds = ttl_seconds
+        self.max_days = max_days
+        # Stable bit position of each employee ID (new employees are appended)
+        self._positions: Dict[int, int] = {}
+        self._ids: List[int] = []
+        self._days: "OrderedDict[date, Tuple[float, DayColumn]]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.counters = {"questions": 0, "days_loaded": 0, "day_hits": 0, "loads": 0, "load_ms": 0.0, "compute_ms": 0.0}
+
+    def _position(self, employee_id: int) -> int:
+        position = self._positions.get(employee_id)
+        if position is None:
+            position = self._positions[employee_id] = len(self._ids)
+            self._ids.append(employee_id)
+        return position
+
+    def invalidate(self, start: Optional[date] = None, end: Optional[date] = None) -> int:
+        """Drop the cached days in [start, end] (all of them by default). Returns the number dropped."""
+        with self._lock:
+            stale = [day for day in self._days if (start is None or day >= start) and (end is None or day <= end)]
+            for day in stale:
+                del self._days[day]
+            return len(stale)
+
+    def _load(self, start: date, end: date) -> Dict[date, DayColumn]:
+        """Columns of every working day in [start, end], from three range queries."""
+        columns = {day: DayColumn() for day in working_days(start, end)}
+        params = {"start": start.isoformat(), "end": end.isoformat()}
+        with self.engine.connect() as conn:
+            activity = conn.execute(text(_ACTIVITY_SQL), params).all()
+            presence = conn.execute(text(_PRESENCE_SQL), params).all()
+            leave = conn.execute(text(_LEAVE_SQL), params).all()
+
+        # Driver values (date objects or ISO strings) are converted once per distinct day
+        days: Dict[Any, date] = {}
+
+        def day_of(value: Any) -> date:
+            day = days.get(value)
+            if day is None:
+                day = days[value] = _as_date(value)
+            return day
+
+        with self._lock:
+            for employee_id, day, status in activity:
+                column = columns.get(day_of(day))
+                if column is None:
+                    continue
+                bit = 1 << self._position(int(employee_id))
+                if status in SUBMITTED_STATUSES:
+                    column.submitted |= bit
+                elif status == "Draft":
+                    column.draft |= bit
+                elif status == "Rejected":
+                    column.rejected |= bit
+            for employee_id, day in presence:
+                column = columns.get(day_of(day))
+                if column is not None:
+                    column.excused |= 1 << self._position(int(employee_id))
+            for employee_id, first, last in leave:
+                bit = 1 << self._position(int(employee_id))
+                day, last = max(_as_date(first), start), min(_as_date(last), end)
+                while day <= last:
+                    column = columns.get(day)
+                    if column is not None:
+                        column.excused |= bit
+                    day += timedelta(days=1)
+        return columns
+
+    def _columns(self, days: List[date]) -> List[DayColumn]:
+        """Columns of the given working days, loading runs of missing or expired days in bulk."""
+        now = time.monotonic()
+        # Built from the hits taken here and the columns loaded below, never re-read from _days:
+        # a concurrent invalidate() may drop any of them in between
+        found: Dict[date, DayColumn] = {}
+        with self._lock:
+            missing = []
+            for day in days:
+                entry = self._days.get(day)
+                if entry is None or now - entry[0] > self.ttl_seconds:
+                    missing.append(day)
+                else:
+                    found[day] = entry[1]
+                    self._days.move_to_end(day)
+            self.counters["day_hits"] += len(days) - len(missing)
+
+        # Consecutive missing days (weekends in between do not split a run) are loaded together
+        runs: List[List[date]] = []
+        for day in missing:
+            if runs and (day - runs[-1][-1]).days <= 3:
+                runs[-1].append(day)
+            else:
+                runs.append([day])
+        for run in runs:
+            started = time.perf_counter()
+            loaded = self._load(run[0], run[-1])
+            found.update(loaded)
+            with self._lock:
+                for day, column in loaded.items():
+                    self._days[day] = (now, column)
+                    self._days.move_to_end(day)
+                self.counters["loads"] += 1
+                self.counters["days_loaded"] += len(loaded)
+                self.counters["load_ms"] += (time.perf_counter() - started) * 1000
+
+        with self._lock:
+            while len(self._days) > self.max_days:
+                self._days.popitem(last=False)
+        return [found[day] for day in days]
+
+    def gaps(self, start: date, end: date, employees: Optional[Iterable[int]] = None) -> Dict[str, Any]:
+        """
+        Submission gaps of employees over the working days of [start, end].
+
+        Days after today are left out (they cannot be missing yet).
+
+        Args:
+            start: First day
+            end: Last day
+            employees: Employee IDs to check (default: every employee)
+
+        Returns:
+            Dict[str, Any]: days, employees, expected, excused, gaps per kind, per-day gap
+                counts and per-employee gap counts ({employee_id: {missing, draft, rejected,
+                excused}}) for the employees with at least one gap, plus the gap masks per day
+        """
+        end = min(end, date.today())
+        days = working_days(start, end) if start <= end else []
+        columns = self._columns(days)
+        started = time.perf_counter()
+
+        ids = list(employees) if employees is not None else self.hierarchy.employee_ids()
+        with self._lock:
+            population = 0
+            for employee_id in ids:
+                population |= 1 << self._position(int(employee_id))
+            size = len(self._ids)
+            id_of = list(self._ids)
+
+        counters = {kind: BitCounter() for kind in GAP_KINDS + ("excused",)}
+        per_day = []
+        day_masks = []
+        any_gap = 0
+        expected_total = 0
+        for day, column in zip(days, columns):
+            excused = column.excused & population
+            expected = population & ~excused
+            gap = expected & ~column.submitted
+            draft = gap & column.draft
+            rejected = gap & column.rejected & ~column.draft
+            missing = gap & ~column.draft & ~column.rejected
+            for kind, mask in (("missing", missing), ("draft", draft), ("rejected", rejected), ("excused", excused)):
+                counters[kind].add(mask)
+            any_gap |= gap
+            day_masks.append(gap)
+            expected_count = bin(expected).count("1")
+            expected_total += expected_count
+            per_day.append({"date": day.isoformat(), "expected": expected_count, "gaps": bin(gap).count("1")})
+
+        counts = {kind: counter.counts(size) for kind, counter in counters.items()}
+        by_employee = {
+            id_of[position]: {kind: counts[kind][position] for kind in counts}
+            for position in _bits(any_gap)
+        }
+        with self._lock:
+            self.counters["questions"] += 1
+            self.counters["compute_ms"] += (time.perf_counter() - started) * 1000
+        gap_totals = {kind: sum(counts[kind]) for kind in GAP_KINDS}
+        return {
+            "start": start,
+            "end": end,
+            "days": days,
+            "employees": len(ids),
+            "expected": expected_total,
+            "excused": sum(counts["excused"]),
+            "gaps": gap_totals,
+            "per_day": per_day,
+            "by_employee": by_employee,
+            "day_masks": day_masks,
+            "positions": dict(self._positions),
+        }
+
+    def gap_dates(self, result: Dict[str, Any], employee_id: int) -> List[date]:
+        """Days on which an employee of a gaps() result has a gap."""
+        bit = 1 << result["positions"][employee_id]
+        return [day for day, mask in zip(result["days"], result["day_masks"]) if mask & bit]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.counters)
+            stats["days_cached"] = len(self._days)
+            stats["employees_indexed"] = len(self._ids)
+        lookups = stats["day_hits"] + stats["days_loaded"]
+        stats["day_hit_rate"] = stats["day_hits"] / lookups if lookups else 0.0
+        return stats
+
+
+def answer(
+    compliance: TimesheetCompliance,
+    start: date,
+    end: date,
+    manager: Optional[Any] = None,
+    employee: Optional[Any] = None,
+    limit: int = 20,
+) -> str:
+    """
+    Text summary of timesheet gaps, as returned by the agent tool: totals, the employees with
+    the most gaps (with their dates) and the gaps per manager (direct reports).
+
+    Args:
+        compliance: Engine to query
+        start: First day
+        end: Last day
+        manager: Only the people under this manager (ID or name), all levels
+        employee: Only this employee (ID or name)
+        limit: Maximum number of employees and managers listed
+    """
+    hierarchy = compliance.hierarchy
+    scope = "all employees"
+    employees = None
+    if employee is not None:
+        employee_id = hierarchy.resolve(employee)
+        employees, scope = [employee_id], hierarchy.describe(employee_id)
+    elif manager is not None:
+        manager_id = hierarchy.resolve(manager)
+        employees = hierarchy.descendants(manager_id)
+        scope = f"everyone under {hierarchy.describe(manager_id)}"
+    result = compliance.gaps(start, end, employees)
+    days = result["days"]
+    if not days:
+        return f"📅 No working day between {start} and {min(end, date.today())}."
+
+    gaps = result["gaps"]
+    total = sum(gaps.values())
+    rate = 1 - total / result["expected"] if result["expected"] else 1.0
+    period = f"{start}" if start == result["end"] else f"{start} to {result['end']}"
+    lines = [
+        f"🗓️ Timesheet compliance for {period} ({len(days)} working day(s), {scope}: {result['employees']} employee(s))",
+        f"Expected timesheets: {result['expected']} ({result['excused']} day(s) excused by leave or absence)",
+        f"Gaps: {total} ({gaps['missing']} missing, {gaps['draft']} still in draft, {gaps['rejected']} rejected) "
+        f"- compliance {rate:.1%}",
+    ]
+    by_employee = result["by_employee"]
+    if not by_employee:
+        lines.append("✅ Everyone expected has submitted their timesheet.")
+        return "\n".join(lines)
+
+    lines.append("")
+    lines.append(f"Employees with gaps: {len(by_employee)}")
+    ranked = sorted(by_employee.items(), key=lambda item: (-sum(item[1][kind] for kind in GAP_KINDS), item[0]))
+    for employee_id, counts in ranked[:limit]:
+        detail = ", ".join(f"{counts[kind]} {kind}" for kind in GAP_KINDS if counts[kind])
+        dates = compliance.gap_dates(result, employee_id)
+        shown = ", ".join(day.isoformat() for day in dates[:5]) + (", ..." if len(dates) > 5 else "")
+        lines.append(f"- {hierarchy.describe(employee_id)}: {sum(counts[kind] for kind in GAP_KINDS)} day(s) ({detail}): {shown}")
+    if len(ranked) > limit:
+        lines.append(f"... and {len(ranked) - limit} more employee(s)")
+
+    teams: Dict[Optional[int], Dict[str, int]] = {}
+    for employee_id, counts in by_employee.items():
+        team = teams.setdefault(hierarchy.manager.get(employee_id), {"gaps": 0, "employees": 0})
+        team["gaps"] += sum(counts[kind] for kind in GAP_KINDS)
+        team["employees"] += 1
+    lines.append("")
+    lines.append("Gaps per manager (direct reports):")
+    for manager_id, team in sorted(teams.items(), key=lambda item: -item[1]["gaps"])[:limit]:
+        label = hierarchy.describe(manager_id) if manager_id is not None else "No manager"
+        reports = len(hierarchy.children.get(manager_id, [])) if manager_id is not None else team["employees"]
+        lines.append(f"- {label}: {team['gaps']} day(s), {team['employees']}/{reports} report(s) with gaps")
+
+    if len(days) > 1:
+        worst = sorted(result["per_day"], key=lambda day: -day["gaps"])[:3]
+        lines.append("")
+        lines.append("Days with the most gaps: " + ", ".join(f"{day['date']} ({day['gaps']}/{day['expected']})" for day in worst))
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import os
+
+    from dotenv import load_dotenv
+    from sqlalchemy import create_engine
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Timesheet gaps over a date range")
+    parser.add_argument("start", help="First day, YYYY-MM-DD")
+    parser.add_argument("end", nargs="?", help="Last day, YYYY-MM-DD (default: start)")
+    parser.add_argument("--manager", help="Only the people under this manager (ID or name)")
+    parser.add_argument("--employee", help="Only this employee (ID or name)")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--url", default=os.getenv("DATABASE_URL"), help="Database URL (default: DATABASE_URL)")
+    args = parser.parse_args()
+    if not args.url:
+        parser.error("give --url or set DATABASE_URL")
+
+    engine = create_engine(args.url)
+    compliance = TimesheetCompliance(engine, OrgHierarchy(engine))
+    first = datetime.strptime(args.start, "%Y-%m-%d").date()
+    last = datetime.strptime(args.end, "%Y-%m-%d").date() if args.end else first
+    started = time.perf_counter()
+    print(answer(compliance, first, last, manager=args.manager, employee=args.employee, limit=args.limit))
+    print(f"⏱️  {(time.perf_counter() - started) * 1000:.1f} ms")
@@ -0,0 +1,458 @@
+"""
+Per-request tracing of where an answer's time goes: LLM calls, SQL statements, tool calls,
+HTTP calls and report formatting.
+
+Every question answered by ActivityReportAgent.ask() is a request with its own ID. Inside
+it, spans are recorded with their parent, duration and details:
+
+    request   the question (user, mode, how it was answered, tool output bytes saved by compaction)
+    llm       one LLM call: model, input/output tokens
+    tool      one tool call: input and output size
+    sql       one statement: fingerprint, rows, result bytes (cached=true for SQL cache hits)
+    http      one weather API call: endpoint, status, response bytes
+    format    report formatting
+
+A request's spans are kept in memory until it ends, then appended to an in-process ring
+buffer (TRACE_RING_SIZE spans) and, when TRACE_PATH is set, to a JSONL file rotated at
+TRACE_MAX_BYTES with TRACE_BACKUPS old files. TRACING=0 turns it all off.
+
+    python tracing.py traces.jsonl --top 10      # hottest spans and slowest questions
+"""
+import argparse
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, Dict, Any, List, Iterable, Iterator
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Longest SQL statement / tool input kept in a span
+MAX_TEXT_CHARS = 500
+
+KINDS = ("llm", "sql", "tool", "http", "format")
+
+
+class RequestTrace:
+    """The spans of one request, recorded until it ends."""
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.spans: List[Dict[str, Any]] = []
+        # Open tool spans: SQL and HTTP calls made meanwhile are their children
+        self.stack: List[str] = []
+        self.root: Dict[str, Any] = {}
+
+    def start(self, kind: str, name: str, parent_id: Optional[str] = None, **attrs: Any) -> Dict[str, Any]:
+        span = {
+            "request_id": self.request_id,
+            "span_id": uuid.uuid4().hex[:12],
+            "parent_id": parent_id or (self.stack[-1] if self.stack else self.root.get("span_id")),
+            "kind": kind,
+            "name": name,
+            "start": time.time(),
+            "_started": time.perf_counter(),
+        }
+        span.update(attrs)
+        return span
+
+    def end(self, span: Dict[str, Any], error: Optional[BaseException] = None) -> None:
+        span["ms"] = round((time.perf_counter() - span.pop("_started")) * 1000, 3)
+        span["status"] = "error" if error is not None else "ok"
+        if error is not None:
+            span["error"] = str(error)[:MAX_TEXT_CHARS]
+        self.spans.append(span)
+
+    def last(self, kind: str) -> Optional[Dict[str, Any]]:
+        return next((span for span in reversed(self.spans) if span["kind"] == kind), None)
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+_TRACE: ContextVar[Optional[RequestTrace]] = ContextVar("request_trace", default=None)
+
+
+def _shape(statement: str) -> str:
+    """Span name of a SQL statement: its fingerprint (literals replaced), truncated."""
+    # Imported here: query_log imports sql_cache, which traces through this module
+    from query_log import fingerprint
+    return fingerprint(statement)[:MAX_TEXT_CHARS]
+
+
+class Tracer:
+    """Records request traces into a ring buffer and an optional rotating JSONL file."""
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        path: Optional[str] = None,
+        max_bytes: int = 10 * 1024 * 1024,
+        backups: int = 3,
+        ring_size: int = 5000,
+    ):
+        """
+        Args:
+            enabled: Record anything at all
+            path: JSONL file the spans are appended to (None: ring buffer only)
+            max_bytes: Size at which the file is rotated to path.1, path.2, ...
+            backups: Number of rotated files kept
+            ring_size: Number of most recent spans kept in memory
+        """
+        self.enabled = enabled
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.spans: deque = deque(maxlen=ring_size)
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _env_settings() -> Dict[str, Any]:
+        return {
+            "enabled": os.getenv("TRACING", "1") != "0",
+            "path": os.getenv("TRACE_PATH") or None,
+            "max_bytes": int(os.getenv("TRACE_MAX_BYTES", str(10 * 1024 * 1024))),
+            "backups": int(os.getenv("TRACE_BACKUPS", "3")),
+            "ring_size": int(os.getenv("TRACE_RING_SIZE", "5000")),
+        }
+
+    @classmethod
+    def from_env(cls) -> "Tracer":
+        """Build a tracer from TRACING and TRACE_* environment variables."""
+        return cls(**cls._env_settings())
+
+    def configure_from_env(self) -> "Tracer":
+        """Re-read TRACING and TRACE_* (e.g. once .env has been loaded), keeping the recorded spans."""
+        settings = self._env_settings()
+        with self._lock:
+            self.enabled, self.path = settings["enabled"], settings["path"]
+            self.max_bytes, self.backups = settings["max_bytes"], settings["backups"]
+            if self.spans.maxlen != settings["ring_size"]:
+                self.spans = deque(self.spans, maxlen=settings["ring_size"])
+        return self
+
+    @staticmethod
+    def current() -> Optional[RequestTrace]:
+        return _TRACE.get()
+
+    @contextmanager
+    def request(self, question: str, request_id: Optional[str] = None, **attrs: Any) -> Iterator[Dict[str, Any]]:
+        """
+        Trace a request; yields its root span, to which attributes can be added.
+
+        Nested calls (e.g. ask() inside a server request that already started one) join the
+        outer request.
+
+        Args:
+            question: The question, used as the request span's name
+            request_id: ID of the request (default: a new random one)
+            **attrs: Attributes of the request span (user_id, mode, ...)
+        """
+        outer = _TRACE.get()
+        if not self.enabled or outer is not None:
+            yield outer.root if outer is not None else {}
+            return
+        trace = RequestTrace(request_id or new_request_id())
+        trace.root = trace.start("request", question[:MAX_TEXT_CHARS], **attrs)
+        trace.root["parent_id"] = None
+        token = _TRACE.set(trace)
+        error = None
+        try:
+            yield trace.root
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            _TRACE.reset(token)
+            trace.end(trace.root, error)
+            self._flush(trace)
+
+    @contextmanager
+    def span(self, kind: str, name: str, **attrs: Any) -> Iterator[Dict[str, Any]]:
+        """Trace a block within the current request; yields the span (a dict, for extra attributes)."""
+        trace = _TRACE.get()
+        if trace is None:
+            yield {}
+            return
+        span = trace.start(kind, name, **attrs)
+        error = None
+        try:
+            yield span
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            trace.end(span, error)
+
+    def sql_result(self, result: Any, statement: Optional[str] = None, cached: bool = False) -> None:
+        """
+        Add the row count and size of a fetched result to the last SQL span of the current
+        request, or record a cached=true span for a result served from the SQL cache.
+        """
+        trace = _TRACE.get()
+        if trace is None:
+            return
+        if cached:
+            span = trace.start("sql", _shape(statement or ""), cached=True)
+            trace.end(span)
+        else:
+            span = trace.last("sql")
+        if span is not None:
+            if isinstance(result, (list, tuple)):
+                span["rows"] = len(result)
+            span["bytes"] = len(repr(result))
+
+    def callback_handler(self) -> Optional["TracingCallbackHandler"]:
+        """LangChain callback handler recording LLM and tool spans into the current request."""
+        trace = _TRACE.get()
+        return TracingCallbackHandler(trace) if trace is not None else None
+
+    def install(self, engine: Engine) -> "Tracer":
+        """Record a span for every statement executed on the engine within a request."""
+        if not self.enabled:
+            return self
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            trace = _TRACE.get()
+            if trace is not None:
+                span = trace.start("sql", _shape(statement), statement=statement[:MAX_TEXT_CHARS])
+                if executemany:
+                    span["executemany"] = len(parameters)
+                conn.info.setdefault("trace_spans", []).append((trace, span))
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            spans = conn.info.get("trace_spans")
+            if spans:
+                trace, span = spans.pop()
+                if cursor.rowcount is not None and cursor.rowcount >= 0:
+                    span["rowcount"] = cursor.rowcount
+                trace.end(span)
+
+        @event.listens_for(engine, "handle_error")
+        def handle_error(context):
+            spans = context.connection.info.get("trace_spans") if context.connection is not None else None
+            if spans:
+                trace, span = spans.pop()
+                trace.end(span, context.original_exception)
+
+        return self
+
+    def _flush(self, trace: RequestTrace) -> None:
+        spans = sorted(trace.spans, key=lambda span: span["start"])
+        with self._lock:
+            self.requests += 1
+            self.spans.extend(spans)
+            if self.path:
+                self._rotate()
+                with open(self.path, "a", encoding="utf-8") as f:
+                    for span in spans:
+                        f.write(json.dumps(span, default=str) + "\n")
+
+    def _rotate(self) -> None:
+        try:
+            if os.path.getsize(self.path) < self.max_bytes:
+                return
+        except OSError:
+            return
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def recent(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """The most recent spans in the ring buffer, oldest first."""
+        with self._lock:
+            spans = list(self.spans)
+        return spans[-limit:] if limit else spans
+
+    def stats(self) -> Dict[str, Any]:
+        """Requests traced, spans in memory and a summary of them (see summarize())."""
+        spans = self.recent()
+        return {"enabled": self.enabled, "requests": self.requests, "spans": len(spans), "path": self.path,
+                **summarize(spans, top=5)}
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """Turns LangChain LLM and tool callbacks into spans of a request trace."""
+
+    def __init__(self, trace: RequestTrace):
+        self.trace = trace
+        self._open: Dict[UUID, Dict[str, Any]] = {}
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[Any]], *, run_id: UUID, **kwargs: Any) -> None:
+        prompt = messages[0] if messages else []
+        self._start_llm(serialized, run_id, kwargs, messages=len(prompt),
+                        prompt_chars=sum(len(str(getattr(message, "content", ""))) for message in prompt))
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, run_id: UUID, **kwargs: Any) -> None:
+        self._start_llm(serialized, run_id, kwargs, prompt_chars=sum(len(prompt) for prompt in prompts))
+
+    def _start_llm(self, serialized: Dict[str, Any], run_id: UUID, kwargs: Dict[str, Any], **attrs: Any) -> None:
+        serialized = serialized or {}
+        params = kwargs.get("invocation_params") or {}
+        model = (params.get("model") or params.get("model_name") or (serialized.get("kwargs") or {}).get("model")
+                 or (serialized.get("id") or ["llm"])[-1])
+        self._open[run_id] = self.trace.start("llm", str(model), **attrs)
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        span = self._open.pop(run_id, None)
+        if span is None:
+            return
+        span.update(token_usage(response))
+        self.trace.end(span)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        span = self._open.pop(run_id, None)
+        if span is not None:
+            self.trace.end(span, error)
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID, **kwargs: Any) -> None:
+        name = (serialized or {}).get("name") or kwargs.get("name") or "tool"
+        span = self.trace.start("tool", name, input=str(input_str)[:MAX_TEXT_CHARS])
+        self._open[run_id] = span
+        self.trace.stack.append(span["span_id"])
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end_tool(run_id, output_chars=len(str(getattr(output, "content", output))))
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end_tool(run_id, error=error)
+
+    def _end_tool(self, run_id: UUID, error: Optional[BaseException] = None, **attrs: Any) -> None:
+        span = self._open.pop(run_id, None)
+        if span is None:
+            return
+        if span["span_id"] in self.trace.stack:
+            self.trace.stack.remove(span["span_id"])
+        span.update(attrs)
+        self.trace.end(span, error)
+
+
+def token_usage(response: Any) -> Dict[str, int]:
+    """Input/output token counts of an LLMResult or a chat message, when the model reports them."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        generations = getattr(response, "generations", None) or [[]]
+        message = getattr(generations[0][0], "message", None) if generations[0] else None
+        usage = getattr(message, "usage_metadata", None)
+    if not usage:
+        usage = ((getattr(response, "llm_output", None) or {}).get("token_usage")) or {}
+        usage = {"input_tokens": usage.get("prompt_tokens"), "output_tokens": usage.get("completion_tokens")}
+    return {key: usage[key] for key in ("input_tokens", "output_tokens") if usage.get(key) is not None}
+
+
+def summarize(spans: Iterable[Dict[str, Any]], top: int = 10) -> Dict[str, Any]:
+    """
+    Hottest spans (kind and name, by total time) and slowest requests, with each request's
+    time per kind. A tool's time includes the SQL and HTTP calls it made.
+    """
+    hottest: Dict[tuple, Dict[str, Any]] = {}
+    requests: Dict[str, Dict[str, Any]] = {}
+    for span in spans:
+        request = requests.setdefault(span["request_id"], {"request_id": span["request_id"], **{f"{kind}_ms": 0.0 for kind in KINDS}})
+        if span["kind"] == "request":
+            request.update(question=span["name"], ms=span["ms"], status=span["status"], at=span["start"],
+                           user_id=span.get("user_id"), answered_by=span.get("answered_by"))
+            continue
+        request[f"{span['kind']}_ms"] = request.get(f"{span['kind']}_ms", 0.0) + span["ms"]
+        if span["kind"] == "llm":
+            request["llm_calls"] = request.get("llm_calls", 0) + 1
+            request["tokens"] = request.get("tokens", 0) + (span.get("input_tokens") or 0) + (span.get("output_tokens") or 0)
+        entry = hottest.setdefault((span["kind"], span["name"]), {"kind": span["kind"], "name": span["name"], "calls": 0, "total_ms": 0.0, "max_ms": 0.0, "errors": 0})
+        entry["calls"] += 1
+        entry["total_ms"] += span["ms"]
+        entry["max_ms"] = max(entry["max_ms"], span["ms"])
+        entry["errors"] += span["status"] == "error"
+    finished = [request for request in requests.values() if "ms" in request]
+    return {
+        "hottest_spans": sorted(hottest.values(), key=lambda entry: entry["total_ms"], reverse=True)[:top],
+        "slowest_requests": sorted(finished, key=lambda request: request["ms"], reverse=True)[:top],
+    }
+
+
+def format_summary(summary: Dict[str, Any], width: int = 60) -> str:
+    """Text tables of a summarize() result."""
+    lines = [f"{'kind':<7} {'calls':>6} {'total ms':>10} {'max ms':>9}  name"]
+    for entry in summary["hottest_spans"]:
+        name = entry["name"] if len(entry["name"]) <= width else entry["name"][:width - 1] + "…"
+        errors = f"  ({entry['errors']} error(s))" if entry["errors"] else ""
+        lines.append(f"{entry['kind']:<7} {entry['calls']:>6} {entry['total_ms']:>10.1f} {entry['max_ms']:>9.1f}  {name}{errors}")
+    lines.append("")
+    lines.append(f"{'total ms':>9} {'llm':>8} {'sql':>8} {'tool':>8} {'http':>8}  question")
+    for request in summary["slowest_requests"]:
+        question = request["question"] if len(request["question"]) <= width else request["question"][:width - 1] + "…"
+        lines.append(f"{request['ms']:>9.1f} {request['llm_ms']:>8.1f} {request['sql_ms']:>8.1f} "
+                     f"{request['tool_ms']:>8.1f} {request['http_ms']:>8.1f}  {question}")
+    return "\n".join(lines)
+
+
+def read_spans(path: str, rotated: bool = True) -> Iterator[Dict[str, Any]]:
+    """Spans of a JSONL trace file, oldest rotated files first."""
+    backups = [name for name in glob.glob(f"{path}.*") if name.rsplit(".", 1)[1].isdigit()] if rotated else []
+    backups.sort(key=lambda name: int(name.rsplit(".", 1)[1]), reverse=True)
+    for name in backups + [path]:
+        if not os.path.exists(name):
+            continue
+        with open(name, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def format_request(spans: List[Dict[str, Any]]) -> str:
+    """One request's spans as an indented tree, in start order."""
+    parents = {span["span_id"]: span["parent_id"] for span in spans}
+    lines = []
+    for span in spans:
+        depth, parent = 0, span["parent_id"]
+        while parent in parents:
+            depth, parent = depth + 1, parents[parent]
+        extra = {key: value for key, value in span.items() if key not in (
+            "request_id", "span_id", "parent_id", "kind", "name", "start", "ms", "status", "statement")}
+        lines.append(f"{'  ' * depth}{span['kind']:<7} {span['ms']:>9.1f} ms  {span['name'][:80]}  "
+                     f"{json.dumps(extra, default=str)[:160] if extra else ''}".rstrip())
+    return "\n".join(lines)
+
+
+# Process-wide tracer, shared by the agent, the SQL cache and the weather client
+TRACER = Tracer.from_env()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize a JSONL trace file: hottest spans and slowest questions")
+    parser.add_argument("path", nargs="?", default=os.getenv("TRACE_PATH"), help="Trace file (default: TRACE_PATH)")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--kind", choices=KINDS, help="Only this kind of span in the hottest list")
+    parser.add_argument("--request", help="Print every span of one request ID")
+    parser.add_argument("--no-rotated", action="store_true", help="Ignore the rotated files (path.1, path.2, ...)")
+    args = parser.parse_args()
+    if not args.path:
+        parser.error("give a trace file or set TRACE_PATH")
+
+    all_spans = list(read_spans(args.path, rotated=not args.no_rotated))
+    if args.request:
+        print(format_request([span for span in all_spans if span["request_id"] == args.request]))
+    else:
+        summary = summarize(all_spans, top=len(all_spans))
+        summary["hottest_spans"] = [
+            entry for entry in summary["hottest_spans"] if not args.kind or entry["kind"] == args.kind
+        ][:args.top]
+        summary["slowest_requests"] = summary["slowest_requests"][:args.top]
+        requests = sum(1 for span in all_spans if span["kind"] == "request")
+        print(f"🔎 {requests} request(s), {len(all_spans)} span(s) in {args.path}")
+        print(format_summary(summary))
@@ -0,0 +1,242 @@
+"""
+OpenWeatherMap client shared by the agent's weather tools.
+
+One pooled requests.Session (keep-alive connections) with connect/read timeouts and
+bounded retries with backoff on connection errors, 429 and 5xx (a Retry-After header is
+honoured up to a few seconds only). Current weather and
+3-hourly forecasts are cached per location with separate TTLs (OpenWeatherMap updates
+current conditions every ~10 minutes and forecasts every 3 hours), and concurrent
+requests for the same location and endpoint share a single HTTP call (single-flight).
+
+Point OPENWEATHER_BASE_URL at a local server (see fake_openweather.py) to run without
+the real API.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Optional, Dict, Any, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from tracing import TRACER
+
+DEFAULT_BASE_URL = "http://api.openweathermap.org/data/2.5"
+
+
+class WeatherAPIError(Exception):
+    """The weather API answered with an error (unknown city, invalid key, outage...)."""
+
+
+class _CappedRetry(Retry):
+    """Retry policy honouring Retry-After only up to max_retry_after seconds (a 429 may ask for minutes)."""
+
+    max_retry_after = 5.0
+
+    def new(self, **kw: Any) -> "_CappedRetry":
+        retry = super().new(**kw)
+        retry.max_retry_after = self.max_retry_after
+        return retry
+
+    def get_retry_after(self, response: Any) -> Optional[float]:
+        retry_after = super().get_retry_after(response)
+        return None if retry_after is None else min(retry_after, self.max_retry_after)
+
+
+class _TTLCache:
+    """Small thread-safe LRU cache whose entries expire after a fixed TTL."""
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 256):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: str, value: Any) -> None:
+        if self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class WeatherClient:
+    """Cached, coalescing OpenWeatherMap client over a pooled HTTP session."""
+
+    def __init__(
+        self,
+        api_key: Optional[str],
+        base_url: str = DEFAULT_BASE_URL,
+        timeout: float = 5.0,
+        retries: int = 2,
+        backoff: float = 0.3,
+        current_ttl: float = 600.0,
+        forecast_ttl: float = 1800.0,
+        pool_size: int = 10,
+        max_retry_after: float = 5.0,
+    ):
+        """
+        Args:
+            api_key: OpenWeatherMap API key (checked on the first request)
+            base_url: API root, e.g. http://127.0.0.1:8765/data/2.5 for a local fake server
+            timeout: Connect and read timeout of each HTTP attempt, in seconds
+            retries: Retries after the first attempt on connection errors, 429 and 5xx
+            backoff: Backoff factor between retries (0.3 -> 0.3 s, 0.6 s, ...)
+            current_ttl: Seconds current weather is cached per location (0 disables)
+            forecast_ttl: Seconds forecasts are cached per location (0 disables)
+            pool_size: Keep-alive connections kept in the session's pool
+            max_retry_after: Longest wait honoured from a Retry-After header before a retry, in seconds
+        """
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        retry = _CappedRetry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=backoff,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset({"GET"}),
+            raise_on_status=False,
+            respect_retry_after_header=True,
+        )
+        retry.max_retry_after = max_retry_after
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._caches = {"weather": _TTLCache(current_ttl), "forecast": _TTLCache(forecast_ttl)}
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.counters = {"http_requests": 0, "cache_hits": 0, "coalesced": 0, "errors": 0}
+
+    @classmethod
+    def from_env(cls) -> "WeatherClient":
+        """Build a client from OPENWEATHER_* and WEATHER_* environment variables."""
+        return cls(
+            api_key=os.getenv("OPENWEATHER_API_KEY"),
+            base_url=os.getenv("OPENWEATHER_BASE_URL", DEFAULT_BASE_URL),
+            timeout=float(os.getenv("WEATHER_TIMEOUT_SECONDS", "5")),
+            retries=int(os.getenv("WEATHER_RETRIES", "2")),
+            current_ttl=float(os.getenv("WEATHER_CURRENT_TTL_SECONDS", "600")),
+            forecast_ttl=float(os.getenv("WEATHER_FORECAST_TTL_SECONDS", "1800")),
+            max_retry_after=float(os.getenv("WEATHER_MAX_RETRY_AFTER_SECONDS", "5")),
+        )
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.counters[name] += 1
+
+    @staticmethod
+    def normalize_location(location: str) -> str:
+        """'  paris , fr ' and 'Paris,FR' share a cache entry."""
+        return ",".join(part.strip() for part in location.split(",")).lower()
+
+    def _get(self, endpoint: str, location: str) -> Dict[str, Any]:
+        """JSON of an endpoint for a location, from the cache, an in-flight request or a new one."""
+        key = self.normalize_location(location)
+        cache = self._caches[endpoint]
+        cached = cache.get(key)
+        if cached is not None:
+            self._count("cache_hits")
+            return cached
+
+        with self._lock:
+            flight_key = f"{endpoint}:{key}"
+            future = self._inflight.get(flight_key)
+            leader = future is None
+            if leader:
+                future = self._inflight[flight_key] = Future()
+            else:
+                self.counters["coalesced"] += 1
+        if not leader:
+            return future.result()
+
+        try:
+            data = self._fetch(endpoint, location)
+            cache.put(key, data)
+            future.set_result(data)
+            return data
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(flight_key, None)
+
+    def _fetch(self, endpoint: str, location: str) -> Dict[str, Any]:
+        if not self.api_key:
+            raise ValueError("OpenWeatherMap API key not found in environment variables")
+        self._count("http_requests")
+        with TRACER.span("http", f"GET {endpoint}", location=location) as span:
+            try:
+                response = self.session.get(
+                    f"{self.base_url}/{endpoint}",
+                    params={"q": location, "appid": self.api_key, "units": "metric"},
+                    timeout=self.timeout,
+                )
+                span.update(status=response.status_code, bytes=len(response.content))
+                data = response.json()
+            except (requests.RequestException, ValueError) as e:
+                self._count("errors")
+                raise WeatherAPIError(f"Weather API unreachable: {e}") from e
+        if response.status_code != 200:
+            self._count("errors")
+            label = "Weather forecast API error" if endpoint == "forecast" else "Weather API error"
+            raise WeatherAPIError(f"{label}: {data.get('message', 'Unknown error')}")
+        return data
+
+    def current(self, location: str) -> Dict[str, Any]:
+        """Current weather JSON of a location (cached for current_ttl seconds)."""
+        return self._get("weather", location)
+
+    def forecast(self, location: str) -> Dict[str, Any]:
+        """5-day / 3-hour forecast JSON of a location (cached for forecast_ttl seconds)."""
+        return self._get("forecast", location)
+
+    def temperature(self, location: str) -> float:
+        """Current temperature of a location in Celsius."""
+        return self.current(location)["main"]["temp"]
+
+    def daily_max(self, location: str) -> Dict[str, float]:
+        """Forecast aggregated to YYYY-MM-DD -> maximum temperature in Celsius."""
+        daily_max: Dict[str, float] = {}
+        for entry in self.forecast(location).get("list", []):
+            # entry['dt_txt'] like '2025-08-08 12:00:00'
+            dt_txt = entry.get("dt_txt")
+            if not dt_txt:
+                continue
+            date_str = dt_txt.split(" ")[0]
+            temp = float(entry.get("main", {}).get("temp_max", entry.get("main", {}).get("temp", 0)))
+            if date_str not in daily_max or temp > daily_max[date_str]:
+                daily_max[date_str] = temp
+        return daily_max
+
+    def clear(self) -> None:
+        for cache in self._caches.values():
+            cache.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counters)